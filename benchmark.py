@@ -0,0 +1,293 @@
+# ================== بنچمارک محلي ربات ==================
+# يک سرور جعلي Bot API و سرورهاي جعلي قيمت (kifpool, milli.gold, goldprice) اجرا مي‌کند
+# و هزاران کاربر همزمان را از مسير /start → قيمت → خريد/فروش عبور مي‌دهد.
+#
+# اجرا:
+#   python benchmark.py --users 2000 --concurrency 500
+#   python benchmark.py --upstream-latency-ms 300 --upstream-failure-rate 0.2 --cache-ttl 0
+#   python benchmark.py --max-p99-ms 250 --json results.json   # براي جلوگيري از افت کارايي قبل از استقرار
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+try:
+    import resource
+except ImportError:  # ويندوز
+    resource = None
+
+from aiohttp import web
+
+BENCH_TOKEN = "123456:BENCHMARK"
+BENCH_ADMIN_ID = 1
+FIRST_USER_ID = 100000
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="TTeer.comBot local load benchmark")
+    parser.add_argument("--users", type=int, default=2000, help="تعداد کاربران شبيه‌سازي شده")
+    parser.add_argument("--concurrency", type=int, default=500, help="حداکثر کاربران فعال همزمان")
+    parser.add_argument("--buy-ratio", type=float, default=0.5, help="نسبت کاربران خريد به فروش")
+    parser.add_argument("--think-ms", type=float, default=0, help="مکث بين پيام‌هاي هر کاربر")
+    parser.add_argument("--api-latency-ms", type=float, default=5, help="تاخير سرور جعلي Bot API")
+    parser.add_argument("--upstream-latency-ms", type=float, default=50, help="تاخير سرورهاي جعلي قيمت")
+    parser.add_argument("--upstream-failure-rate", type=float, default=0.05, help="نرخ خطاي سرورهاي جعلي قيمت")
+    parser.add_argument("--cache-ttl", type=float, default=None, help="بازنويسي price_cache_ttl (0 = بدون کش)")
+    parser.add_argument("--state-backend", choices=("sqlite", "memory"), default="sqlite")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", help="ذخيره نتايج در فايل JSON")
+    parser.add_argument("--max-p99-ms", type=float, default=None, help="در صورت عبور p99 از اين مقدار با کد 1 خارج مي‌شود")
+    parser.add_argument("--verbose", action="store_true", help="نمايش لاگ‌هاي ربات")
+    return parser.parse_args()
+
+# ================== سرور جعلي Bot API ==================
+class FakeBotApi:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = Counter()
+        self.message_ids = itertools.count(1)
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        data = await request.post()
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"}
+        elif method in ("sendMessage", "editMessageText"):
+            chat_id = str(data.get("chat_id", "0"))
+            result = {
+                "message_id": next(self.message_ids),
+                "date": int(time.time()),
+                "chat": {"id": int(chat_id) if chat_id.lstrip("-").isdigit() else 0, "type": "private"},
+                "text": data.get("text", "")
+            }
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+# ================== سرورهاي جعلي قيمت ==================
+UPSTREAM_PAYLOADS = {
+    "kifpool": lambda: {"data": [{"symbol": "USDT", "priceSellIRT": random.randint(99000, 101000)}]},
+    "milli": lambda: {"price18": random.randint(70000, 71000)},
+    "goldprice": lambda: {"items": [{"xauPrice": random.uniform(2390, 2410)}]}
+}
+
+class FakePriceUpstreams:
+    def __init__(self, latency, failure_rate):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.requests = Counter()
+        self.failures = Counter()
+
+    async def handle(self, request):
+        name = request.match_info["name"]
+        self.requests[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+        if random.random() < self.failure_rate:
+            self.failures[name] += 1
+            return web.Response(status=503)
+        return web.json_response(UPSTREAM_PAYLOADS[name]())
+
+async def start_fake_servers(args):
+    bot_api = FakeBotApi(args.api_latency_ms / 1000)
+    upstreams = FakePriceUpstreams(args.upstream_latency_ms / 1000, args.upstream_failure_rate)
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", bot_api.handle)
+    app.router.add_get("/upstream/{name}", upstreams.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}", bot_api, upstreams
+
+# ================== توليد بار ==================
+def user_script(bot, kind):
+    script = ["/start", "🟢 قيمت لحظه اي تتر و طلا"]
+    if kind == "buy":
+        script += [
+            "🛒 خريد تتر از ما", "123456", "1234567890", "10,000,000 تومان", bot.CONFIRM_BUTTON,
+            bot.NETWORK_DISPLAY_NAMES["TRC20"], "TUvQ6SdWNkj8q7auUegsj7hXADeMhtgExX"
+        ]
+    else:
+        script += [
+            "💵 فروش تتر به ما", "123456", "1234567890", "100 تتر", bot.CONFIRM_BUTTON,
+            bot.NETWORK_DISPLAY_NAMES["BEP20"], "6037991234567890", "لازم نيست",
+            "IR123456789012345678901234", "Benchmark User"
+        ]
+    return script
+
+class LoadGenerator:
+    def __init__(self, bot, application, args):
+        self.bot = bot
+        self.application = application
+        self.args = args
+        self.update_ids = itertools.count(1)
+        self.latencies = {}
+        self.errors = 0
+
+    def make_update(self, user_id, text):
+        message = {
+            "message_id": next(self.update_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+            "text": text
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+        return self.bot.Update.de_json({"update_id": message["message_id"], "message": message}, self.application.bot)
+
+    async def count_error(self, update, context):
+        self.errors += 1
+        logging.debug(f"خطا در پردازش: {context.error}")
+
+    async def run_user(self, user_id, kind, semaphore):
+        async with semaphore:
+            for text in user_script(self.bot, kind):
+                update = self.make_update(user_id, text)
+                label = text if text.startswith("/") else self.bot.message_handler_label(update)
+                started = time.perf_counter()
+                await self.application.update_processor.process_update(update, self.application.process_update(update))
+                self.latencies.setdefault(label, []).append(time.perf_counter() - started)
+                if self.args.think_ms:
+                    await asyncio.sleep(self.args.think_ms / 1000)
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        kinds = ["buy" if random.random() < self.args.buy_ratio else "sell" for _ in range(self.args.users)]
+        await asyncio.gather(*(
+            self.run_user(FIRST_USER_ID + index, kind, semaphore) for index, kind in enumerate(kinds)
+        ))
+
+# ================== گزارش ==================
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 0.50) * 1000,
+        "p99_ms": percentile(values, 0.99) * 1000,
+        "max_ms": (values[-1] if values else 0) * 1000
+    }
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # لينوکس کيلوبايت و macOS بايت گزارش مي‌کند
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def print_report(results):
+    print("\n📊 نتايج بنچمارک")
+    print(f"   کاربران: {results['users']} | پيام‌ها: {results['updates']} | خطاها: {results['errors']}")
+    print(f"   زمان کل: {results['wall_seconds']:.2f}s | توان عملياتي: {results['throughput']:.0f} پيام/ثانيه")
+    overall = results["overall"]
+    print(f"   تاخير کل: p50={overall['p50_ms']:.1f}ms p99={overall['p99_ms']:.1f}ms max={overall['max_ms']:.1f}ms")
+    if results["memory_peak_rss_mb"] is not None:
+        print(f"   حافظه: اوج RSS={results['memory_peak_rss_mb']:.1f}MB (شامل سرورهاي جعلي)")
+    print("\n   مرحله                          تعداد     p50(ms)   p99(ms)   max(ms)")
+    for label, stats in sorted(results["steps"].items(), key=lambda item: -item[1]["p99_ms"]):
+        print(f"   {label:<30} {stats['count']:>7} {stats['p50_ms']:>10.1f} {stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f}")
+    print(f"\n   سفارشات ثبت شده: {results['orders']}")
+    print(f"   فراخواني‌هاي Bot API: {results['bot_api_calls']}")
+    print(f"   درخواست‌هاي قيمت: {results['upstream_requests']} | خطا: {results['upstream_failures']}")
+
+async def run_benchmark(bot, args):
+    runner, base_url, bot_api, upstreams = await start_fake_servers(args)
+    bot.PRICE_PROVIDER_URLS.update({name: f"{base_url}/upstream/{name}" for name in UPSTREAM_PAYLOADS})
+    bot.ADMIN_SETTINGS["price_providers"] = {"tether": ["kifpool"], "gold": ["milli"], "ounce": ["goldprice"]}
+    if args.cache_ttl is not None:
+        bot.ADMIN_SETTINGS["price_cache_ttl"] = args.cache_ttl
+    await bot.import_subscribe_codes([("123456", "1234567890", True)])
+
+    application = (
+        bot.Application.builder()
+        .token(BENCH_TOKEN)
+        .base_url(f"{base_url}/bot")
+        .concurrent_updates(bot.PerUserUpdateProcessor(bot.MAX_CONCURRENT_UPDATES))
+        .build()
+    )
+    bot.register_handlers(application)
+    generator = LoadGenerator(bot, application, args)
+    application.add_error_handler(generator.count_error)
+
+    try:
+        async with application:
+            # tracemalloc هر تخصيص حافظه را کند مي‌کند؛ حافظه فقط با اوج RSS پروسه گزارش مي‌شود
+            started = time.perf_counter()
+            await generator.run()
+            wall_seconds = time.perf_counter() - started
+    finally:
+        await runner.cleanup()
+        await bot.on_shutdown(application)
+
+    all_latencies = [value for values in generator.latencies.values() for value in values]
+    return {
+        "users": args.users,
+        "updates": len(all_latencies),
+        "errors": generator.errors,
+        "wall_seconds": wall_seconds,
+        "throughput": len(all_latencies) / wall_seconds if wall_seconds else 0,
+        "overall": summarize(all_latencies),
+        "steps": {label: summarize(values) for label, values in generator.latencies.items()},
+        "memory_peak_rss_mb": peak_rss_mb(),
+        "orders": sum(bot.ORDERS_TOTAL.values.values()),
+        "bot_api_calls": dict(bot_api.calls),
+        "upstream_requests": dict(upstreams.requests),
+        "upstream_failures": dict(upstreams.failures)
+    }
+
+def main():
+    args = parse_args()
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # تنظيمات ربات قبل از import خوانده مي‌شوند
+        os.environ.update({
+            "TOKEN": BENCH_TOKEN,
+            "ADMIN_USER_ID": str(BENCH_ADMIN_ID),
+            "CHANNEL_ID": "@benchmark",
+            "DB_FILE": os.path.join(data_dir, "benchmark.db"),
+            "STATE_BACKEND": args.state_backend,
+            "CODE_HASH_SECRET": "benchmark",
+            # همه کاربران شبيه‌سازي شده از يک ماشين کد مي‌فرستند؛ محدوديت سراسري ضد حدس زدن اينجا بي‌معناست
+            "CODE_GLOBAL_ATTEMPT_RATE": "1000000"
+        })
+        working_dir = os.getcwd()
+        os.chdir(data_dir)
+        try:
+            import bot
+
+            if not args.verbose:
+                logging.getLogger().setLevel(logging.WARNING)
+                logging.getLogger("httpx").setLevel(logging.WARNING)
+
+            results = asyncio.run(run_benchmark(bot, args))
+        finally:
+            os.chdir(working_dir)
+
+    print_report(results)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.max_p99_ms is not None and results["overall"]["p99_ms"] > args.max_p99_ms:
+        print(f"\n❌ p99 ({results['overall']['p99_ms']:.1f}ms) از حد مجاز {args.max_p99_ms}ms بيشتر است")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,1376 +1,3855 @@
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
-from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters, JobQueue
-import requests
-import jdatetime
-from datetime import datetime, timedelta
-import logging
-import re
-import json
-import os
-from aiohttp import web
-import threading
-
-# ================== تنظيمات اوليه ==================
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
-
-TOKEN = os.environ.get('TOKEN', '')
-ADMIN_USER_ID = int(os.environ.get('ADMIN_USER_ID', 0))
-CHANNEL_ID = os.environ.get('CHANNEL_ID', '')
-
-# ================== توابع کمکي ==================
-def get_iran_time():
-    iran_time = datetime.now() + timedelta(hours=3, minutes=30)
-    jalali_date = jdatetime.datetime.fromgregorian(datetime=iran_time)
-    persian_date = jalali_date.strftime("%Y%m%d")
-    persian_time = jalali_date.strftime("%H:%M")
-    persian_date_display = jalali_date.strftime("%Y/%m/%d")
-    persian_time_full = jalali_date.strftime("%H%M%S")
-    
-    return persian_date, persian_time, persian_date_display, persian_time_full
-
-# ================== مديريت فايل‌ها و ديتابيس ==================
-ADMIN_SETTINGS_FILE = "admin_settings.json"
-
-def load_admin_settings():
-    default_settings = {
-        "order_notifications": True,
-        "channel_interval": 12  # مدت زمان بين ارسال پيام‌ها به کانال (دقيقه)
-    }
-    
-    if os.path.exists(ADMIN_SETTINGS_FILE):
-        with open(ADMIN_SETTINGS_FILE, 'r', encoding='utf-8') as f:
-            saved_settings = json.load(f)
-            # اضافه کردن کليدهاي جديد اگر وجود ندارند
-            for key, value in default_settings.items():
-                if key not in saved_settings:
-                    saved_settings[key] = value
-            return saved_settings
-    return default_settings
-
-def save_admin_settings(settings):
-    with open(ADMIN_SETTINGS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(settings, f, ensure_ascii=False, indent=2)
-
-ADMIN_SETTINGS = load_admin_settings()
-
-USERS_DB = {}
-USER_STATS = {"total_users": 0, "users": {}}
-
-def save_user(user_id, user_name):
-    if user_id not in USER_STATS["users"]:
-        persian_date, persian_time, _, _ = get_iran_time()
-        USER_STATS["users"][user_id] = {
-            "join_date": f"{persian_date} {persian_time}",
-            "name": user_name
-        }
-        USER_STATS["total_users"] = len(USER_STATS["users"])
-
-def is_user_authorized(user_id):
-    if user_id in USERS_DB and USERS_DB[user_id]["verified"]:
-        if USERS_DB[user_id]["auth_expiry"] > datetime.now():
-            return True
-        else:
-            del USERS_DB[user_id]
-    return False
-
-# شمارنده سفارشات
-ORDER_COUNTERS_FILE = "order_counters.json"
-
-def load_order_counters():
-    persian_date, _, _, _ = get_iran_time()
-    
-    if os.path.exists(ORDER_COUNTERS_FILE):
-        with open(ORDER_COUNTERS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            
-            if "last_date" in data and data["last_date"] == persian_date:
-                return data["counters"]
-    
-    return {"sell": 1000, "buy": 2000}
-
-def save_order_counters():
-    persian_date, _, _, _ = get_iran_time()
-    data = {
-        "last_date": persian_date,
-        "counters": ORDER_COUNTERS
-    }
-    with open(ORDER_COUNTERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-ORDER_COUNTERS = load_order_counters()
-
-SUBSCRIBE_CODES_FILE = "subscribe_codes.json"
-
-def load_subscribe_codes():
-    if os.path.exists(SUBSCRIBE_CODES_FILE):
-        with open(SUBSCRIBE_CODES_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {
-        "123456": {"national_code": "1234567890", "active": True},
-        "654321": {"national_code": "9876543210", "active": True},
-        "789012": {"national_code": "1111111111", "active": True}
-    }
-
-def save_subscribe_codes():
-    with open(SUBSCRIBE_CODES_FILE, 'w', encoding='utf-8') as f:
-        json.dump(SUBSCRIBE_CODES, f, ensure_ascii=False, indent=2)
-
-SUBSCRIBE_CODES = load_subscribe_codes()
-
-USER_STATES = {}
-ADMIN_STATES = {}
-
-# ================== تنظيمات شبکه‌ها و کيف پول‌ها ==================
-NETWORK_FEES = {
-    "ERC20": 7,
-    "TRC20": 5, 
-    "BEP20": 2,
-    "Solana": 2
-}
-
-NETWORK_DISPLAY_NAMES = {
-    "ERC20": "ERC20 (اتريوم)",
-    "TRC20": "TRC20 (ترون)", 
-    "BEP20": "BEP20 (بايننس)",
-    "Solana": "Solana (سولانا)"
-}
-
-WALLET_FILE = "wallet_addresses.json"
-
-def load_wallet_addresses():
-    if os.path.exists(WALLET_FILE):
-        with open(WALLET_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {
-        "ERC20": "0x65D2b7FfF0ad9d87B4FAe317e2580eB2e716DE24",
-        "TRC20": "TUvQ6SdWNkj8q7auUegsj7hXADeMhtgExX",
-        "BEP20": "0x65D2b7FfF0ad9d87B4FAe317e2580eB2e716DE24",
-        "Solana": "DRhsBu1SKqGdL3sARusrR4YYqqrem4wq2JuDSGHaomxK"
-    }
-
-def save_wallet_addresses(wallet_addresses):
-    with open(WALLET_FILE, 'w', encoding='utf-8') as f:
-        json.dump(wallet_addresses, f, ensure_ascii=False, indent=2)
-
-WALLET_ADDRESSES = load_wallet_addresses()
-
-# ================== سيستم ارسال خودکار به کانال ==================
-async def send_channel_price(context: ContextTypes.DEFAULT_TYPE):
-    try:
-        tether_price, gold_price, gold_ounce, gold_dollar_price = await get_accurate_prices()
-        persian_date, persian_time, persian_date_display, _ = get_iran_time()
-        
-        tether_display = f"{tether_price:,}" if tether_price > 0 else "0"
-        gold_display = f"{gold_price:,}" if gold_price > 0 else "0"
-        gold_ounce_display = f"{gold_ounce:,}" if gold_ounce > 0 else "0"
-        gold_dollar_display = f"{gold_dollar_price:,}" if gold_dollar_price > 0 else "0"
-        
-        message = f"""🟢 *قيمت لحظه‌اي تتر و طلا*
-
- ▫️ *نرخ تتر*                   `{tether_display}` تومان
-▫️ *طلا 18 عيار*     `{gold_display}` تومان 
- ▫️ *انس جهاني*                `{gold_ounce_display}` دلار
- ▫️ *قيمت دلار طلا*       `{gold_dollar_display}` تومان
-
-ــــــــــــــــــــــــــــــــــــــــــــــــــــــــــــــ
-📅 {persian_date_display}
-⏰ {persian_time}
-
-🤖 [قيمت الان چند؟](https://t.me/TTeer_com_bot)"""
-        
-        await context.bot.send_message(
-            chat_id=CHANNEL_ID, 
-            text=message, 
-            parse_mode='Markdown'
-        )
-        logging.info(f"✅ قيمت به کانال {CHANNEL_ID} ارسال شد - فاصله: {ADMIN_SETTINGS['channel_interval']} دقيقه")
-    except Exception as e:
-        logging.error(f"❌ خطا در ارسال قيمت به کانال: {e}")
-
-# ================== سيستم تأييد هويت ==================
-async def request_subscription_code(update: Update, context: ContextTypes.DEFAULT_TYPE, service_type):
-    user_id = update.message.from_user.id
-    
-    if is_user_authorized(user_id):
-        if service_type == "buy":
-            await show_buy_options(update, context)
-        elif service_type == "sell":
-            await show_sell_options(update, context)
-        return
-    
-    USER_STATES[user_id] = {"waiting_for_subscribe_code": True, "service_type": service_type}
-    
-    await update.message.reply_text(
-        "🔐 *براي تاييد هويت*\n\n"
-        "لطفاً کد اشتراک خود را وارد کنيد:\n\n"
-        "درصورت نداشتن کد اشتراک به پشتيباني پيام دهيد:\n"
-        "📞 پشتيباني: @TTeercom",
-        reply_markup=ReplyKeyboardMarkup([[KeyboardButton("🟢 قيمت الان چند؟")]], resize_keyboard=True)
-    )
-
-async def verify_subscription_code(update: Update, context: ContextTypes.DEFAULT_TYPE, code):
-    user_id = update.message.from_user.id
-    
-    if code == "🟢 قيمت الان چند؟":
-        if user_id in USER_STATES:
-            del USER_STATES[user_id]
-        await price_command(update, context)
-        return
-    
-    if code in SUBSCRIBE_CODES and SUBSCRIBE_CODES[code]["active"]:
-        USER_STATES[user_id] = {
-            "subscribe_code": code,
-            "waiting_for_national_code": True,
-            "service_type": USER_STATES[user_id]["service_type"]
-        }
-        await update.message.reply_text("✅ کد اشتراک تأييد شد!\n\nلطفاً کد ملي خود را وارد کنيد:")
-    else:
-        await update.message.reply_text(
-            "❌ کد اشتراک نامعتبر!\n\nلطفاً کد صحيح را وارد کنيد يا براي بازگشت روي '🟢 قيمت الان چند؟' کليک کنيد.",
-            reply_markup=ReplyKeyboardMarkup([[KeyboardButton("🟢 قيمت الان چند؟")]], resize_keyboard=True)
-        )
-
-async def verify_national_code(update: Update, context: ContextTypes.DEFAULT_TYPE, national_code):
-    user_id = update.message.from_user.id
-    user_name = update.message.from_user.first_name
-    
-    if national_code == "🟢 قيمت الان چند؟":
-        if user_id in USER_STATES:
-            del USER_STATES[user_id]
-        await price_command(update, context)
-        return
-    
-    if national_code.isdigit() and len(national_code) == 10:
-        subscribe_code = USER_STATES[user_id]["subscribe_code"]
-        
-        if SUBSCRIBE_CODES[subscribe_code]["national_code"] == national_code:
-            USERS_DB[user_id] = {
-                "subscribe_code": subscribe_code,
-                "national_code": national_code,
-                "verified": True,
-                "name": user_name,
-                "auth_expiry": datetime.now() + timedelta(minutes=15)
-            }
-            
-            service_type = USER_STATES[user_id]["service_type"]
-            del USER_STATES[user_id]
-            
-            await update.message.reply_text(f"✅ تأييد هويت کامل شد!\n\nسلام {user_name} عزيز!", reply_markup=main_menu_keyboard())
-            
-            if service_type == "buy":
-                await show_buy_options(update, context)
-            elif service_type == "sell":
-                await show_sell_options(update, context)
-        else:
-            await update.message.reply_text(
-                "❌ کد ملي با اطلاعات ثبت شده مطابقت ندارد!\n\nلطفاً کد ملي صحيح را وارد کنيد.",
-                reply_markup=ReplyKeyboardMarkup([[KeyboardButton("🟢 قيمت الان چند؟")]], resize_keyboard=True)
-            )
-    else:
-        await update.message.reply_text(
-            "❌ کد ملي نامعتبر! بايد 10 رقم باشد.\n\nلطفاً کد ملي صحيح را وارد کنيد.",
-            reply_markup=ReplyKeyboardMarkup([[KeyboardButton("🟢 قيمت الان چند؟")]], resize_keyboard=True)
-        )
-
-# ================== سيستم خريد ==================
-async def show_buy_options(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    tether_price, _, _, _ = await get_accurate_prices()
-    
-    USER_STATES[user_id] = {
-        "waiting_for_buy_amount": True,
-        "service_type": "buy",
-        "current_price": tether_price
-    }
-    
-    await update.message.reply_text(
-        f"🛒 *خريد تتر از ما*\n\n💰 قيمت فعلي خريد تتر: {tether_price:,} تومان\n\n"
-        "لطفاً مبلغ مورد نظر را به تومان وارد کنيد:\n\nمثال: 1000000\n\n"
-        "يا از دکمه‌هاي زير انتخاب کنيد:",
-        reply_markup=ReplyKeyboardMarkup([
-            [KeyboardButton("5,000,000 تومان"), KeyboardButton("10,000,000 تومان")],
-            [KeyboardButton("15,000,000 تومان"), KeyboardButton("20,000,000 تومان")],
-            [KeyboardButton("🟢 قيمت الان چند؟")]
-        ], resize_keyboard=True)
-    )
-
-async def handle_buy_amount(update: Update, context: ContextTypes.DEFAULT_TYPE, amount_text):
-    user_id = update.message.from_user.id
-    user_state = USER_STATES[user_id]
-    current_price = user_state["current_price"]
-    
-    if amount_text == "🟢 قيمت الان چند؟":
-        await price_command(update, context)
-        return
-    
-    try:
-        clean_amount = re.sub(r'[^\d]', '', amount_text)
-        amount = int(clean_amount)
-        
-        if amount < 1000000:
-            await update.message.reply_text(
-                "❌ مبلغ بسيار کم!\n\nحداقل مبلغ خريد 1,000,000 تومان است.\n\nلطفاً مبلغ معتبر وارد کنيد:",
-                reply_markup=ReplyKeyboardMarkup([
-                    [KeyboardButton("5,000,000 تومان"), KeyboardButton("10,000,000 تومان")],
-                    [KeyboardButton("15,000,000 تومان"), KeyboardButton("20,000,000 تومان")],
-                    [KeyboardButton("🟢 قيمت الان چند؟")]
-                ], resize_keyboard=True)
-            )
-            return
-        
-        tether_amount = amount / current_price
-        
-        USER_STATES[user_id] = {
-            "waiting_for_network": True,
-            "amount": amount,
-            "tether_amount": round(tether_amount, 2),
-            "current_price": current_price
-        }
-        
-        await update.message.reply_text(
-            f"✅ *خلاصه سفارش خريد*\n\n💰 مبلغ: {amount:,} تومان\n"
-            f"🔢 تعداد تتر محاسبه شده: {tether_amount:.2f}\n"
-            f"💵 قيمت هر تتر: {current_price:,} تومان\n\n"
-            "آيا از سفارش خود اطمينان داريد?",
-            reply_markup=ReplyKeyboardMarkup([
-                [KeyboardButton("✅ تأييد و ادامه"), KeyboardButton("❌ انصراف")],
-                [KeyboardButton("🟢 قيمت الان چند؟")]
-            ], resize_keyboard=True)
-        )
-        
-    except ValueError:
-        await update.message.reply_text(
-            "❌ مبلغ نامعتبر!\n\nلطفاً مبلغ را به صورت عددي وارد کنيد:\n\nمثال: 1000000",
-            reply_markup=ReplyKeyboardMarkup([
-                [KeyboardButton("5,000,000 تومان"), KeyboardButton("10,000,000 تومان")],
-                [KeyboardButton("15,000,000 تومان"), KeyboardButton("20,000,000 تومان")],
-                [KeyboardButton("🟢 قيمت الان چند؟")]
-            ], resize_keyboard=True)
-        )
-
-async def handle_network_selection(update: Update, context: ContextTypes.DEFAULT_TYPE, network):
-    user_id = update.message.from_user.id
-    user_state = USER_STATES[user_id]
-    
-    tether_amount = user_state["tether_amount"]
-    network_fee = NETWORK_FEES[network]
-    final_tether_amount = tether_amount - network_fee
-    
-    USER_STATES[user_id] = {
-        "waiting_for_wallet": True,
-        "amount": user_state["amount"],
-        "tether_amount": tether_amount,
-        "final_tether_amount": round(final_tether_amount, 2),
-        "current_price": user_state["current_price"],
-        "selected_network": network,
-        "network_fee": network_fee
-    }
-    
-    await update.message.reply_text(
-        f"🌐 **شبکه انتخاب شده: {NETWORK_DISPLAY_NAMES[network]}**\n\n"
-        f"💰 کارمزد شبکه: {network_fee} تتر\n"
-        f"▫️ تتر محاسبه شده: {tether_amount:.2f}\n"
-        f"🔢 *تتر دريافتي شما*: {final_tether_amount:.2f} تتر\n\n"
-        "*لطفاً آدرس کيف پول خود را ارسال کنيد*:",
-        reply_markup=ReplyKeyboardMarkup([[KeyboardButton("❌ انصراف")]], resize_keyboard=True)
-    )
-
-async def handle_wallet_address(update: Update, context: ContextTypes.DEFAULT_TYPE, wallet_address):
-    user_id = update.message.from_user.id
-    user_state = USER_STATES[user_id]
-    
-    if wallet_address == "❌ انصراف":
-        if user_id in USER_STATES:
-            del USER_STATES[user_id]
-        await price_command(update, context)
-        return
-    
-    USER_STATES[user_id]["wallet_address"] = wallet_address
-    
-    persian_date, persian_time, persian_date_display, persian_time_full = get_iran_time()
-    tracking_code = f"{persian_date}{persian_time_full}-{user_id}"
-    
-    ORDER_COUNTERS["buy"] += 1
-    save_order_counters()
-    order_number = ORDER_COUNTERS["buy"]
-    
-    final_message = (
-        f"🎉 *سفارش خريد شما ثبت شد* \n\n"
-        f"💰  مبلغ واريز شما: `{user_state['amount']:,}` تومان\n"
-        f"🔢 تعداد تتر دريافتي شما: `{user_state['final_tether_amount']:.2f}` تتر\n"
-        f"💵 قيمت خريد: `{user_state['current_price']:,}` تومان\n"
-        f"🌐 شبکه انتخابی شما: {NETWORK_DISPLAY_NAMES[user_state['selected_network']]}\n"
-        f"💼 آدرس کيف پول شما:\n`{wallet_address}`\n\n"
-        f"🆔 کد پيگيري:\n`{tracking_code}`\n\n"
-        f"📅 {persian_date_display} - {persian_time}\n\n"
-        "📞 **لطفاً اين پيام را براي پشتيباني ارسال کنيد:**\n@TTeercom\n\n"
-        "⏰ **توجه:** اين سفارش تنها به مدت 10 دقيقه معتبر است و پس از آن قيمت ممکن است تغيير کند."
-    )
-    
-    await update.message.reply_text(final_message, parse_mode='Markdown', reply_markup=main_menu_keyboard())
-    
-    if ADMIN_SETTINGS["order_notifications"]:
-        try:
-            admin_message = (
-                f"🛒 *سفارش خريد #{order_number}* \n\n"
-                f"👤 کاربر: {update.message.from_user.first_name}\n"
-                f"🆔 کاربري: `{user_id}`\n"
-                f"📞 تماس با کاربر: [کليک کنيد](tg://user?id={user_id})\n\n"
-                f"💰 مبلغ دريافتي ما: {user_state['amount']:,} تومان\n"
-                f"🔢 تتر پرداختي ما: {user_state['final_tether_amount']:.2f}\n"
-                f"💵 قيمت: {user_state['current_price']:,} تومان\n"
-                f"🌐 شبکه: {user_state['selected_network']}\n"
-                f"💼 آدرس کيف پول مشتري:\n`{wallet_address}`\n\n"
-                f"🆔 کد پيگيري: `{tracking_code}`"
-            )
-            
-            await context.bot.send_message(chat_id=ADMIN_USER_ID, text=admin_message, parse_mode='Markdown')
-        except Exception as e:
-            logging.error(f"خطا در ارسال به ادمين: {e}")
-    
-    del USER_STATES[user_id]
-
-# ================== سيستم فروش (با اطلاعات بانکي جديد) ==================
-async def show_sell_options(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    tether_price, _, _, _ = await get_accurate_prices()
-    sell_price = tether_price - 1500
-    
-    USER_STATES[user_id] = {
-        "waiting_for_sell_amount": True,
-        "service_type": "sell",
-        "current_price": tether_price,
-        "sell_price": sell_price
-    }
-    
-    await update.message.reply_text(
-        f"💵 *فروش تتر به ما* \n\n💰 قيمت فعلي خريد تتر: {tether_price:,} تومان\n"
-        f"💰 *قيمت فعلي فروش تتر* : *{sell_price:,}* *تومان* \n\n"
-        "لطفاً تعداد تتر مورد نظر را وارد کنيد:\n\nمثال: 10\n\n"
-        "يا از دکمه‌هاي زير انتخاب کنيد:",
-        reply_markup=ReplyKeyboardMarkup([
-            [KeyboardButton("10 تتر"), KeyboardButton("20 تتر")],
-            [KeyboardButton("50 تتر"), KeyboardButton("100 تتر")],
-            [KeyboardButton("🟢 قيمت الان چند؟")]
-        ], resize_keyboard=True)
-    )
-
-async def handle_sell_amount(update: Update, context: ContextTypes.DEFAULT_TYPE, amount_text):
-    user_id = update.message.from_user.id
-    user_state = USER_STATES[user_id]
-    sell_price = user_state["sell_price"]
-    
-    if amount_text == "🟢 قيمت الان چند؟":
-        await price_command(update, context)
-        return
-    
-    try:
-        clean_amount = re.sub(r'[^\d]', '', amount_text)
-        tether_amount = float(clean_amount)
-        
-        if tether_amount < 1:
-            await update.message.reply_text(
-                "❌ تعداد بسيار کم!\n\nحداقل تعداد فروش 1 تتر است.\n\nلطفاً تعداد معتبر وارد کنيد:",
-                reply_markup=ReplyKeyboardMarkup([
-                    [KeyboardButton("10 تتر"), KeyboardButton("20 تتر")],
-                    [KeyboardButton("50 تتر"), KeyboardButton("100 تتر")],
-                    [KeyboardButton("🟢 قيمت الان چند؟")]
-                ], resize_keyboard=True)
-            )
-            return
-        
-        amount = int(tether_amount * sell_price)
-        
-        USER_STATES[user_id] = {
-            "waiting_for_sell_network": True,
-            "tether_amount": tether_amount,
-            "amount": amount,
-            "sell_price": sell_price
-        }
-        
-        await update.message.reply_text(
-            f"✅ *خلاصه سفارش فروش* \n\n🔢 *تعداد تتر فروشي شما:*  {tether_amount}\n"
-            f"💰 مبلغ دريافتي شما: *{amount:,}* تومان\n\n"
-            "آيا از سفارش خود اطمينان داريد?",
-            reply_markup=ReplyKeyboardMarkup([
-                [KeyboardButton("✅ تأييد و ادامه"), KeyboardButton("❌ انصراف")],
-                [KeyboardButton("🟢 قيمت الان چند؟")]
-            ], resize_keyboard=True)
-        )
-        
-    except ValueError:
-        await update.message.reply_text(
-            "❌ تعداد نامعتبر!\n\nلطفاً تعداد تتر را به صورت عددي وارد کنيد:\n\nمثال: 10",
-            reply_markup=ReplyKeyboardMarkup([
-                [KeyboardButton("10 تتر"), KeyboardButton("20 تتر")],
-                [KeyboardButton("50 تتر"), KeyboardButton("100 تتر")],
-                [KeyboardButton("🟢 قيمت الان چند؟")]
-            ], resize_keyboard=True)
-        )
-
-async def handle_sell_network_selection(update: Update, context: ContextTypes.DEFAULT_TYPE, network):
-    user_id = update.message.from_user.id
-    user_state = USER_STATES[user_id]
-    
-    USER_STATES[user_id] = {
-        "waiting_for_card_number": True,
-        "tether_amount": user_state["tether_amount"],
-        "amount": user_state["amount"],
-        "sell_price": user_state["sell_price"],
-        "selected_network": network
-    }
-    
-    await update.message.reply_text(
-        "💳 *لطفا شماره کارت خود را جهت واريز وجه وارد کنيد* \n\n"
-        "⚠️⚠️  در صورت اينکه شماره کارت به نام غير باشد وجه واريز نخواهد شد",
-        reply_markup=ReplyKeyboardMarkup([
-            [KeyboardButton("لازم نيست")],
-            [KeyboardButton("🟢 قيمت الان چند؟")]
-        ], resize_keyboard=True)
-    )
-
-async def handle_card_number(update: Update, context: ContextTypes.DEFAULT_TYPE, card_number):
-    user_id = update.message.from_user.id
-    user_state = USER_STATES[user_id]
-    
-    if card_number == "🟢 قيمت الان چند؟":
-        await price_command(update, context)
-        return
-    
-    if card_number == "لازم نيست":
-        card_number = ""
-    
-    USER_STATES[user_id] = {
-        "waiting_for_account_number": True,
-        "tether_amount": user_state["tether_amount"],
-        "amount": user_state["amount"],
-        "sell_price": user_state["sell_price"],
-        "selected_network": user_state["selected_network"],
-        "card_number": card_number
-    }
-    
-    await update.message.reply_text(
-        "🏦 *لطفاً شماره حساب خود را وارد کنيد* ",
-        reply_markup=ReplyKeyboardMarkup([
-            [KeyboardButton("لازم نيست")],
-            [KeyboardButton("🟢 قيمت الان چند؟")]
-        ], resize_keyboard=True)
-    )
-
-async def handle_account_number(update: Update, context: ContextTypes.DEFAULT_TYPE, account_number):
-    user_id = update.message.from_user.id
-    user_state = USER_STATES[user_id]
-    
-    if account_number == "🟢 قيمت الان چند؟":
-        await price_command(update, context)
-        return
-    
-    if account_number == "لازم نيست":
-        account_number = ""
-    
-    USER_STATES[user_id] = {
-        "waiting_for_sheba_number": True,
-        "tether_amount": user_state["tether_amount"],
-        "amount": user_state["amount"],
-        "sell_price": user_state["sell_price"],
-        "selected_network": user_state["selected_network"],
-        "card_number": user_state["card_number"],
-        "account_number": account_number
-    }
-    
-    await update.message.reply_text(
-        "🌐 **لطفاً شماره شبا خود را وارد کنيد**\n\n"
-        "💡💡 نيازي به وارد کردن IR نيست، فقط اعداد را وارد کنيد",
-        reply_markup=ReplyKeyboardMarkup([
-            [KeyboardButton("لازم نيست")],
-            [KeyboardButton("🟢 قيمت الان چند؟")]
-        ], resize_keyboard=True)
-    )
-
-async def handle_sheba_number(update: Update, context: ContextTypes.DEFAULT_TYPE, sheba_number):
-    user_id = update.message.from_user.id
-    user_state = USER_STATES[user_id]
-    
-    if sheba_number == "🟢 قيمت الان چند؟":
-        await price_command(update, context)
-        return
-    
-    if sheba_number == "لازم نيست":
-        sheba_number = ""
-        sheba_display = ""
-    else:
-        # اضافه کردن IR به شماره شبا اگر وجود ندارد
-        sheba_display = sheba_number.upper()
-        if not sheba_display.startswith('IR'):
-            sheba_display = f'IR{sheba_display}'
-    
-    USER_STATES[user_id] = {
-        "waiting_for_account_holder": True,
-        "tether_amount": user_state["tether_amount"],
-        "amount": user_state["amount"],
-        "sell_price": user_state["sell_price"],
-        "selected_network": user_state["selected_network"],
-        "card_number": user_state["card_number"],
-        "account_number": user_state["account_number"],
-        "sheba_number": sheba_number,
-        "sheba_display": sheba_display
-    }
-    
-    await update.message.reply_text(
-        "👤 *لطفاً نام دارنده حساب را وارد کنيد* \n\n"
-        "⚠️هشدار مهم⚠️\n  حساب بايد به نام خودتان باشد، در غير اين صورت وجه واريز نخواهد شد",
-        reply_markup=ReplyKeyboardMarkup([[KeyboardButton("❌ انصراف")]], resize_keyboard=True)
-    )
-
-async def handle_account_holder(update: Update, context: ContextTypes.DEFAULT_TYPE, account_holder):
-    user_id = update.message.from_user.id
-    user_state = USER_STATES[user_id]
-    
-    if account_holder == "❌ انصراف":
-        if user_id in USER_STATES:
-            del USER_STATES[user_id]
-        await price_command(update, context)
-        return
-    
-    wallet_address = WALLET_ADDRESSES.get(user_state["selected_network"], "")
-    
-    if not wallet_address:
-        await update.message.reply_text(
-            "❌ آدرس کيف پول براي اين شبکه تنظيم نشده است.\n\nلطفاً با پشتيباني تماس بگيريد.",
-            reply_markup=main_menu_keyboard()
-        )
-        del USER_STATES[user_id]
-        return
-    
-    persian_date, persian_time, persian_date_display, persian_time_full = get_iran_time()
-    tracking_code = f"{persian_date}{persian_time_full}-{user_id}"
-    
-    ORDER_COUNTERS["sell"] += 1
-    save_order_counters()
-    order_number = ORDER_COUNTERS["sell"]
-    
-    # ساخت بخش اطلاعات بانکي به صورت شرطي
-    bank_info = "💳 **اطلاعات بانکي شما:**\n"
-    if user_state['card_number']:
-        bank_info += f"• شماره کارت:\n`{user_state['card_number']}`\n\n"
-    if user_state['account_number']:
-        bank_info += f"• شماره حساب:\n`{user_state['account_number']}`\n\n"
-    if user_state['sheba_display']:
-        bank_info += f"• شماره شبا:\n`{user_state['sheba_display']}`\n\n"
-    bank_info += f"• نام دارنده حساب:\n`{account_holder}`\n\n"
-    
-    final_message = (
-        f"🎉 *سفارش فروش شما ثبت شد* \n\n"
-        f"🔢 تعداد تتري که بايد واريز کنيد: `{user_state['tether_amount']}`\n"
-        f"🌐 شبکه: {NETWORK_DISPLAY_NAMES[user_state['selected_network']]}\n\n"
-        f"💼 آدرس کيف پول براي واريز:\n`{wallet_address}`\n\n"
-        "📞 **بعد از واريزي، فيش واريزي تتر را براي پشتيبان ارسال نماييد:**\n@TTeercom\n"
-        f"ــــــــــــــــــــــــــــــــــــــــــــــــــــــــــــــ\n\n"
-        f"💰 *مبلغ دريافتي شما* : `{user_state['amount']:,}` تومان\n"
-        f"💵 قيمت فروش: `{user_state['sell_price']:,}` تومان\n\n"
-        f"{bank_info}"
-        f"🆔 کد پيگيري:\n`{tracking_code}`\n"
-        f"📅 {persian_date_display} - {persian_time}\n\n"
-        "⏰ **توجه مهم:** اين فرآيند بايد حداکثر تا 10 دقيقه از زمان ثبت انجام شود."
-    )
-    
-    await update.message.reply_text(final_message, parse_mode='Markdown', reply_markup=main_menu_keyboard())
-    
-    if ADMIN_SETTINGS["order_notifications"]:
-        try:
-            # ساخت بخش اطلاعات بانکي براي ادمين
-            admin_bank_info = "💳 **اطلاعات بانکي:**\n"
-            if user_state['card_number']:
-                admin_bank_info += f"• شماره کارت: `{user_state['card_number']}`\n"
-            if user_state['account_number']:
-                admin_bank_info += f"• شماره حساب: `{user_state['account_number']}`\n"
-            if user_state['sheba_display']:
-                admin_bank_info += f"• شماره شبا: `{user_state['sheba_display']}`\n"
-            admin_bank_info += f"• نام دارنده حساب: `{account_holder}`\n\n"
-            
-            admin_message = (
-                f"💵 **سفارش فروش #{order_number}**\n\n"
-                f"👤 کاربر: {update.message.from_user.first_name}\n"
-                f"🆔 کاربري: `{user_id}`\n"
-                f"📞 تماس با کاربر: [کليک کنيد](tg://user?id={user_id})\n\n"
-                f"🔢 تتر دريافتي: {user_state['tether_amount']}\n"
-                f"💰 *مبلغي پرداختي ما:* `{user_state['amount']:,}` *تومان*\n"
-                f"💵 قيمت فروش: {user_state['sell_price']:,} تومان\n"
-                f"🌐 شبکه: {user_state['selected_network']}\n\n"
-                f"{admin_bank_info}"
-                f"🆔 کد پيگيري: `{tracking_code}`"
-            )
-            
-            await context.bot.send_message(chat_id=ADMIN_USER_ID, text=admin_message, parse_mode='Markdown')
-        except Exception as e:
-            logging.error(f"خطا در ارسال به ادمين: {e}")
-    
-    del USER_STATES[user_id]
-
-# ================== سيستم دريافت قيمت‌ها ==================
-async def get_accurate_prices():
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-        'Accept': 'application/json'
-    }
-    
-    tether_price = 0
-    try:
-        response = requests.get('https://api.kifpool.app/api/spot/price/paginated?offset=0&limit=25', headers=headers, timeout=10)
-        data = response.json()
-        if 'data' in data:
-            for item in data['data']:
-                if item.get('symbol') == 'USDT':
-                    tether_price = int(item.get('priceSellIRT', 0))
-                    break
-    except Exception as e:
-        logging.error(f"❌ خطا در دريافت قيمت تتر: {e}")
-
-    gold_price = 0
-    try:
-        response = requests.get('https://milli.gold/api/v1/public/milli-price/external', headers=headers, timeout=10)
-        data = response.json()
-        if 'price18' in data:
-            gold_price = int(data['price18']) * 100
-    except Exception as e:
-        logging.error(f"❌ خطا در دريافت قيمت طلا: {e}")
-
-    gold_ounce = 0
-    try:
-        response = requests.get('https://data-asg.goldprice.org/dbXRates/USD', headers=headers, timeout=10)
-        data = response.json()
-        if 'items' in data and len(data['items']) > 0:
-            gold_ounce = int(float(data['items'][0]['xauPrice']))
-    except Exception as e:
-        logging.error(f"❌ خطا در دريافت انس جهاني: {e}")
-
-    gold_dollar_price = 0
-    if gold_price > 0 and gold_ounce > 0:
-        try:
-            gold_dollar_price = int((gold_price * 31.1035) / (gold_ounce * 0.75))
-        except:
-            gold_dollar_price = 0
-
-    return tether_price, gold_price, gold_ounce, gold_dollar_price
-
-# ================== دستورات کاربري ==================
-async def price_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    if user_id in USER_STATES:
-        del USER_STATES[user_id]
-    
-    wait_msg = await update.message.reply_text("🔄 در حال دريافت آخرين قيمت‌ها...")
-    tether_price, gold_price, gold_ounce, gold_dollar_price = await get_accurate_prices()
-    persian_date, persian_time, persian_date_display, _ = get_iran_time()
-    
-    tether_display = f"{tether_price:,}" if tether_price > 0 else "0"
-    gold_display = f"{gold_price:,}" if gold_price > 0 else "0"
-    gold_ounce_display = f"{gold_ounce:,}" if gold_ounce > 0 else "0"
-    gold_dollar_display = f"{gold_dollar_price:,}" if gold_dollar_price > 0 else "0"
-    
-    message = f"""🟢 *قيمت الان...*
-
- ▫️ *نرخ تتر*                   `{tether_display}` تومان
-▫️ *طلا 18 عيار*     `{gold_display}` تومان 
- ▫️ *انس جهاني*                `{gold_ounce_display}` دلار
- ▫️ *قيمت دلار طلا*       `{gold_dollar_display}` تومان
-
-ــــــــــــــــــــــــــــــــــــــــــــــــــــــــــــــ
-📅{persian_date_display}
-⏰{persian_time}
-
-🤖 [قيمت الان چند؟](https://t.me/TTeer_com_bot)"""
-    
-    await wait_msg.delete()
-    await update.message.reply_text(message, parse_mode='Markdown', reply_markup=main_menu_keyboard())
-
-def main_menu_keyboard():
-    keyboard = [
-        [KeyboardButton("🟢 قيمت لحظه اي تتر و طلا")],
-        [KeyboardButton("🛒 خريد تتر از ما"), KeyboardButton("💵 فروش تتر به ما")],
-        [KeyboardButton("📖 راهنما"), KeyboardButton("📢 کانال ما")]
-    ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-
-async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    user_name = update.message.from_user.first_name
-    save_user(user_id, user_name)
-    
-    welcome_message = f"""👋 سلام {user_name}!
-به ربات تتردات کام خوش آمديد!
-
-💡 **امکانات ربات:**
-• دريافت قيمت لحظه‌اي تتر و طلا
-• خريد و فروش امن تتر
-• پشتيباني 24 ساعته
-
-📢 **کانال اطلاع‌رساني ما:**
-@TTeer_com
-
-لطفاً يکي از گزينه‌هاي زير را انتخاب کنيد:"""
-    
-    await update.message.reply_text(welcome_message, reply_markup=main_menu_keyboard())
-
-# ================== دستورات مديريت کانال ==================
-async def set_interval_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    if user_id != ADMIN_USER_ID:
-        await update.message.reply_text("❌ دسترسي denied!")
-        return
-    
-    if not context.args:
-        await update.message.reply_text(
-            "📝 **دستور تنظيم فاصله ارسال به کانال:**\n\nUsage: /setinterval <دقيقه>\n\nمثال:\n/setinterval 30\n/setinterval 15"
-        )
-        return
-    
-    try:
-        interval = int(context.args[0])
-        if interval < 5:
-            await update.message.reply_text("❌ فاصله ارسال نمي‌تواند کمتر از 5 دقيقه باشد!")
-            return
-        
-        ADMIN_SETTINGS["channel_interval"] = interval
-        save_admin_settings(ADMIN_SETTINGS)
-        
-        # توقف و راه‌اندازي مجدد job با فاصله جديد
-        job_queue = context.application.job_queue
-        if job_queue:
-            # حذف jobهاي قبلي
-            for job in job_queue.jobs():
-                if job.name == "channel_price_job":
-                    job.schedule_removal()
-            
-            # ايجاد job جديد با فاصله جديد
-            job_queue.run_repeating(
-                send_channel_price,
-                interval=interval * 60,  # تبديل به ثانيه
-                first=10,  # 10 ثانيه بعد
-                name="channel_price_job"
-            )
-        
-        await update.message.reply_text(f"✅ فاصله ارسال به کانال به {interval} دقيقه تنظيم شد!")
-        
-    except ValueError:
-        await update.message.reply_text("❌ مقدار نامعتبر! لطفاً يک عدد وارد کنيد.")
-
-async def send_now_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    if user_id != ADMIN_USER_ID:
-        await update.message.reply_text("❌ دسترسي denied!")
-        return
-    
-    try:
-        await send_channel_price(context)
-        await update.message.reply_text("✅ قيمت با موفقيت به کانال ارسال شد!")
-    except Exception as e:
-        await update.message.reply_text(f"❌ خطا در ارسال به کانال: {e}")
-
-async def channel_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    if user_id != ADMIN_USER_ID:
-        await update.message.reply_text("❌ دسترسي denied!")
-        return
-    
-    try:
-        # بررسي وضعيت کانال
-        channel_info = await context.bot.get_chat(CHANNEL_ID)
-        channel_members = await context.bot.get_chat_members_count(CHANNEL_ID)
-        
-        status_message = f"""
-📊 **وضعيت کانال:**
-
-📢 نام کانال: {channel_info.title}
-👥 تعداد اعضا: {channel_members}
-⏰ فاصله ارسال: {ADMIN_SETTINGS['channel_interval']} دقيقه
-🟢 وضعيت ارسال خودکار: ✅ فعال
-
-🛠️ **دستورات مديريت کانال:**
-• /setinterval <دقيقه> - تنظيم فاصله ارسال
-• /sendnow - ارسال فوري قيمت
-• /channelstatus - نمايش اين وضعيت
-"""
-        await update.message.reply_text(status_message)
-    except Exception as e:
-        await update.message.reply_text(f"❌ خطا در دريافت وضعيت کانال: {e}")
-
-# ================== دستورات مديريتي ==================
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    
-    if user_id == ADMIN_USER_ID:
-        await admin_help_command(update, context)
-        return
-    
-    help_text = """
-📖 **راهنماي ربات تتردات کام:**
-
-🛒 **خريد تتر:**
-1. انتخاب گزينه "خريد تتر از ما"
-2. وارد کردن کد اشتراک و کد ملي
-3. انتخاب مبلغ مورد نظر
-4. انتخاب شبکه و وارد کردن آدرس کيف پول
-
-💵 **فروش تتر:**
-1. انتخاب گزينه "فروش تتر به ما" 
-2. وارد کردن کد اشتراک و کد ملي
-3. وارد کردن تعداد تتر
-4. انتخاب شبکه براي واريز
-
-💰 **ساير امکانات:**
-• دريافت قيمت لحظه‌اي تتر و طلا
-• پشتيباني 24 ساعته
-
-📞 پشتيباني:\n @TTeercom
-📢 کانال:\n @TTeer_com
-"""
-    await update.message.reply_text(help_text, reply_markup=main_menu_keyboard())
-
-async def admin_help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    if user_id != ADMIN_USER_ID:
-        await update.message.reply_text("❌ دسترسي denied!")
-        return
-    
-    notifications_status = "✅ روشن" if ADMIN_SETTINGS["order_notifications"] else "❌ خاموش"
-    interval_status = f"{ADMIN_SETTINGS['channel_interval']} دقيقه"
-    
-    help_text = f"""
-🛠️ **دستورات مديريتي ربات**
-
-📊 **آمار و مديريت:**
-• /stats - نمايش آمار کاربران
-• /broadcast <پيام> - ارسال پيام به همه کاربران
-• /togglenotifications - تغيير وضعيت اطلاع‌رساني ({notifications_status})
-
-📢 **مديريت کانال:**
-• /setinterval <دقيقه> - تنظيم فاصله ارسال به کانال ({interval_status})
-• /sendnow - ارسال فوري قيمت به کانال
-• /channelstatus - نمايش وضعيت کانال
-
-💰 **مديريت کيف پول:**
-• /setwallet <شبکه> <آدرس> - تنظيم آدرس کيف پول
-• /wallets - نمايش آدرس‌هاي فعلي
-
-🔐 **مديريت کدهاي اشتراک:**
-• /addcode <کد> <کد_ملي> - اضافه کردن کد اشتراک
-• /removecode <کد> - حذف کد اشتراک
-• /listcodes - نمايش همه کدها
-• /togglecode <کد> - فعال/غيرفعال کردن کد
-
-🔧 **ساير دستورات:**
-• /admin - نمايش اين راهنما
-• /help - نمايش راهنماي کاربري
-
-📝 **مثال‌ها:**
-• /setwallet TRC20 TUvQ6SdWNkj8q7auUegsj7hXADeMhtgExX
-• /broadcast اطلاعيه جديد
-• /addcode 123456 1234567890
-• /setinterval 15
-• /sendnow
-"""
-    await update.message.reply_text(help_text)
-
-async def toggle_notifications_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    if user_id != ADMIN_USER_ID:
-        await update.message.reply_text("❌ دسترسي denied!")
-        return
-    
-    ADMIN_SETTINGS["order_notifications"] = not ADMIN_SETTINGS["order_notifications"]
-    save_admin_settings(ADMIN_SETTINGS)
-    
-    status = "✅ روشن" if ADMIN_SETTINGS["order_notifications"] else "❌ خاموش"
-    await update.message.reply_text(f"✅ وضعيت اطلاع‌رساني سفارشات به {status} تغيير کرد.")
-
-async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    if user_id != ADMIN_USER_ID:
-        await update.message.reply_text("❌ دسترسي denied!")
-        return
-    
-    total_users = USER_STATS["total_users"]
-    active_users = len([user for user in USERS_DB if USERS_DB[user]["verified"]])
-    
-    stats_text = f"""
-📊 **آمار ربات**
-
-👥 تعداد کل کاربران: {total_users}
-✅ کاربران فعال: {active_users}
-🔄 کاربران در حال تراکنش: {len(USER_STATES)}
-⏰ فاصله ارسال به کانال: {ADMIN_SETTINGS['channel_interval']} دقيقه
-
-📈 **آخرين کاربران:**
-"""
-    
-    user_count = 0
-    for user_id, user_data in list(USER_STATS["users"].items())[-5:]:
-        user_count += 1
-        stats_text += f"\n{user_count}. {user_data['name']} - {user_data['join_date']}"
-    
-    await update.message.reply_text(stats_text)
-
-async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    if user_id != ADMIN_USER_ID:
-        await update.message.reply_text("❌ دسترسي denied!")
-        return
-    
-    if not context.args:
-        await update.message.reply_text("📢 **دستور ارسال پيام همگاني:**\n\nUsage: /broadcast <پيام>\n\nمثال:\n/broadcast اطلاعيه مهم")
-        return
-    
-    message = ' '.join(context.args)
-    users_count = 0
-    failed_count = 0
-    
-    for user_id in USER_STATS["users"]:
-        try:
-            await context.bot.send_message(chat_id=user_id, text=f"📢 **پيام همگاني:**\n\n{message}")
-            users_count += 1
-        except:
-            failed_count += 1
-    
-    await update.message.reply_text(f"✅ ارسال پيام همگاني انجام شد:\n\n✅ موفق: {users_count} کاربر\n❌ ناموفق: {failed_count} کاربر")
-
-async def set_wallet_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    if user_id != ADMIN_USER_ID:
-        await update.message.reply_text("❌ دسترسي denied!")
-        return
-    
-    if not context.args or len(context.args) < 2:
-        await update.message.reply_text(
-            "📝 **دستور تنظيم آدرس کيف پول:**\n\nUsage: /setwallet <network> <address>\n\n"
-            "🌐 شبکه‌هاي موجود:\n- ERC20\n- TRC20\n- BEP20\n- Solana\n\n"
-            "مثال:\n/setwallet TRC20 TUvQ6SdWNkj8q7auUegsj7hXADeMhtgExX"
-        )
-        return
-    
-    network = context.args[0].upper()
-    address = ' '.join(context.args[1:])
-    
-    if network not in NETWORK_FEES:
-        await update.message.reply_text("❌ شبکه نامعتبر!\n\nشبکه‌هاي معتبر:\n- ERC20\n- TRC20\n- BEP20\n- Solana")
-        return
-    
-    WALLET_ADDRESSES[network] = address
-    save_wallet_addresses(WALLET_ADDRESSES)
-    
-    await update.message.reply_text(
-        f"✅ آدرس کيف پول براي شبکه {NETWORK_DISPLAY_NAMES[network]} با موفقيت تنظيم شد!\n\nآدرس جديد:\n`{address}`",
-        parse_mode='Markdown'
-    )
-
-async def show_wallets_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    if user_id != ADMIN_USER_ID:
-        await update.message.reply_text("❌ دسترسي denied!")
-        return
-    
-    message = "💰 **آدرس‌هاي کيف پول فعلي:**\n\n"
-    for network, address in WALLET_ADDRESSES.items():
-        display_name = NETWORK_DISPLAY_NAMES.get(network, network)
-        message += f"🌐 {display_name}:\n`{address}`\n\n"
-    
-    await update.message.reply_text(message, parse_mode='Markdown')
-
-async def add_code_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    if user_id != ADMIN_USER_ID:
-        await update.message.reply_text("❌ دسترسي denied!")
-        return
-    
-    if not context.args or len(context.args) < 2:
-        await update.message.reply_text(
-            "📝 **دستور اضافه کردن کد اشتراک:**\n\nUsage: /addcode <کد> <کد_ملي>\n\nمثال:\n/addcode 123456 1234567890"
-        )
-        return
-    
-    code = context.args[0]
-    national_code = context.args[1]
-    
-    if code in SUBSCRIBE_CODES:
-        await update.message.reply_text(f"❌ کد اشتراک '{code}' از قبل وجود دارد!")
-        return
-    
-    SUBSCRIBE_CODES[code] = {"national_code": national_code, "active": True}
-    save_subscribe_codes()
-    
-    await update.message.reply_text(f"✅ کد اشتراک '{code}' با موفقيت اضافه شد!\n\nکد ملي مرتبط: {national_code}")
-
-async def remove_code_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    if user_id != ADMIN_USER_ID:
-        await update.message.reply_text("❌ دسترسي denied!")
-        return
-    
-    if not context.args:
-        await update.message.reply_text("📝 **دستور حذف کد اشتراک:**\n\nUsage: /removecode <کد>\n\nمثال:\n/removecode 123456")
-        return
-    
-    code = context.args[0]
-    if code not in SUBSCRIBE_CODES:
-        await update.message.reply_text(f"❌ کد اشتراک '{code}' وجود ندارد!")
-        return
-    
-    del SUBSCRIBE_CODES[code]
-    save_subscribe_codes()
-    await update.message.reply_text(f"✅ کد اشتراک '{code}' با موفقيت حذف شد!")
-
-async def list_codes_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    if user_id != ADMIN_USER_ID:
-        await update.message.reply_text("❌ دسترسي denied!")
-        return
-    
-    if not SUBSCRIBE_CODES:
-        await update.message.reply_text("❌ هيچ کد اشتراکي وجود ندارد!")
-        return
-    
-    message = "📋 **ليست کدهاي اشتراک:**\n\n"
-    for code, data in SUBSCRIBE_CODES.items():
-        status = "✅ فعال" if data["active"] else "❌ غيرفعال"
-        message += f"🔸 کد: `{code}`\n   کد ملي: `{data['national_code']}`\n   وضعيت: {status}\n\n"
-    
-    await update.message.reply_text(message, parse_mode='Markdown')
-
-async def toggle_code_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    if user_id != ADMIN_USER_ID:
-        await update.message.reply_text("❌ دسترسي denied!")
-        return
-    
-    if not context.args:
-        await update.message.reply_text("📝 **دستور فعال/غيرفعال کردن کد اشتراک:**\n\nUsage: /togglecode <کد>\n\nمثال:\n/togglecode 123456")
-        return
-    
-    code = context.args[0]
-    if code not in SUBSCRIBE_CODES:
-        await update.message.reply_text(f"❌ کد اشتراک '{code}' وجود ندارد!")
-        return
-    
-    SUBSCRIBE_CODES[code]["active"] = not SUBSCRIBE_CODES[code]["active"]
-    save_subscribe_codes()
-    status = "فعال" if SUBSCRIBE_CODES[code]["active"] else "غيرفعال"
-    await update.message.reply_text(f"✅ کد اشتراک '{code}' با موفقيت {status} شد!")
-
-# ================== هندلر اصلي پيام‌ها ==================
-async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    text = update.message.text
-    
-    if user_id in USER_STATES:
-        state = USER_STATES[user_id]
-        
-        if state.get("waiting_for_subscribe_code"):
-            await verify_subscription_code(update, context, text)
-            return
-        
-        elif state.get("waiting_for_national_code"):
-            await verify_national_code(update, context, text)
-            return
-        
-        elif state.get("waiting_for_buy_amount"):
-            await handle_buy_amount(update, context, text)
-            return
-        
-        elif state.get("waiting_for_sell_amount"):
-            await handle_sell_amount(update, context, text)
-            return
-        
-        elif state.get("waiting_for_network"):
-            if text == "✅ تأييد و ادامه":
-                await update.message.reply_text(
-                    "🌐 **لطفاً شبکه مورد نظر را انتخاب کنيد:**\n\n💰 **کارمزد شبکه‌ها:**\n"
-                    "• ERC20 (اتريوم) - 7 تتر\n• TRC20 (ترون) - 5 تتر\n"
-                    "• BEP20 (بايننس) - 2 تتر\n• Solana (سولانا) - 2 تتر",
-                    reply_markup=ReplyKeyboardMarkup([
-                        [KeyboardButton("ERC20 (اتريوم)"), KeyboardButton("TRC20 (ترون)")],
-                        [KeyboardButton("BEP20 (بايننس)"), KeyboardButton("Solana (سولانا)")],
-                        [KeyboardButton("🟢 قيمت الان چند؟")]
-                    ], resize_keyboard=True)
-                )
-                return
-            elif text in ["ERC20 (اتريوم)", "TRC20 (ترون)", "BEP20 (بايننس)", "Solana (سولانا)"]:
-                network_map = {
-                    "ERC20 (اتريوم)": "ERC20", "TRC20 (ترون)": "TRC20", 
-                    "BEP20 (بايننس)": "BEP20", "Solana (سولانا)": "Solana"
-                }
-                network = network_map[text]
-                await handle_network_selection(update, context, network)
-                return
-            elif text in ["❌ انصراف", "🟢 قيمت الان چند؟"]:
-                del USER_STATES[user_id]
-                await price_command(update, context)
-                return
-        
-        elif state.get("waiting_for_wallet"):
-            if text == "❌ انصراف":
-                if user_id in USER_STATES:
-                    del USER_STATES[user_id]
-                await price_command(update, context)
-                return
-            else:
-                await handle_wallet_address(update, context, text)
-                return
-        
-        elif state.get("waiting_for_sell_network"):
-            if text == "✅ تأييد و ادامه":
-                await update.message.reply_text(
-                    "🌐 لطفاً شبکه مورد نظر براي واريز تتر را انتخاب کنيد:",
-                    reply_markup=ReplyKeyboardMarkup([
-                        [KeyboardButton("ERC20 (اتريوم)"), KeyboardButton("TRC20 (ترون)")],
-                        [KeyboardButton("BEP20 (بايننس)"), KeyboardButton("Solana (سولانا)")],
-                        [KeyboardButton("🟢 قيمت الان چند؟")]
-                    ], resize_keyboard=True)
-                )
-                return
-            elif text in ["ERC20 (اتريوم)", "TRC20 (ترون)", "BEP20 (بايننس)", "Solana (سولانا)"]:
-                network_map = {
-                    "ERC20 (اتريوم)": "ERC20", "TRC20 (ترون)": "TRC20", 
-                    "BEP20 (بايننس)": "BEP20", "Solana (سولانا)": "Solana"
-                }
-                network = network_map[text]
-                await handle_sell_network_selection(update, context, network)
-                return
-            elif text in ["❌ انصراف", "🟢 قيمت الان چند؟"]:
-                del USER_STATES[user_id]
-                await price_command(update, context)
-                return
-        
-        # حالت جديد: انتظار براي شماره کارت
-        elif state.get("waiting_for_card_number"):
-            if text == "🟢 قيمت الان چند؟":
-                await price_command(update, context)
-                return
-            else:
-                await handle_card_number(update, context, text)
-                return
-        
-        # حالت جديد: انتظار براي شماره حساب
-        elif state.get("waiting_for_account_number"):
-            if text == "🟢 قيمت الان چند؟":
-                await price_command(update, context)
-                return
-            else:
-                await handle_account_number(update, context, text)
-                return
-        
-        # حالت جديد: انتظار براي شماره شبا
-        elif state.get("waiting_for_sheba_number"):
-            if text == "🟢 قيمت الان چند؟":
-                await price_command(update, context)
-                return
-            else:
-                await handle_sheba_number(update, context, text)
-                return
-        
-        # حالت جديد: انتظار براي نام دارنده حساب
-        elif state.get("waiting_for_account_holder"):
-            if text == "❌ انصراف":
-                if user_id in USER_STATES:
-                    del USER_STATES[user_id]
-                await price_command(update, context)
-                return
-            else:
-                await handle_account_holder(update, context, text)
-                return
-    
-    if text == "🟢 قيمت لحظه اي تتر و طلا":
-        await price_command(update, context)
-    elif text == "🛒 خريد تتر از ما":
-        await request_subscription_code(update, context, "buy")
-    elif text == "💵 فروش تتر به ما":
-        await request_subscription_code(update, context, "sell")
-    elif text == "📢 کانال ما":
-        await update.message.reply_text(
-            "📢 **کانال اطلاع‌رساني ما:**\n\n👉 @TTeer_com\n\n✅ قيمت‌هاي لحظه‌اي\n✅ اخبار و اطلاعيه‌ها",
-            reply_markup=main_menu_keyboard()
-        )
-    elif text == "📖 راهنما":
-        await help_command(update, context)
-    elif text == "🟢 قيمت الان چند؟":
-        await price_command(update, context)
-    else:
-        await update.message.reply_text("❌ دستور نامعتبر\nلطفاً از دکمه‌هاي زير استفاده کنيد:", reply_markup=main_menu_keyboard())
-
-
- # ================== سرور سلامت براي Render ==================
-async def health_check(request):
-    return web.Response(text="Bot is running!")
-
-def run_health_server():
-    app = web.Application()
-    app.router.add_get('/', health_check)
-    app.router.add_get('/health', health_check)
-    web.run_app(app, port=8000, host='0.0.0.0')
- # ==================
-    
-   # ================== اجراي ربات ==================
-def main():
-    print("🚀 ربات تتردات کام با سيستم خريد و فروش پيشرفته فعال شد...")
-    
-    # راه‌اندازی سرور سلامت در thread جداگانه
-    health_thread = threading.Thread(target=run_health_server, daemon=True)
-    health_thread.start()
-    print("✅ Health server started on port 8000")
-    
-    application = Application.builder().token(TOKEN).build()
-    
-    # حذف webhook
-    try:
-        application.bot.delete_webhook(drop_pending_updates=True)
-        print("✅ Webhook حذف شد")
-    except Exception as e:
-        print(f"⚠️ خطا در حذف webhook: {e}")
-
-    # JobQueue برای ارسال به کانال
-    job_queue = application.job_queue
-    if job_queue:
-        # اطمينان از وجود کليد channel_interval
-        if "channel_interval" not in ADMIN_SETTINGS:
-            ADMIN_SETTINGS["channel_interval"] = 30
-            save_admin_settings(ADMIN_SETTINGS)
-            
-        interval_seconds = ADMIN_SETTINGS["channel_interval"] * 60
-        job_queue.run_repeating(
-            send_channel_price,
-            interval=interval_seconds,
-            first=10,
-            name="channel_price_job"
-        )
-        print(f"✅ سيستم ارسال خودکار به کانال فعال شد - فاصله: {ADMIN_SETTINGS['channel_interval']} دقيقه")
-    else:
-        print("⚠️ JobQueue غيرفعال است")
-    
-    # اضافه کردن هندلرها
-    application.add_handler(CommandHandler("start", start_command))
-    application.add_handler(CommandHandler("price", price_command))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("admin", admin_help_command))
-    application.add_handler(CommandHandler("togglenotifications", toggle_notifications_command))
-    application.add_handler(CommandHandler("setwallet", set_wallet_command))
-    application.add_handler(CommandHandler("wallets", show_wallets_command))
-    application.add_handler(CommandHandler("stats", stats_command))
-    application.add_handler(CommandHandler("broadcast", broadcast_command))
-    application.add_handler(CommandHandler("addcode", add_code_command))
-    application.add_handler(CommandHandler("removecode", remove_code_command))
-    application.add_handler(CommandHandler("listcodes", list_codes_command))
-    application.add_handler(CommandHandler("togglecode", toggle_code_command))
-    application.add_handler(CommandHandler("setinterval", set_interval_command))
-    application.add_handler(CommandHandler("sendnow", send_now_command))
-    application.add_handler(CommandHandler("channelstatus", channel_status_command))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-    
-    print("✅ ربات آماده اجرا است...")
-    print(f"📢 سيستم ارسال خودکار قيمت به کانال هر {ADMIN_SETTINGS['channel_interval']} دقيقه فعال است")
-    application.run_polling(drop_pending_updates=True)
-
-if __name__ == "__main__":
-    main()
-
+from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
+from telegram.error import BadRequest, RetryAfter, TelegramError
+from telegram.request import HTTPXRequest
+from telegram.ext import Application, BaseUpdateProcessor, CommandHandler, ContextTypes, MessageHandler, filters
+import jdatetime
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import logging
+import re
+import json
+import heapq
+import hmac
+import hashlib
+import csv
+import io
+import bisect
+import math
+import mmap
+import struct
+from array import array
+from enum import Enum
+import statistics
+import os
+import time
+import sqlite3
+from collections import namedtuple
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import itertools
+import aiohttp
+from aiohttp import web
+import signal
+
+# ================== تنظيمات اوليه ==================
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+TOKEN = os.environ.get('TOKEN', '')
+ADMIN_USER_ID = int(os.environ.get('ADMIN_USER_ID', 0))
+CHANNEL_ID = os.environ.get('CHANNEL_ID', '')
+
+# ================== توابع کمکي ==================
+IRAN_TZ = ZoneInfo("Asia/Tehran")
+
+IranTime = namedtuple("IranTime", ["persian_date", "persian_time", "persian_date_display", "persian_time_full"])
+
+# تاريخ شمسي فقط با تغيير روز دوباره محاسبه مي‌شود
+IRAN_CLOCK = {"date": None, "persian_date": "", "persian_date_display": ""}
+
+def get_iran_time():
+    now = datetime.now(IRAN_TZ)
+    today = now.date()
+    if today != IRAN_CLOCK["date"]:
+        jalali_date = jdatetime.date.fromgregorian(date=today)
+        IRAN_CLOCK["persian_date"] = f"{jalali_date.year:04d}{jalali_date.month:02d}{jalali_date.day:02d}"
+        IRAN_CLOCK["persian_date_display"] = f"{jalali_date.year:04d}/{jalali_date.month:02d}/{jalali_date.day:02d}"
+        IRAN_CLOCK["date"] = today
+    
+    return IranTime(
+        IRAN_CLOCK["persian_date"],
+        f"{now.hour:02d}:{now.minute:02d}",
+        IRAN_CLOCK["persian_date_display"],
+        f"{now.hour:02d}{now.minute:02d}{now.second:02d}"
+    )
+
+# ================== متريک‌ها ==================
+# متريک‌ها با فرمت متني Prometheus در آدرس /metrics سرور وب منتشر مي‌شوند
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRICS = []
+
+def format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}
+        METRICS.append(self)
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def get(self, *label_values):
+        return self.values.get(label_values, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in self.values.items():
+            lines.append(f"{self.name}{format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.values = {}
+        METRICS.append(self)
+
+    def observe(self, value, *label_values):
+        series = self.values.get(label_values)
+        if series is None:
+            series = self.values[label_values] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series["counts"][index] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, label_values, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(self.label_names, label_values, [('le', '+Inf')])} {series['count']}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, label_values)} {series['sum']}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, label_values)} {series['count']}")
+        return lines
+
+class Gauge:
+    # مقدار در لحظه خواندن از تابع گرفته مي‌شود
+    def __init__(self, name, help_text, read):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+        METRICS.append(self)
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {self.read()}"]
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+HANDLER_LATENCY = Histogram("bot_handler_latency_seconds", "Handler latency per command and conversation step", ("handler",))
+PRICE_FETCH_LATENCY = Histogram("bot_price_fetch_latency_seconds", "Upstream price fetch latency", ("instrument", "provider"))
+PRICE_FETCH_ERRORS = Counter("bot_price_fetch_errors_total", "Upstream price fetch errors", ("instrument", "provider"))
+PRICE_CACHE_REQUESTS = Counter("bot_price_cache_requests_total", "Price snapshot reads by cache result", ("result",))
+RENDER_CACHE_REQUESTS = Counter("bot_render_cache_requests_total", "Rendered price message reads by cache result", ("result",))
+ORDERS_TOTAL = Counter("bot_orders_total", "Registered orders", ("type", "network"))
+TELEGRAM_SEND_FAILURES = Counter("bot_telegram_send_failures_total", "Failed Telegram sends", ("kind",))
+
+def cache_hit_ratio(counter):
+    hits = counter.get("hit")
+    total = hits + counter.get("miss")
+    return hits / total if total else 0
+
+Gauge("bot_price_cache_hit_ratio", "Price snapshot cache hit ratio", lambda: cache_hit_ratio(PRICE_CACHE_REQUESTS))
+Gauge("bot_render_cache_hit_ratio", "Rendered price message cache hit ratio", lambda: cache_hit_ratio(RENDER_CACHE_REQUESTS))
+Gauge("bot_user_states", "Users in the middle of a conversation", lambda: len(USER_STATES))
+Gauge("bot_price_snapshot_age_seconds", "Age of the price snapshot", lambda: price_snapshot_age() or 0)
+
+def instrument_handler(label, callback):
+    # label مي‌تواند تابعي از update باشد تا مرحله گفتگو قبل از اجراي هندلر مشخص شود
+    async def wrapper(update, context):
+        name = label(update) if callable(label) else label
+        spans = {} if TRACING else None
+        token = CURRENT_TRACE.set(spans) if TRACING else None
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except TelegramError as e:
+            # خطاي reply_text و ساير ارسال‌هاي داخل هندلرها
+            TELEGRAM_SEND_FAILURES.inc(type(e).__name__)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            HANDLER_LATENCY.observe(elapsed, name)
+            if TRACING:
+                CURRENT_TRACE.reset(token)
+                record_trace(name, elapsed, spans)
+    return wrapper
+
+# ================== رديابي زمان اجرا ==================
+# با TRACING=1 فعال مي‌شود؛ در حالت غيرفعال span ها هيچ کاري انجام نمي‌دهند
+TRACING = os.environ.get('TRACING', '0') == '1'
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 1000))
+SLOWEST_HANDLERS_LIMIT = 50
+
+CURRENT_TRACE = contextvars.ContextVar("current_trace", default=None)
+SLOWEST_HANDLERS = []
+TRACE_SEQUENCE = itertools.count()
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SPAN = NullSpan()
+
+class Span:
+    __slots__ = ("spans", "name", "started")
+
+    def __init__(self, spans, name):
+        self.spans = spans
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.spans[self.name] = self.spans.get(self.name, 0) + time.perf_counter() - self.started
+        return False
+
+def trace_span(name):
+    if not TRACING:
+        return NULL_SPAN
+    trace = CURRENT_TRACE.get()
+    if trace is None:
+        return NULL_SPAN
+    return Span(trace, name)
+
+def format_trace_breakdown(spans):
+    return ", ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in sorted(spans.items(), key=lambda item: -item[1])) or "-"
+
+def record_trace(handler, elapsed, spans):
+    elapsed_ms = elapsed * 1000
+    entry = (elapsed_ms, next(TRACE_SEQUENCE), handler, dict(spans), get_iran_time().persian_time)
+    if len(SLOWEST_HANDLERS) < SLOWEST_HANDLERS_LIMIT:
+        heapq.heappush(SLOWEST_HANDLERS, entry)
+    elif elapsed_ms > SLOWEST_HANDLERS[0][0]:
+        heapq.heapreplace(SLOWEST_HANDLERS, entry)
+    if elapsed_ms >= SLOW_REQUEST_MS:
+        logging.warning(f"🐢 درخواست کند {handler}: {elapsed_ms:.1f}ms ({format_trace_breakdown(spans)})")
+
+class TracedRequest(HTTPXRequest):
+    # همه درخواست‌هاي Bot API در span ارسال تلگرام ثبت مي‌شوند
+    async def do_request(self, *args, **kwargs):
+        with trace_span("send"):
+            return await super().do_request(*args, **kwargs)
+
+# ================== مديريت فايل‌ها و ديتابيس ==================
+DB_FILE = os.environ.get('DB_FILE', 'bot.db')
+
+DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS order_counters (
+    order_type TEXT PRIMARY KEY,
+    last_date TEXT NOT NULL,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS subscription_codes (
+    code TEXT PRIMARY KEY,
+    salt BLOB NOT NULL,
+    national_hash BLOB NOT NULL,
+    active INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS wallets (
+    network TEXT PRIMARY KEY,
+    address TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    name TEXT,
+    join_date TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tracking_code TEXT NOT NULL,
+    order_type TEXT NOT NULL,
+    order_number INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    jalali_date TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+"""
+
+def open_db():
+    conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+DB = open_db()
+DB.executescript(DB_SCHEMA)
+DB.commit()
+
+# همه نوشتن‌ها به ترتيب روي يک thread جداگانه انجام مي‌شوند تا event loop متوقف نشود
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+DB_WRITER = open_db()
+
+def _db_write(sql, rows):
+    with DB_WRITER:
+        DB_WRITER.executemany(sql, rows)
+
+def _log_db_error(future):
+    if future.exception():
+        logging.error(f"❌ خطا در ذخيره در ديتابيس: {future.exception()}")
+
+def db_write(sql, params=()):
+    future = DB_EXECUTOR.submit(_db_write, sql, [params])
+    future.add_done_callback(_log_db_error)
+    return future
+
+def db_write_many(sql, rows):
+    future = DB_EXECUTOR.submit(_db_write, sql, list(rows))
+    future.add_done_callback(_log_db_error)
+    return future
+
+async def db_run(func, *args):
+    # اجراي يک عمليات روي thread ديتابيس و انتظار براي نتيجه آن
+    loop = asyncio.get_running_loop()
+    with trace_span("persist"):
+        return await loop.run_in_executor(DB_EXECUTOR, func, *args)
+
+def db_query(sql, params=()):
+    return DB.execute(sql, params).fetchall()
+
+def db_is_empty(table):
+    return db_query(f"SELECT 1 FROM {table} LIMIT 1") == []
+
+def load_legacy_json(path):
+    # داده‌هاي نسخه‌هاي قبلي که در فايل JSON ذخيره مي‌شدند
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return None
+
+def close_db():
+    DB_EXECUTOR.shutdown(wait=True)
+    DB_WRITER.close()
+    DB.close()
+
+# ================== ذخيره وضعيت‌ها ==================
+# وضعيت‌ها در حافظه نگه داشته مي‌شوند و تغييرات به صورت دوره‌اي در backend ذخيره مي‌شوند
+STATE_BACKEND = os.environ.get('STATE_BACKEND', 'sqlite')
+STATE_FLUSH_INTERVAL = 2  # ثانيه
+
+# load خروجي {کليد: (مقدار، زمان انقضا)} و save ورودي {کليد: (مقدار، زمان انقضا) يا None براي حذف} دارد
+class MemoryStateBackend:
+    def load(self):
+        return {}
+
+    def save(self, changes):
+        pass
+
+class SqliteStateBackend:
+    def __init__(self, table):
+        self.table = table
+        DB.execute(f"CREATE TABLE IF NOT EXISTS {table} (key INTEGER PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+        # جدول‌هاي ساخته شده قبل از ذخيره زمان انقضا
+        if "expires_at" not in {row[1] for row in DB.execute(f"PRAGMA table_info({table})")}:
+            DB.execute(f"ALTER TABLE {table} ADD COLUMN expires_at REAL")
+        DB.commit()
+
+    def load(self):
+        return {
+            key: (json.loads(value), expires_at)
+            for key, value, expires_at in db_query(f"SELECT key, value, expires_at FROM {self.table}")
+        }
+
+    def save(self, changes):
+        upserts = [
+            (key, json.dumps(change[0], ensure_ascii=False), change[1])
+            for key, change in changes.items() if change is not None
+        ]
+        deletes = [(key,) for key, change in changes.items() if change is None]
+        if upserts:
+            db_write_many(f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)", upserts)
+        if deletes:
+            db_write_many(f"DELETE FROM {self.table} WHERE key = ?", deletes)
+
+class StateStore(MutableMapping):
+    def __init__(self, name, backend, encode=None, decode=None, ttl=None):
+        self.name = name
+        self.backend = backend
+        self.encode = encode or (lambda value: value)
+        decode = decode or (lambda value: value)
+        # ttl(value) حداکثر عمر يک رکورد بدون تغيير را برمي‌گرداند (None يعني بدون انقضا)
+        self.ttl = ttl
+        self.data = {}
+        self.expires = {}
+        self.expiry_heap = []
+        self.dirty = set()
+        self.evictions = 0
+        now = time.time()
+        for key, (value, expires_at) in backend.load().items():
+            self[key] = decode(value)
+            if expires_at is not None and key in self.expires:
+                # بعد از راه‌اندازي مجدد فقط عمر باقي‌مانده رکورد حساب مي‌شود
+                self.expires[key] = expires_at
+                heapq.heappush(self.expiry_heap, (expires_at, key))
+        self.dirty.clear()
+        # رکوردهايي که در زمان خاموش بودن منقضي شده‌اند همين‌جا از backend هم حذف مي‌شوند
+        self.sweep(now)
+
+    def __getitem__(self, key):
+        if self.is_expired(key):
+            self.evict(key)
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.dirty.add(key)
+        if self.ttl is not None:
+            seconds = self.ttl(value)
+            if seconds is None:
+                self.expires.pop(key, None)
+            else:
+                expires_at = time.time() + seconds
+                self.expires[key] = expires_at
+                heapq.heappush(self.expiry_heap, (expires_at, key))
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.expires.pop(key, None)
+        self.dirty.add(key)
+
+    def __contains__(self, key):
+        if self.is_expired(key):
+            self.evict(key)
+        return key in self.data
+
+    def __iter__(self):
+        # رکوردهاي منقضي که هنوز sweep نشده‌اند شمرده نمي‌شوند
+        return (key for key in list(self.data) if not self.is_expired(key))
+
+    def __len__(self):
+        if not self.expires:
+            return len(self.data)
+        now = time.time()
+        return len(self.data) - sum(expires_at <= now for expires_at in self.expires.values())
+
+    def is_expired(self, key):
+        expires_at = self.expires.get(key)
+        return expires_at is not None and expires_at <= time.time()
+
+    def evict(self, key):
+        del self[key]
+        self.evictions += 1
+
+    def sweep(self, now=None):
+        # فقط رکوردهاي منقضي شده از سر heap بررسي مي‌شوند؛ رکوردهاي قديمي heap ناديده گرفته مي‌شوند
+        now = now or time.time()
+        evicted = 0
+        while self.expiry_heap and self.expiry_heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self.expiry_heap)
+            if self.expires.get(key) == expires_at:
+                self.evict(key)
+                evicted += 1
+        return evicted
+
+    def flush(self):
+        if not self.dirty:
+            return
+        changes = {
+            key: (self.encode(self.data[key]), self.expires.get(key)) if key in self.data else None
+            for key in self.dirty
+        }
+        self.dirty = set()
+        self.backend.save(changes)
+
+STATE_STORES = []
+
+def make_state_store(name, encode=None, decode=None, ttl=None):
+    backend = SqliteStateBackend(name) if STATE_BACKEND == 'sqlite' else MemoryStateBackend()
+    store = StateStore(name, backend, encode, decode, ttl)
+    STATE_STORES.append(store)
+    return store
+
+def flush_state_stores():
+    for store in STATE_STORES:
+        store.flush()
+
+async def state_flush_job(context: ContextTypes.DEFAULT_TYPE):
+    flush_state_stores()
+
+async def state_sweep_job(context: ContextTypes.DEFAULT_TYPE):
+    for store in STATE_STORES:
+        evicted = store.sweep()
+        if evicted:
+            logging.info(f"🧹 {evicted} رکورد منقضي از {store.name} حذف شد (مجموع: {store.evictions})")
+    sweep_code_attempts()
+
+# ================== تنظيمات مديريتي ==================
+ADMIN_SETTINGS_FILE = "admin_settings.json"
+SAVED_SETTINGS = {}
+
+def load_admin_settings():
+    default_settings = {
+        "order_notifications": True,
+        "channel_interval": 12,  # مدت زمان بين ارسال پيام‌ها به کانال (دقيقه)
+        "publisher_migrated": False,  # تبديل channel_interval به زمان‌بندي پيش‌فرض انجام شده است
+        "price_cache_ttl": 30,  # مدت اعتبار کش قيمت‌ها (ثانيه)
+        "price_poll_interval": 20,  # فاصله به‌روزرساني خودکار قيمت‌ها (ثانيه)
+        "price_stale_after": 120,  # قيمتي که بيش از اين مدت به‌روز نشده قديمي است (ثانيه)
+        "price_mode": "median",  # first: سريع‌ترين پاسخ معتبر، median: ميانه همه منابع
+        "price_outlier_percent": 3,  # حداکثر فاصله مجاز از ميانه (درصد)
+        "price_providers": {
+            "tether": ["kifpool", "nobitex", "wallex"],
+            "gold": ["milli"],
+            "ounce": ["goldprice", "goldapi"]
+        },
+        "state_sweep_interval": 60,  # فاصله پاکسازي وضعيت‌هاي منقضي (ثانيه)
+        # حداکثر زمان بي‌فعاليت در هر مرحله گفتگو (ثانيه)
+        "state_idle_timeouts": {
+            "default": 1800,
+            "subscribe_code": 600,
+            "national_code": 600
+        }
+    }
+    
+    rows = db_query("SELECT key, value FROM settings")
+    SAVED_SETTINGS.update(rows)
+    saved_settings = {key: json.loads(value) for key, value in rows}
+    if not saved_settings:
+        saved_settings = load_legacy_json(ADMIN_SETTINGS_FILE) or {}
+    
+    # اضافه کردن کليدهاي جديد اگر وجود ندارند
+    for key, value in default_settings.items():
+        if key not in saved_settings:
+            saved_settings[key] = value
+    return saved_settings
+
+def save_admin_settings(settings):
+    # فقط کليدهايي که تغيير کرده‌اند ذخيره مي‌شوند
+    changed = []
+    for key, value in settings.items():
+        encoded = json.dumps(value, ensure_ascii=False)
+        if SAVED_SETTINGS.get(key) != encoded:
+            SAVED_SETTINGS[key] = encoded
+            changed.append((key, encoded))
+    if changed:
+        db_write_many("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", changed)
+
+ADMIN_SETTINGS = load_admin_settings()
+save_admin_settings(ADMIN_SETTINGS)
+
+# ================== کاربران ==================
+def encode_auth_session(session):
+    return {**session, "auth_expiry": session["auth_expiry"].timestamp()}
+
+def decode_auth_session(session):
+    return {**session, "auth_expiry": datetime.fromtimestamp(session["auth_expiry"])}
+
+def auth_session_ttl(session):
+    return (session["auth_expiry"] - datetime.now()).total_seconds()
+
+USERS_DB = make_state_store("auth_sessions", encode_auth_session, decode_auth_session, auth_session_ttl)
+
+def load_users():
+    users = {
+        user_id: {"join_date": join_date, "name": name}
+        for user_id, name, join_date in db_query("SELECT user_id, name, join_date FROM users ORDER BY rowid")
+    }
+    return {"total_users": len(users), "users": users}
+
+USER_STATS = load_users()
+
+def save_user(user_id, user_name):
+    if user_id not in USER_STATS["users"]:
+        persian_date, persian_time, _, _ = get_iran_time()
+        USER_STATS["users"][user_id] = {
+            "join_date": f"{persian_date} {persian_time}",
+            "name": user_name
+        }
+        USER_STATS["total_users"] = len(USER_STATS["users"])
+        db_write(
+            "INSERT OR IGNORE INTO users (user_id, name, join_date) VALUES (?, ?, ?)",
+            (user_id, user_name, USER_STATS["users"][user_id]["join_date"])
+        )
+
+def is_user_authorized(user_id):
+    if user_id in USERS_DB and USERS_DB[user_id]["verified"]:
+        if USERS_DB[user_id]["auth_expiry"] > datetime.now():
+            return True
+        else:
+            del USERS_DB[user_id]
+    return False
+
+# ================== شمارنده سفارشات ==================
+ORDER_COUNTERS_FILE = "order_counters.json"
+DEFAULT_ORDER_COUNTERS = {"sell": 1000, "buy": 2000}
+# تعداد شماره‌هايي که هر بار از ديتابيس رزرو مي‌شود؛ شماره‌هاي استفاده نشده با ري‌استارت از دست مي‌روند
+ORDER_ID_BLOCK_SIZE = int(os.environ.get('ORDER_ID_BLOCK_SIZE', 1))
+
+def migrate_order_counters():
+    if not db_is_empty("order_counters"):
+        return
+    data = load_legacy_json(ORDER_COUNTERS_FILE) or {}
+    db_write_many(
+        "INSERT OR REPLACE INTO order_counters (order_type, last_date, value) VALUES (?, ?, ?)",
+        [(order_type, data.get("last_date", ""), value) for order_type, value in data.get("counters", {}).items()]
+    )
+
+migrate_order_counters()
+
+def _allocate_order_block(order_type, persian_date, size):
+    # BEGIN IMMEDIATE قفل نوشتن را مي‌گيرد تا چند پروسس همزمان شماره تکراري نگيرند
+    DB_WRITER.execute("BEGIN IMMEDIATE")
+    try:
+        row = DB_WRITER.execute(
+            "SELECT last_date, value FROM order_counters WHERE order_type = ?", (order_type,)
+        ).fetchone()
+        if row and row[0] >= persian_date:
+            # last_date هيچ‌وقت عقب نمي‌رود (مثلاً پروسس ديگري که زودتر وارد روز جديد شده است)
+            persian_date, current = row
+        else:
+            current = DEFAULT_ORDER_COUNTERS[order_type]
+        DB_WRITER.execute(
+            "INSERT OR REPLACE INTO order_counters (order_type, last_date, value) VALUES (?, ?, ?)",
+            (order_type, persian_date, current + size)
+        )
+        DB_WRITER.commit()
+    except Exception:
+        DB_WRITER.rollback()
+        raise
+    return persian_date, current + 1, current + size
+
+ORDER_ID_BLOCKS = {}
+ORDER_ID_LOCK = asyncio.Lock()
+
+async def allocate_order_number(order_type):
+    # شماره‌ها هر روز شمسي از نو شروع مي‌شوند؛ تاريخ داخل قفل خوانده مي‌شود تا درخواستي که
+    # پيش از نيمه‌شب منتظر قفل مانده شمارنده روز جديد را به روز قبل برنگرداند.
+    # خروجي (تاريخ سفارش، شماره سفارش) است
+    async with ORDER_ID_LOCK:
+        persian_date = get_iran_time().persian_date
+        block = ORDER_ID_BLOCKS.get(order_type)
+        if block is None or block["date"] < persian_date or block["next"] > block["end"]:
+            block_date, first, last = await db_run(_allocate_order_block, order_type, persian_date, ORDER_ID_BLOCK_SIZE)
+            block = ORDER_ID_BLOCKS[order_type] = {"date": block_date, "next": first, "end": last}
+        order_number = block["next"]
+        block["next"] += 1
+    return block["date"], order_number
+
+def make_tracking_code(persian_date, persian_time_full, user_id, order_number):
+    return f"{persian_date}{persian_time_full}-{user_id}-{order_number}"
+
+# ================== سفارشات ==================
+# دفتر سفارشات فقط قابل افزودن است و هيچ رديفي ويرايش يا حذف نمي‌شود
+ORDERS_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_orders_tracking_code ON orders (tracking_code);
+CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders (user_id, id);
+CREATE INDEX IF NOT EXISTS idx_orders_date_type ON orders (jalali_date, order_type, id);
+CREATE INDEX IF NOT EXISTS idx_orders_type ON orders (order_type, id);
+CREATE TRIGGER IF NOT EXISTS orders_no_update BEFORE UPDATE ON orders
+BEGIN
+    SELECT RAISE(ABORT, 'orders ledger is append-only');
+END;
+CREATE TRIGGER IF NOT EXISTS orders_no_delete BEFORE DELETE ON orders
+BEGIN
+    SELECT RAISE(ABORT, 'orders ledger is append-only');
+END;
+"""
+
+DB.executescript(ORDERS_SCHEMA)
+DB.commit()
+
+ORDER_COLUMNS = "tracking_code, order_type, order_number, user_id, jalali_date, created_at, data"
+
+async def save_order(tracking_code, order_type, order_number, user_id, persian_date, data):
+    # قبل از تأييد سفارش به کاربر منتظر ثبت آن مي‌ماند؛ زمان نوشتن در span "persist" ديده مي‌شود
+    await db_run(
+        _db_write,
+        f"INSERT INTO orders ({ORDER_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(tracking_code, order_type, order_number, user_id, persian_date, time.time(), json.dumps(data, ensure_ascii=False))]
+    )
+
+def order_from_row(row):
+    tracking_code, order_type, order_number, user_id, jalali_date, created_at, data = row
+    return {
+        "tracking_code": tracking_code,
+        "order_type": order_type,
+        "order_number": order_number,
+        "user_id": user_id,
+        "jalali_date": jalali_date,
+        "created_at": created_at,
+        **json.loads(data)
+    }
+
+def find_orders_by_tracking_code(tracking_code):
+    rows = db_query(f"SELECT {ORDER_COLUMNS} FROM orders WHERE tracking_code = ? ORDER BY id", (tracking_code,))
+    return [order_from_row(row) for row in rows]
+
+def find_orders_by_user(user_id, limit=20):
+    rows = db_query(f"SELECT {ORDER_COLUMNS} FROM orders WHERE user_id = ? ORDER BY id DESC LIMIT ?", (user_id, limit))
+    return [order_from_row(row) for row in rows]
+
+def find_orders_by_date(persian_date, order_type=None, limit=20, offset=0):
+    if order_type:
+        where, params = "jalali_date = ? AND order_type = ?", (persian_date, order_type)
+    else:
+        where, params = "jalali_date = ?", (persian_date,)
+    total = db_query(f"SELECT COUNT(*) FROM orders WHERE {where}", params)[0][0]
+    rows = db_query(f"SELECT {ORDER_COLUMNS} FROM orders WHERE {where} ORDER BY id DESC LIMIT ? OFFSET ?", params + (limit, offset))
+    return total, [order_from_row(row) for row in rows]
+
+# ================== کدهاي اشتراک ==================
+# کد ملي هر اشتراک فقط به صورت HMAC-SHA256 با salt مخصوص همان رکورد و کليد مخفي CODE_HASH_SECRET ذخيره مي‌شود.
+# با تغيير CODE_HASH_SECRET همه کدهاي ثبت شده نامعتبر مي‌شوند
+SUBSCRIBE_CODES_FILE = "subscribe_codes.json"
+CODE_HASH_SECRET = os.environ.get('CODE_HASH_SECRET', '').encode()
+CODE_SALT_SIZE = 16
+CODE_HASH_SIZE = hashlib.sha256().digest_size
+CODE_PATTERN = re.compile(r"^\d{4,12}$")
+NATIONAL_CODE_PATTERN = re.compile(r"^\d{10}$")
+
+def hash_national_code(salt, national_code):
+    # هش با کليد خالي بعد از تنظيم کليد قابل بررسي نيست و کد ملي خام هم ديگر وجود ندارد
+    if not CODE_HASH_SECRET:
+        raise RuntimeError("CODE_HASH_SECRET تنظيم نشده است")
+    return hmac.new(CODE_HASH_SECRET, salt + national_code.encode(), hashlib.sha256).digest()
+
+def hash_subscribe_code_rows(rows):
+    # ورودي (کد، کد ملي، فعال) و خروجي رديف آماده ذخيره در جدول subscription_codes
+    for code, national_code, active in rows:
+        salt = os.urandom(CODE_SALT_SIZE)
+        yield code, salt, hash_national_code(salt, national_code), int(active)
+
+def _import_subscribe_codes(rows, hashed=False):
+    rows = list(rows if hashed else hash_subscribe_code_rows(rows))
+    with DB_WRITER:
+        DB_WRITER.executemany(
+            "INSERT OR REPLACE INTO subscription_codes (code, salt, national_hash, active) VALUES (?, ?, ?, ?)", rows
+        )
+    return len(rows)
+
+def _migrate_subscribe_codes_table():
+    # جدول قديمي کدهاي ملي خام داشت؛ بعد از انتقال با secure_delete پاک مي‌شود
+    rows = DB_WRITER.execute("SELECT code, national_code, active FROM subscribe_codes").fetchall()
+    _import_subscribe_codes(rows)
+    DB_WRITER.execute("PRAGMA secure_delete=ON")
+    with DB_WRITER:
+        DB_WRITER.execute("DROP TABLE subscribe_codes")
+    DB_WRITER.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return len(rows)
+
+def migrate_subscribe_codes():
+    if db_query("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'subscribe_codes'"):
+        count = DB_EXECUTOR.submit(_migrate_subscribe_codes_table).result()
+        logging.info(f"🔐 {count} کد اشتراک به حالت هش شده منتقل شد")
+        return
+    if not db_is_empty("subscription_codes"):
+        return
+    
+    codes = load_legacy_json(SUBSCRIBE_CODES_FILE)
+    if codes:
+        logging.warning(f"⚠️ فايل {SUBSCRIBE_CODES_FILE} کدهاي ملي خام دارد؛ پس از انتقال آن را حذف کنيد")
+    else:
+        codes = {
+            "123456": {"national_code": "1234567890", "active": True},
+            "654321": {"national_code": "9876543210", "active": True},
+            "789012": {"national_code": "1111111111", "active": True}
+        }
+    DB_EXECUTOR.submit(
+        _import_subscribe_codes, [(code, data["national_code"], data["active"]) for code, data in codes.items()]
+    ).result()
+
+def get_subscribe_code(code):
+    row = db_query("SELECT salt, national_hash, active FROM subscription_codes WHERE code = ?", (code,))
+    if not row:
+        return None
+    salt, national_hash, active = row[0]
+    return {"code": code, "salt": salt, "national_hash": national_hash, "active": bool(active)}
+
+def check_national_code(record, national_code):
+    return hmac.compare_digest(record["national_hash"], hash_national_code(record["salt"], national_code))
+
+async def import_subscribe_codes(rows, hashed=False):
+    return await db_run(_import_subscribe_codes, rows, hashed)
+
+async def set_subscribe_code_active(code, active):
+    await db_run(_db_write, "UPDATE subscription_codes SET active = ? WHERE code = ?", [(int(active), code)])
+
+async def delete_subscribe_code(code):
+    await db_run(_db_write, "DELETE FROM subscription_codes WHERE code = ?", [(code,)])
+
+def count_subscribe_codes():
+    total, active = db_query("SELECT COUNT(*), COALESCE(SUM(active), 0) FROM subscription_codes")[0]
+    return total, active
+
+def list_subscribe_codes(offset, limit):
+    return db_query("SELECT code, active FROM subscription_codes ORDER BY code LIMIT ? OFFSET ?", (limit, offset))
+
+def export_subscribe_codes():
+    # خروجي فقط هش‌ها را دارد و با همان CODE_HASH_SECRET دوباره قابل import است
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(("code", "salt", "national_hash", "active"))
+    for code, salt, national_hash, active in DB.execute(
+        "SELECT code, salt, national_hash, active FROM subscription_codes ORDER BY code"
+    ):
+        writer.writerow((code, salt.hex(), national_hash.hex(), active))
+    return output.getvalue().encode("utf-8")
+
+def parse_subscribe_codes_csv(data):
+    # دو قالب پشتيباني مي‌شود: code,national_code[,active] و خروجي /exportcodes (code,salt,national_hash,active)
+    plain, hashed, invalid = [], [], []
+    for line_number, row in enumerate(csv.reader(io.StringIO(data.decode("utf-8-sig"))), 1):
+        row = [cell.strip() for cell in row]
+        if not row or not any(row) or (line_number == 1 and not row[0].isdigit()):
+            continue
+        try:
+            if len(row) == 4 and not NATIONAL_CODE_PATTERN.match(row[1]):
+                code, salt, national_hash, active = row
+                if not CODE_PATTERN.match(code):
+                    raise ValueError
+                salt, national_hash = bytes.fromhex(salt), bytes.fromhex(national_hash)
+                if len(salt) != CODE_SALT_SIZE or len(national_hash) != CODE_HASH_SIZE:
+                    raise ValueError
+                hashed.append((code, salt, national_hash, int(active != "0")))
+            else:
+                code, national_code = row[0], row[1]
+                active = row[2] not in ("0", "false", "False") if len(row) > 2 else True
+                if not CODE_PATTERN.match(code) or not NATIONAL_CODE_PATTERN.match(national_code):
+                    raise ValueError
+                plain.append((code, national_code, active))
+        except (ValueError, IndexError):
+            invalid.append(line_number)
+    return plain, hashed, invalid
+
+if CODE_HASH_SECRET:
+    migrate_subscribe_codes()
+else:
+    # جدول و فايل قديمي دست نخورده مي‌مانند تا بعد از تنظيم کليد منتقل شوند
+    logging.error("❌ CODE_HASH_SECRET تنظيم نشده است؛ انتقال و ثبت کدهاي اشتراک انجام نمي‌شود")
+
+# ================== وضعيت گفتگوي خريد و فروش ==================
+# مقدار هر مرحله همان نام قديمي waiting_for_* است تا تنظيمات و داده‌هاي ذخيره شده معتبر بمانند
+class Step(Enum):
+    SUBSCRIBE_CODE = "subscribe_code"
+    NATIONAL_CODE = "national_code"
+    BUY_AMOUNT = "buy_amount"
+    BUY_CONFIRM = "network"
+    WALLET = "wallet"
+    SELL_AMOUNT = "sell_amount"
+    SELL_CONFIRM = "sell_network"
+    CARD_NUMBER = "card_number"
+    ACCOUNT_NUMBER = "account_number"
+    SHEBA_NUMBER = "sheba_number"
+    ACCOUNT_HOLDER = "account_holder"
+
+class OrderState:
+    __slots__ = (
+        "step", "service_type", "subscribe_code", "current_price", "sell_price", "amount",
+        "tether_amount", "final_tether_amount", "selected_network", "network_fee",
+        "wallet_address", "card_number", "account_number", "sheba_number", "sheba_display"
+    )
+
+    def __init__(self, step, **fields):
+        self.step = step
+        for name in self.__slots__[1:]:
+            setattr(self, name, fields.get(name))
+
+    def to_dict(self):
+        data = {name: getattr(self, name) for name in self.__slots__[1:] if getattr(self, name) is not None}
+        data["step"] = self.step.value
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        step = data.get("step")
+        if step is None:
+            # وضعيت‌هاي ذخيره شده با نسخه قبلي (waiting_for_*)
+            step = next(key[len("waiting_for_"):] for key, value in data.items() if key.startswith("waiting_for_") and value)
+        fields = {name: value for name, value in data.items() if name in cls.__slots__ and name != "step"}
+        return cls(Step(step), **fields)
+
+def user_state_ttl(state):
+    timeouts = ADMIN_SETTINGS["state_idle_timeouts"]
+    return timeouts.get(state.step.value, timeouts["default"])
+
+USER_STATES = make_state_store("user_states", OrderState.to_dict, OrderState.from_dict, user_state_ttl)
+ADMIN_STATES = {}
+
+# ================== تنظيمات شبکه‌ها و کيف پول‌ها ==================
+NETWORK_FEES = {
+    "ERC20": 7,
+    "TRC20": 5, 
+    "BEP20": 2,
+    "Solana": 2
+}
+
+NETWORK_DISPLAY_NAMES = {
+    "ERC20": "ERC20 (اتريوم)",
+    "TRC20": "TRC20 (ترون)", 
+    "BEP20": "BEP20 (بايننس)",
+    "Solana": "Solana (سولانا)"
+}
+
+WALLET_FILE = "wallet_addresses.json"
+
+def load_wallet_addresses():
+    if db_is_empty("wallets"):
+        wallets = load_legacy_json(WALLET_FILE) or {
+            "ERC20": "0x65D2b7FfF0ad9d87B4FAe317e2580eB2e716DE24",
+            "TRC20": "TUvQ6SdWNkj8q7auUegsj7hXADeMhtgExX",
+            "BEP20": "0x65D2b7FfF0ad9d87B4FAe317e2580eB2e716DE24",
+            "Solana": "DRhsBu1SKqGdL3sARusrR4YYqqrem4wq2JuDSGHaomxK"
+        }
+        db_write_many("INSERT OR REPLACE INTO wallets (network, address) VALUES (?, ?)", wallets.items())
+        return wallets
+    
+    return dict(db_query("SELECT network, address FROM wallets"))
+
+def save_wallet_address(network, address):
+    db_write("INSERT OR REPLACE INTO wallets (network, address) VALUES (?, ?)", (network, address))
+
+WALLET_ADDRESSES = load_wallet_addresses()
+
+# ================== کيبوردها ==================
+# همه کيبوردهاي ثابت يک بار ساخته مي‌شوند؛ اشياء تلگرام بعد از ساخت تغييرناپذيرند
+KEYBOARDS = {
+    "main_menu": ReplyKeyboardMarkup([
+        [KeyboardButton("🟢 قيمت لحظه اي تتر و طلا")],
+        [KeyboardButton("🛒 خريد تتر از ما"), KeyboardButton("💵 فروش تتر به ما")],
+        [KeyboardButton("📖 راهنما"), KeyboardButton("📢 کانال ما")]
+    ], resize_keyboard=True),
+    "price_only": ReplyKeyboardMarkup([[KeyboardButton("🟢 قيمت الان چند؟")]], resize_keyboard=True),
+    "cancel": ReplyKeyboardMarkup([[KeyboardButton("❌ انصراف")]], resize_keyboard=True),
+    "confirm": ReplyKeyboardMarkup([
+        [KeyboardButton("✅ تأييد و ادامه"), KeyboardButton("❌ انصراف")],
+        [KeyboardButton("🟢 قيمت الان چند؟")]
+    ], resize_keyboard=True),
+    "buy_amounts": ReplyKeyboardMarkup([
+        [KeyboardButton("5,000,000 تومان"), KeyboardButton("10,000,000 تومان")],
+        [KeyboardButton("15,000,000 تومان"), KeyboardButton("20,000,000 تومان")],
+        [KeyboardButton("🟢 قيمت الان چند؟")]
+    ], resize_keyboard=True),
+    "sell_amounts": ReplyKeyboardMarkup([
+        [KeyboardButton("10 تتر"), KeyboardButton("20 تتر")],
+        [KeyboardButton("50 تتر"), KeyboardButton("100 تتر")],
+        [KeyboardButton("🟢 قيمت الان چند؟")]
+    ], resize_keyboard=True),
+    "networks": ReplyKeyboardMarkup([
+        [KeyboardButton("ERC20 (اتريوم)"), KeyboardButton("TRC20 (ترون)")],
+        [KeyboardButton("BEP20 (بايننس)"), KeyboardButton("Solana (سولانا)")],
+        [KeyboardButton("🟢 قيمت الان چند؟")]
+    ], resize_keyboard=True),
+    "optional": ReplyKeyboardMarkup([
+        [KeyboardButton("لازم نيست")],
+        [KeyboardButton("🟢 قيمت الان چند؟")]
+    ], resize_keyboard=True)
+}
+
+# ================== ارسال پيام با محدوديت نرخ ==================
+# تلگرام حدود 30 پيام در ثانيه را در کل مي‌پذيرد
+TELEGRAM_SEND_RATE = 25
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        async with self.lock:
+            self.refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.refill()
+            self.tokens -= 1
+
+    def try_acquire(self):
+        # نسخه بدون انتظار: اگر توکن نباشد False برمي‌گرداند
+        self.refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def is_full(self):
+        self.refill()
+        return self.tokens >= self.capacity
+
+TELEGRAM_SEND_LIMITER = TokenBucket(TELEGRAM_SEND_RATE, TELEGRAM_SEND_RATE)
+
+async def send_message_limited(bot, chat_id, text, max_retries=3, **kwargs):
+    # در صورت دريافت RetryAfter به اندازه زمان اعلام شده صبر و دوباره تلاش مي‌کند
+    for attempt in range(max_retries + 1):
+        await TELEGRAM_SEND_LIMITER.acquire()
+        try:
+            return await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+        except RetryAfter as e:
+            retry_after = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else e.retry_after
+            logging.warning(f"⏳ محدوديت تلگرام - {retry_after} ثانيه صبر (تلاش {attempt + 1})")
+            await asyncio.sleep(retry_after)
+        except TelegramError as e:
+            TELEGRAM_SEND_FAILURES.inc(type(e).__name__)
+            logging.info(f"ارسال پيام به {chat_id} ناموفق بود: {e}")
+            return None
+    TELEGRAM_SEND_FAILURES.inc("RetryAfter")
+    return None
+
+# کارهاي طولاني (ارسال همگاني، اعلان‌ها) با application.create_task اجرا نمي‌شوند چون Application.stop
+# منتظر همه آن‌ها مي‌ماند؛ اين کارها پيش از توقف ربات لغو مي‌شوند
+BACKGROUND_TASKS = set()
+
+def start_background_task(coroutine):
+    task = asyncio.ensure_future(coroutine)
+    BACKGROUND_TASKS.add(task)
+    task.add_done_callback(BACKGROUND_TASKS.discard)
+    return task
+
+async def cancel_background_tasks():
+    tasks = list(BACKGROUND_TASKS)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+# ================== سيستم انتشار قيمت در کانال‌ها ==================
+# هر زمان‌بندي شامل کانال، قالب پيام و فاصله ارسال (دقيقه) يا ساعت‌هاي مشخص به وقت ايران است
+PUBLISH_SCHEDULES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS publish_schedules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    template TEXT NOT NULL,
+    interval_minutes INTEGER,
+    times TEXT NOT NULL DEFAULT '',
+    mode TEXT NOT NULL DEFAULT 'post',
+    options TEXT NOT NULL DEFAULT '{}',
+    state TEXT NOT NULL DEFAULT '{}',
+    active INTEGER NOT NULL DEFAULT 1,
+    last_sent_at REAL NOT NULL DEFAULT 0
+);
+"""
+
+DB.executescript(PUBLISH_SCHEDULES_SCHEMA)
+DB.commit()
+
+PUBLISH_COLUMNS = ("id", "channel", "template", "interval_minutes", "times", "mode", "options", "state", "active", "last_sent_at")
+PUBLISH_MIN_INTERVAL = 5  # دقيقه
+PUBLISH_TIME_PATTERN = re.compile(r"^([01]\d|2[0-3]):[0-5]\d$")
+
+def schedule_from_row(row):
+    schedule = dict(zip(PUBLISH_COLUMNS, row))
+    schedule["times"] = [t for t in schedule["times"].split(",") if t]
+    schedule["options"] = json.loads(schedule["options"])
+    schedule["state"] = json.loads(schedule["state"])
+    # شماره نسخه snapshot با هر راه‌اندازي از صفر شروع مي‌شود و نسخه ذخيره شده قبلي معتبر نيست
+    schedule["state"].pop("version", None)
+    schedule["active"] = bool(schedule["active"])
+    return schedule
+
+def load_publish_schedules():
+    rows = db_query(f"SELECT {', '.join(PUBLISH_COLUMNS)} FROM publish_schedules ORDER BY id")
+    return {row[0]: schedule_from_row(row) for row in rows}
+
+def _insert_publish_schedule(channel, template, interval_minutes, times, mode, options):
+    with DB_WRITER:
+        cursor = DB_WRITER.execute(
+            "INSERT INTO publish_schedules (channel, template, interval_minutes, times, mode, options) VALUES (?, ?, ?, ?, ?, ?)",
+            (channel, template, interval_minutes, ",".join(times), mode, json.dumps(options, ensure_ascii=False))
+        )
+    return cursor.lastrowid
+
+async def add_publish_schedule(channel, template, interval_minutes=None, times=(), mode="post", options=None):
+    options = options or {}
+    schedule_id = await db_run(_insert_publish_schedule, channel, template, interval_minutes, times, mode, options)
+    PUBLISH_SCHEDULES[schedule_id] = {
+        "id": schedule_id, "channel": channel, "template": template, "interval_minutes": interval_minutes,
+        "times": list(times), "mode": mode, "options": options, "state": {}, "active": True, "last_sent_at": 0
+    }
+    return PUBLISH_SCHEDULES[schedule_id]
+
+def save_publish_schedule(schedule):
+    db_write(
+        "UPDATE publish_schedules SET interval_minutes = ?, times = ?, options = ?, state = ?, active = ?, last_sent_at = ? WHERE id = ?",
+        (
+            schedule["interval_minutes"], ",".join(schedule["times"]),
+            json.dumps(schedule["options"], ensure_ascii=False), json.dumps(schedule["state"], ensure_ascii=False),
+            int(schedule["active"]), schedule["last_sent_at"], schedule["id"]
+        )
+    )
+
+def delete_publish_schedule(schedule_id):
+    del PUBLISH_SCHEDULES[schedule_id]
+    db_write("DELETE FROM publish_schedules WHERE id = ?", (schedule_id,))
+
+def migrate_channel_schedule():
+    # ارسال قديمي (CHANNEL_ID هر channel_interval دقيقه) به اولين زمان‌بندي تبديل مي‌شود
+    if ADMIN_SETTINGS["publisher_migrated"]:
+        return
+    if CHANNEL_ID and not PUBLISH_SCHEDULES:
+        DB_EXECUTOR.submit(
+            _insert_publish_schedule, CHANNEL_ID, "channel", ADMIN_SETTINGS["channel_interval"], (), "post", {}
+        ).result()
+        PUBLISH_SCHEDULES.update(load_publish_schedules())
+    ADMIN_SETTINGS["publisher_migrated"] = True
+    save_admin_settings(ADMIN_SETTINGS)
+
+def default_publish_schedule():
+    # زمان‌بندي کانال اصلي که /setinterval آن را تغيير مي‌دهد
+    for schedule in PUBLISH_SCHEDULES.values():
+        if schedule["channel"] == CHANNEL_ID and schedule["interval_minutes"]:
+            return schedule
+    return None
+
+def is_schedule_due(schedule, minute, clock):
+    # publisher_tick زمان ارسال را برابر ابتداي همان دقيقه ثبت مي‌کند، پس floor دقيقه همان نوبت ارسال است
+    last_minute = int(schedule["last_sent_at"] // 60)
+    if last_minute >= minute:
+        return False
+    if schedule["times"]:
+        return clock in schedule["times"]
+    return minute - last_minute >= schedule["interval_minutes"]
+
+# هر حالت True (ارسال شد)، False (خطا) يا None (چيزي براي ارسال نبود) برمي‌گرداند؛
+# با force (دستور /sendnow) بررسي تغيير قيمت ناديده گرفته مي‌شود
+async def publish_post(bot, schedule, snapshot, force=False):
+    message = render_price_message(schedule["template"], snapshot)
+    return bool(await send_message_limited(bot, schedule["channel"], message, parse_mode='Markdown'))
+
+async def edit_ticker_message(bot, schedule, message):
+    # False يعني پيام قبلي وجود ندارد و بايد پيام جديد ارسال شود
+    await TELEGRAM_SEND_LIMITER.acquire()
+    try:
+        await bot.edit_message_text(
+            chat_id=schedule["channel"], message_id=schedule["state"]["message_id"], text=message, parse_mode='Markdown'
+        )
+    except BadRequest as e:
+        if "message is not modified" in e.message.lower():
+            return True
+        if "message to edit not found" in e.message.lower():
+            return False
+        raise
+    return True
+
+async def publish_ticker(bot, schedule, snapshot, force=False):
+    # يک پيام سنجاق شده فقط وقتي متن آن واقعاً تغيير کرده ويرايش مي‌شود
+    state = schedule["state"]
+    if not force and state.get("message_id") and state.get("version") == snapshot["version"]:
+        return None
+    message = render_price_message(schedule["template"], snapshot)
+    if not force and state.get("message_id") and message == state.get("last_text"):
+        state["version"] = snapshot["version"]
+        return None
+    
+    try:
+        if state.get("message_id") and await edit_ticker_message(bot, schedule, message):
+            state.update(version=snapshot["version"], last_text=message)
+            return True
+    except TelegramError as e:
+        TELEGRAM_SEND_FAILURES.inc(type(e).__name__)
+        logging.warning(f"⚠️ ويرايش پيام زنده در {schedule['channel']} ناموفق بود: {e}")
+        return False
+    
+    sent = await send_message_limited(bot, schedule["channel"], message, parse_mode='Markdown')
+    if not sent:
+        return False
+    state.update(message_id=sent.message_id, version=snapshot["version"], last_text=message)
+    try:
+        await bot.pin_chat_message(chat_id=schedule["channel"], message_id=sent.message_id, disable_notification=True)
+    except TelegramError as e:
+        logging.warning(f"⚠️ سنجاق کردن پيام در {schedule['channel']} ناموفق بود: {e}")
+    return True
+
+# قيمت‌هايي که تغييرشان در حالت alert بررسي مي‌شود (نام، انديس در snapshot["prices"])
+ALERT_INSTRUMENTS = {"tether": 0, "gold": 1}
+ALERT_DEFAULT_MAX_INTERVAL = 60  # دقيقه
+
+def parse_alert_threshold(text):
+    # "0.5%" درصدي و "500" مقدار مطلق به تومان
+    percent = text.endswith("%")
+    value = float(text.rstrip("%").replace(",", ""))
+    if value <= 0:
+        raise ValueError("آستانه نامعتبر")
+    return value, "percent" if percent else "toman"
+
+def format_alert_threshold(options):
+    return f"{options['threshold']:g}%" if options["unit"] == "percent" else f"{options['threshold']:,g} تومان"
+
+def alert_threshold_exceeded(options, previous, current):
+    if not previous or not current:
+        return False
+    change = abs(current - previous)
+    if options["unit"] == "percent":
+        change = change / previous * 100
+    return change >= options["threshold"]
+
+def format_price_change(previous, current):
+    if not previous or not current:
+        return ""
+    change = (current - previous) / previous * 100
+    arrow = "🔺" if change > 0 else "🔻" if change < 0 else "⏺"
+    return f"{arrow} {change:+.2f}%"
+
+def render_alert_message(snapshot, previous):
+    _, persian_time, persian_date_display, _ = get_iran_time()
+    tether_price, gold_price, gold_ounce, gold_dollar_price = snapshot["prices"]
+    return PRICE_ALERT_TEMPLATE.format(
+        tether=format_price(tether_price),
+        gold=format_price(gold_price),
+        ounce=format_price(gold_ounce),
+        gold_dollar=format_price(gold_dollar_price),
+        tether_change=format_price_change(previous[0], tether_price) if previous else "",
+        gold_change=format_price_change(previous[1], gold_price) if previous else "",
+        date=persian_date_display,
+        time=persian_time
+    )
+
+async def publish_alert(bot, schedule, snapshot, force=False):
+    # با عبور تغيير تتر يا طلا از آستانه (نسبت به آخرين پيام منتشر شده) فوراً منتشر مي‌شود
+    # و در غير اين صورت حداکثر هر max_interval دقيقه يک بار
+    options, state = schedule["options"], schedule["state"]
+    previous = state.get("prices")
+    if previous and not force:
+        moved = any(
+            alert_threshold_exceeded(options, previous[index], snapshot["prices"][index])
+            for index in ALERT_INSTRUMENTS.values()
+        )
+        if not moved and time.time() - schedule["last_sent_at"] < options["max_interval"] * 60:
+            return None
+    
+    message = render_alert_message(snapshot, previous)
+    sent = await send_message_limited(bot, schedule["channel"], message, parse_mode='Markdown')
+    if not sent:
+        return False
+    state["prices"] = list(snapshot["prices"])
+    return True
+
+PUBLISH_MODES = {
+    "post": publish_post,
+    "ticker": publish_ticker,
+    "alert": publish_alert
+}
+# اين حالت‌ها به جاي زمان‌بندي دقيقه‌اي بعد از هر به‌روزرساني قيمت بررسي مي‌شوند
+PRICE_UPDATE_MODES = {"ticker", "alert"}
+
+async def publish_schedule(bot, schedule, snapshot, now, force=False):
+    if not all(is_price_available(snapshot, name) for name in snapshot["values"]):
+        # تا دريافت همه قيمت‌ها (و به‌روز بودن آن‌ها) چيزي منتشر نمي‌شود و نوبت بعدي دوباره بررسي مي‌شود
+        logging.warning(f"⚠️ انتشار زمان‌بندي #{schedule['id']} به دليل نبود قيمت معتبر انجام نشد")
+        return False
+    sent = await PUBLISH_MODES[schedule["mode"]](bot, schedule, snapshot, force)
+    if sent is None:
+        return False
+    if sent:
+        logging.info(f"✅ قيمت به کانال {schedule['channel']} ارسال شد (زمان‌بندي #{schedule['id']})")
+    else:
+        logging.error(f"❌ خطا در ارسال قيمت به کانال {schedule['channel']} (زمان‌بندي #{schedule['id']})")
+    # در صورت خطا هم تا نوبت بعدي صبر مي‌شود تا هر دقيقه تلاش تکراري انجام نشود
+    schedule["last_sent_at"] = now
+    save_publish_schedule(schedule)
+    return sent
+
+async def publish_schedules(bot, schedules, now, force=False):
+    # همه ارسال‌هاي يک نوبت از يک snapshot قيمت استفاده مي‌کنند
+    snapshot = await get_price_snapshot()
+    results = await asyncio.gather(*(publish_schedule(bot, schedule, snapshot, now, force) for schedule in schedules))
+    return sum(results)
+
+async def publisher_tick(context: ContextTypes.DEFAULT_TYPE):
+    # اين job در ابتداي هر دقيقه اجرا مي‌شود؛ گرد کردن جابجايي جزئي زمان اجرا را جبران مي‌کند.
+    # زمان ارسال ابتداي همان دقيقه ثبت مي‌شود تا is_schedule_due با floor به همان نوبت برسد
+    minute = round(time.time() / 60)
+    now = minute * 60
+    clock = datetime.fromtimestamp(minute * 60, IRAN_TZ).strftime("%H:%M")
+    due = [
+        schedule for schedule in PUBLISH_SCHEDULES.values()
+        if schedule["active"] and schedule["mode"] not in PRICE_UPDATE_MODES and is_schedule_due(schedule, minute, clock)
+    ]
+    if not due:
+        return
+    try:
+        await publish_schedules(context.bot, due, now)
+    except Exception as e:
+        logging.error(f"❌ خطا در انتشار قيمت: {e}")
+
+async def publish_price_update(bot):
+    # بعد از هر پايش قيمت‌ها اجرا مي‌شود؛ هر حالت خودش تصميم مي‌گيرد که تغييري براي ارسال هست يا نه
+    due = [
+        schedule for schedule in PUBLISH_SCHEDULES.values()
+        if schedule["active"] and schedule["mode"] in PRICE_UPDATE_MODES
+    ]
+    if due:
+        now = time.time()
+        await asyncio.gather(*(publish_schedule(bot, schedule, PRICE_SNAPSHOT, now) for schedule in due))
+
+def start_publisher(job_queue):
+    job_queue.run_repeating(publisher_tick, interval=60, first=60 - time.time() % 60, name="publisher_tick")
+
+def format_schedule(schedule):
+    if schedule["mode"] == "alert":
+        timing = (
+            f"با تغيير {format_alert_threshold(schedule['options'])} تتر يا طلا"
+            f" (حداکثر هر {schedule['options']['max_interval']} دقيقه)"
+        )
+    elif schedule["mode"] in PRICE_UPDATE_MODES:
+        timing = "با هر تغيير قيمت"
+    elif schedule["times"]:
+        timing = f"ساعت {'، '.join(schedule['times'])}"
+    else:
+        timing = f"هر {schedule['interval_minutes']} دقيقه"
+    status = "✅" if schedule["active"] else "⏸"
+    last_sent = (
+        datetime.fromtimestamp(schedule["last_sent_at"], IRAN_TZ).strftime("%H:%M")
+        if schedule["last_sent_at"] else "-"
+    )
+    return (
+        f"{status} #{schedule['id']} {schedule['channel']}\n"
+        f"   {timing} | قالب: {schedule['template']} | حالت: {schedule['mode']} | آخرين ارسال: {last_sent}"
+    )
+
+PUBLISH_SCHEDULES = load_publish_schedules()
+migrate_channel_schedule()
+
+# ================== هشدار قيمت کاربران ==================
+# هشدارها يک‌بار مصرف هستند و پس از رسيدن قيمت به هدف ارسال و حذف مي‌شوند
+PRICE_ALERTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS price_alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    instrument TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    target REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+DB.executescript(PRICE_ALERTS_SCHEMA)
+DB.commit()
+
+MAX_ALERTS_PER_USER = 10
+ALERT_SEND_ATTEMPTS = 3
+ALERT_INSTRUMENT_ALIASES = {"tether": "tether", "usdt": "tether", "تتر": "tether", "gold": "gold", "طلا": "gold"}
+ALERT_OPERATORS = {">=": "above", "≥": "above", ">": "above", "<=": "below", "≤": "below", "<": "below"}
+ALERT_PATTERN = re.compile(r"^(\S+?)\s*(>=|<=|≥|≤|>|<)\s*(\d[\d,]*)$")
+# هدف هشدار بايد در اين ضريب از قيمت فعلي باشد تا اشتباه تايپي (مثلاً يک صفر کم يا زياد) ثبت نشود
+ALERT_TARGET_BAND = 5
+
+PRICE_ALERTS = {}
+USER_PRICE_ALERTS = {}
+# براي هر (قيمت، جهت) يک ليست مرتب از (کليد، شناسه)؛ کليد طوري انتخاب شده که هشدارهاي
+# رسيده هميشه انتهاي ليست باشند و با يک bisect و حذف همان k عنصر پيدا شوند
+PRICE_ALERT_INDEX = {
+    (instrument, direction): [] for instrument in ALERT_INSTRUMENTS for direction in ("above", "below")
+}
+
+def alert_index_key(direction, value):
+    return -value if direction == "above" else value
+
+def index_price_alert(alert):
+    PRICE_ALERTS[alert["id"]] = alert
+    USER_PRICE_ALERTS.setdefault(alert["user_id"], set()).add(alert["id"])
+    bisect.insort(
+        PRICE_ALERT_INDEX[(alert["instrument"], alert["direction"])],
+        (alert_index_key(alert["direction"], alert["target"]), alert["id"])
+    )
+
+def unindex_price_alert(alert_id):
+    alert = PRICE_ALERTS.pop(alert_id)
+    user_alerts = USER_PRICE_ALERTS[alert["user_id"]]
+    user_alerts.discard(alert_id)
+    if not user_alerts:
+        del USER_PRICE_ALERTS[alert["user_id"]]
+    return alert
+
+def load_price_alerts():
+    for alert_id, user_id, instrument, direction, target in db_query(
+        "SELECT id, user_id, instrument, direction, target FROM price_alerts"
+    ):
+        if instrument in ALERT_INSTRUMENTS:
+            index_price_alert({
+                "id": alert_id, "user_id": user_id, "instrument": instrument, "direction": direction, "target": target
+            })
+
+def _insert_price_alert(user_id, instrument, direction, target):
+    with DB_WRITER:
+        cursor = DB_WRITER.execute(
+            "INSERT INTO price_alerts (user_id, instrument, direction, target, created_at) VALUES (?, ?, ?, ?, ?)",
+            (user_id, instrument, direction, target, time.time())
+        )
+    return cursor.lastrowid
+
+async def add_price_alert(user_id, instrument, direction, target):
+    alert_id = await db_run(_insert_price_alert, user_id, instrument, direction, target)
+    alert = {"id": alert_id, "user_id": user_id, "instrument": instrument, "direction": direction, "target": target}
+    index_price_alert(alert)
+    return alert
+
+def delete_price_alert(alert_id):
+    alert = unindex_price_alert(alert_id)
+    entries = PRICE_ALERT_INDEX[(alert["instrument"], alert["direction"])]
+    del entries[bisect.bisect_left(entries, (alert_index_key(alert["direction"], alert["target"]), alert_id))]
+    db_write("DELETE FROM price_alerts WHERE id = ?", (alert_id,))
+
+def pop_crossed_alerts(prices):
+    # O(log n + k): فقط هشدارهايي که قيمت از هدفشان عبور کرده برداشته مي‌شوند؛
+    # حذف از ديتابيس بعد از ارسال موفق در send_price_alerts انجام مي‌شود
+    crossed = []
+    for (instrument, direction), entries in PRICE_ALERT_INDEX.items():
+        price = prices[ALERT_INSTRUMENTS[instrument]]
+        if not price or not entries:
+            continue
+        start = bisect.bisect_left(entries, (alert_index_key(direction, price),))
+        for _, alert_id in entries[start:]:
+            crossed.append((unindex_price_alert(alert_id), price))
+        del entries[start:]
+    return crossed
+
+def format_price_alert(alert):
+    operator = "≥" if alert["direction"] == "above" else "≤"
+    return f"#{alert['id']} {PRICE_SOURCE_LABELS[alert['instrument']]} {operator} {format_price(round(alert['target']))} تومان"
+
+async def send_price_alerts(bot, crossed):
+    # هشدار فقط بعد از ارسال موفق (يا ALERT_SEND_ATTEMPTS تلاش ناموفق) حذف مي‌شود؛ هشدارهايي که با
+    # توقف ربات ارسال نشده‌اند در ديتابيس مي‌مانند و بعد از راه‌اندازي مجدد دوباره بررسي مي‌شوند
+    finished = []
+    try:
+        for alert, price in crossed:
+            sent = await send_message_limited(
+                bot, alert["user_id"],
+                f"🔔 **هشدار قيمت**\n\n{format_price_alert(alert)}\n\n"
+                f"💰 قيمت فعلي: {format_price(price)} تومان"
+            )
+            alert["failures"] = 0 if sent else alert.get("failures", 0) + 1
+            if sent or alert["failures"] >= ALERT_SEND_ATTEMPTS:
+                finished.append((alert["id"],))
+            else:
+                # در پايش بعدي دوباره ارسال مي‌شود
+                index_price_alert(alert)
+    finally:
+        if finished:
+            db_write_many("DELETE FROM price_alerts WHERE id = ?", finished)
+
+def fire_price_alerts(application):
+    crossed = pop_crossed_alerts(PRICE_SNAPSHOT["prices"])
+    if crossed:
+        logging.info(f"🔔 {len(crossed)} هشدار قيمت فعال شد")
+        # ارسال در پس‌زمينه انجام مي‌شود تا پايش بعدي قيمت‌ها منتظر نماند
+        start_background_task(send_price_alerts(application.bot, crossed))
+
+load_price_alerts()
+
+# ================== سيستم تأييد هويت ==================
+# هر کاربر چند تلاش پشت سر هم دارد و با تمام شدن آن‌ها قفل مي‌شود؛ محدوديت سراسري جلوي حدس زدن
+# توزيع شده با حساب‌هاي زياد را مي‌گيرد
+CODE_ATTEMPT_BURST = 5
+CODE_ATTEMPT_RATE = 1 / 60  # هر دقيقه يک تلاش جديد
+CODE_LOCKOUT_SECONDS = 15 * 60
+CODE_GLOBAL_ATTEMPT_RATE = float(os.environ.get('CODE_GLOBAL_ATTEMPT_RATE', 5))  # تلاش در ثانيه براي همه کاربران
+CODE_GLOBAL_RETRY_SECONDS = 10
+
+CODE_ATTEMPTS = {}
+CODE_GLOBAL_LIMITER = TokenBucket(CODE_GLOBAL_ATTEMPT_RATE, CODE_GLOBAL_ATTEMPT_RATE * 4)
+
+def code_attempt_wait(user_id):
+    # None يعني تلاش مجاز است؛ در غير اين صورت چند ثانيه بايد صبر کرد.
+    # محدوديت سراسري از سهميه کاربر کم نمي‌کند؛ فقط تلاش‌هاي ناموفق به قفل شدن کاربر منجر مي‌شوند
+    attempts = CODE_ATTEMPTS.get(user_id)
+    if attempts and attempts["locked_until"] > time.monotonic():
+        return attempts["locked_until"] - time.monotonic()
+    if not CODE_GLOBAL_LIMITER.try_acquire():
+        return CODE_GLOBAL_RETRY_SECONDS
+    return None
+
+def record_failed_code_attempt(user_id):
+    attempts = CODE_ATTEMPTS.get(user_id)
+    if attempts is None:
+        attempts = CODE_ATTEMPTS[user_id] = {"bucket": TokenBucket(CODE_ATTEMPT_RATE, CODE_ATTEMPT_BURST), "locked_until": 0}
+    if not attempts["bucket"].try_acquire() or attempts["bucket"].tokens < 1:
+        attempts["locked_until"] = time.monotonic() + CODE_LOCKOUT_SECONDS
+        logging.warning(f"🔒 کاربر {user_id} به دليل تلاش‌هاي ناموفق زياد براي کد اشتراک قفل شد")
+
+def sweep_code_attempts():
+    now = time.monotonic()
+    for user_id in [
+        user_id for user_id, attempts in CODE_ATTEMPTS.items()
+        if attempts["locked_until"] <= now and attempts["bucket"].is_full()
+    ]:
+        del CODE_ATTEMPTS[user_id]
+
+def format_attempt_wait(seconds):
+    if seconds < 60:
+        return f"{math.ceil(seconds)} ثانيه"
+    return f"{math.ceil(seconds / 60)} دقيقه"
+
+async def reject_throttled_attempt(update: Update, user_id):
+    wait = code_attempt_wait(user_id)
+    if wait is None:
+        return False
+    await update.message.reply_text(
+        f"⛔️ تعداد تلاش‌ها بيش از حد مجاز است!\n\nلطفاً {format_attempt_wait(wait)} ديگر دوباره تلاش کنيد.",
+        reply_markup=KEYBOARDS["price_only"]
+    )
+    return True
+
+async def request_subscription_code(update: Update, context: ContextTypes.DEFAULT_TYPE, service_type):
+    user_id = update.message.from_user.id
+    
+    if is_user_authorized(user_id):
+        if service_type == "buy":
+            await show_buy_options(update, context)
+        elif service_type == "sell":
+            await show_sell_options(update, context)
+        return
+    
+    USER_STATES[user_id] = OrderState(Step.SUBSCRIBE_CODE, service_type=service_type)
+    
+    await update.message.reply_text(
+        "🔐 *براي تاييد هويت*\n\n"
+        "لطفاً کد اشتراک خود را وارد کنيد:\n\n"
+        "درصورت نداشتن کد اشتراک به پشتيباني پيام دهيد:\n"
+        "📞 پشتيباني: @TTeercom",
+        reply_markup=KEYBOARDS["price_only"]
+    )
+
+async def verify_subscription_code(update: Update, context: ContextTypes.DEFAULT_TYPE, code):
+    user_id = update.message.from_user.id
+    if await reject_throttled_attempt(update, user_id):
+        return
+    
+    record = get_subscribe_code(code)
+    if record and record["active"]:
+        user_state = USER_STATES[user_id]
+        user_state.step = Step.NATIONAL_CODE
+        user_state.subscribe_code = code
+        USER_STATES[user_id] = user_state
+        await update.message.reply_text("✅ کد اشتراک تأييد شد!\n\nلطفاً کد ملي خود را وارد کنيد:")
+    else:
+        record_failed_code_attempt(user_id)
+        await update.message.reply_text(
+            "❌ کد اشتراک نامعتبر!\n\nلطفاً کد صحيح را وارد کنيد يا براي بازگشت روي '🟢 قيمت الان چند؟' کليک کنيد.",
+            reply_markup=KEYBOARDS["price_only"]
+        )
+
+async def verify_national_code(update: Update, context: ContextTypes.DEFAULT_TYPE, national_code):
+    user_id = update.message.from_user.id
+    user_name = update.message.from_user.first_name
+    user_state = USER_STATES[user_id]
+    
+    if NATIONAL_CODE_PATTERN.match(national_code):
+        if await reject_throttled_attempt(update, user_id):
+            return
+        subscribe_code = user_state.subscribe_code
+        record = get_subscribe_code(subscribe_code)
+        
+        if record and record["active"] and check_national_code(record, national_code):
+            USERS_DB[user_id] = {
+                "subscribe_code": subscribe_code,
+                "verified": True,
+                "name": user_name,
+                "auth_expiry": datetime.now() + timedelta(minutes=15)
+            }
+            
+            service_type = user_state.service_type
+            del USER_STATES[user_id]
+            
+            await update.message.reply_text(f"✅ تأييد هويت کامل شد!\n\nسلام {user_name} عزيز!", reply_markup=main_menu_keyboard())
+            
+            if service_type == "buy":
+                await show_buy_options(update, context)
+            elif service_type == "sell":
+                await show_sell_options(update, context)
+        else:
+            record_failed_code_attempt(user_id)
+            await update.message.reply_text(
+                "❌ کد ملي با اطلاعات ثبت شده مطابقت ندارد!\n\nلطفاً کد ملي صحيح را وارد کنيد.",
+                reply_markup=KEYBOARDS["price_only"]
+            )
+    else:
+        await update.message.reply_text(
+            "❌ کد ملي نامعتبر! بايد 10 رقم باشد.\n\nلطفاً کد ملي صحيح را وارد کنيد.",
+            reply_markup=KEYBOARDS["price_only"]
+        )
+
+# ================== سيستم خريد ==================
+PRICE_UNAVAILABLE_MESSAGE = "⚠️ قيمت تتر در حال حاضر در دسترس نيست!\n\nلطفاً چند دقيقه ديگر دوباره تلاش کنيد."
+
+async def get_order_tether_price(update: Update):
+    # سفارش فقط با قيمت معتبر و به‌روز تتر شروع مي‌شود
+    snapshot = await get_price_snapshot()
+    if not is_price_available(snapshot, "tether"):
+        await update.message.reply_text(PRICE_UNAVAILABLE_MESSAGE, reply_markup=main_menu_keyboard())
+        return None
+    return snapshot["values"]["tether"]
+
+async def show_buy_options(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    tether_price = await get_order_tether_price(update)
+    if not tether_price:
+        USER_STATES.pop(user_id, None)
+        return
+    
+    USER_STATES[user_id] = OrderState(Step.BUY_AMOUNT, service_type="buy", current_price=tether_price)
+    
+    await update.message.reply_text(
+        f"🛒 *خريد تتر از ما*\n\n💰 قيمت فعلي خريد تتر: {tether_price:,} تومان\n\n"
+        "لطفاً مبلغ مورد نظر را به تومان وارد کنيد:\n\nمثال: 1000000\n\n"
+        "يا از دکمه‌هاي زير انتخاب کنيد:",
+        reply_markup=KEYBOARDS["buy_amounts"]
+    )
+
+async def handle_buy_amount(update: Update, context: ContextTypes.DEFAULT_TYPE, amount_text):
+    user_id = update.message.from_user.id
+    user_state = USER_STATES[user_id]
+    current_price = user_state.current_price
+    if not current_price:
+        del USER_STATES[user_id]
+        await update.message.reply_text(PRICE_UNAVAILABLE_MESSAGE, reply_markup=main_menu_keyboard())
+        return
+    
+    try:
+        clean_amount = re.sub(r'[^\d]', '', amount_text)
+        amount = int(clean_amount)
+        
+        if amount < 1000000:
+            await update.message.reply_text(
+                "❌ مبلغ بسيار کم!\n\nحداقل مبلغ خريد 1,000,000 تومان است.\n\nلطفاً مبلغ معتبر وارد کنيد:",
+                reply_markup=KEYBOARDS["buy_amounts"]
+            )
+            return
+        
+        tether_amount = amount / current_price
+        
+        user_state.step = Step.BUY_CONFIRM
+        user_state.amount = amount
+        user_state.tether_amount = round(tether_amount, 2)
+        USER_STATES[user_id] = user_state
+        
+        await update.message.reply_text(
+            f"✅ *خلاصه سفارش خريد*\n\n💰 مبلغ: {amount:,} تومان\n"
+            f"🔢 تعداد تتر محاسبه شده: {tether_amount:.2f}\n"
+            f"💵 قيمت هر تتر: {current_price:,} تومان\n\n"
+            "آيا از سفارش خود اطمينان داريد?",
+            reply_markup=KEYBOARDS["confirm"]
+        )
+        
+    except ValueError:
+        await update.message.reply_text(
+            "❌ مبلغ نامعتبر!\n\nلطفاً مبلغ را به صورت عددي وارد کنيد:\n\nمثال: 1000000",
+            reply_markup=KEYBOARDS["buy_amounts"]
+        )
+
+async def handle_network_selection(update: Update, context: ContextTypes.DEFAULT_TYPE, network):
+    user_id = update.message.from_user.id
+    user_state = USER_STATES[user_id]
+    
+    tether_amount = user_state.tether_amount
+    network_fee = NETWORK_FEES[network]
+    final_tether_amount = tether_amount - network_fee
+    
+    user_state.step = Step.WALLET
+    user_state.final_tether_amount = round(final_tether_amount, 2)
+    user_state.selected_network = network
+    user_state.network_fee = network_fee
+    USER_STATES[user_id] = user_state
+    
+    await update.message.reply_text(
+        f"🌐 **شبکه انتخاب شده: {NETWORK_DISPLAY_NAMES[network]}**\n\n"
+        f"💰 کارمزد شبکه: {network_fee} تتر\n"
+        f"▫️ تتر محاسبه شده: {tether_amount:.2f}\n"
+        f"🔢 *تتر دريافتي شما*: {final_tether_amount:.2f} تتر\n\n"
+        "*لطفاً آدرس کيف پول خود را ارسال کنيد*:",
+        reply_markup=KEYBOARDS["cancel"]
+    )
+
+async def handle_wallet_address(update: Update, context: ContextTypes.DEFAULT_TYPE, wallet_address):
+    user_id = update.message.from_user.id
+    user_state = USER_STATES[user_id]
+    user_state.wallet_address = wallet_address
+    
+    persian_date, persian_time, persian_date_display, persian_time_full = get_iran_time()
+    persian_date, order_number = await allocate_order_number("buy")
+    ORDERS_TOTAL.inc("buy", user_state.selected_network)
+    tracking_code = make_tracking_code(persian_date, persian_time_full, user_id, order_number)
+    await save_order(tracking_code, "buy", order_number, user_id, persian_date, user_state.to_dict())
+    
+    final_message = (
+        f"🎉 *سفارش خريد شما ثبت شد* \n\n"
+        f"💰  مبلغ واريز شما: `{user_state.amount:,}` تومان\n"
+        f"🔢 تعداد تتر دريافتي شما: `{user_state.final_tether_amount:.2f}` تتر\n"
+        f"💵 قيمت خريد: `{user_state.current_price:,}` تومان\n"
+        f"🌐 شبکه انتخابی شما: {NETWORK_DISPLAY_NAMES[user_state.selected_network]}\n"
+        f"💼 آدرس کيف پول شما:\n`{wallet_address}`\n\n"
+        f"🆔 کد پيگيري:\n`{tracking_code}`\n\n"
+        f"📅 {persian_date_display} - {persian_time}\n\n"
+        "📞 **لطفاً اين پيام را براي پشتيباني ارسال کنيد:**\n@TTeercom\n\n"
+        "⏰ **توجه:** اين سفارش تنها به مدت 10 دقيقه معتبر است و پس از آن قيمت ممکن است تغيير کند."
+    )
+    
+    await update.message.reply_text(final_message, parse_mode='Markdown', reply_markup=main_menu_keyboard())
+    
+    if ADMIN_SETTINGS["order_notifications"]:
+        try:
+            admin_message = (
+                f"🛒 *سفارش خريد #{order_number}* \n\n"
+                f"👤 کاربر: {update.message.from_user.first_name}\n"
+                f"🆔 کاربري: `{user_id}`\n"
+                f"📞 تماس با کاربر: [کليک کنيد](tg://user?id={user_id})\n\n"
+                f"💰 مبلغ دريافتي ما: {user_state.amount:,} تومان\n"
+                f"🔢 تتر پرداختي ما: {user_state.final_tether_amount:.2f}\n"
+                f"💵 قيمت: {user_state.current_price:,} تومان\n"
+                f"🌐 شبکه: {user_state.selected_network}\n"
+                f"💼 آدرس کيف پول مشتري:\n`{wallet_address}`\n\n"
+                f"🆔 کد پيگيري: `{tracking_code}`"
+            )
+            
+            await context.bot.send_message(chat_id=ADMIN_USER_ID, text=admin_message, parse_mode='Markdown')
+        except Exception as e:
+            TELEGRAM_SEND_FAILURES.inc(type(e).__name__)
+            logging.error(f"خطا در ارسال به ادمين: {e}")
+    
+    del USER_STATES[user_id]
+
+# ================== سيستم فروش (با اطلاعات بانکي جديد) ==================
+async def show_sell_options(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    tether_price = await get_order_tether_price(update)
+    if not tether_price:
+        USER_STATES.pop(user_id, None)
+        return
+    sell_price = tether_price - 1500
+    
+    USER_STATES[user_id] = OrderState(Step.SELL_AMOUNT, service_type="sell", current_price=tether_price, sell_price=sell_price)
+    
+    await update.message.reply_text(
+        f"💵 *فروش تتر به ما* \n\n💰 قيمت فعلي خريد تتر: {tether_price:,} تومان\n"
+        f"💰 *قيمت فعلي فروش تتر* : *{sell_price:,}* *تومان* \n\n"
+        "لطفاً تعداد تتر مورد نظر را وارد کنيد:\n\nمثال: 10\n\n"
+        "يا از دکمه‌هاي زير انتخاب کنيد:",
+        reply_markup=KEYBOARDS["sell_amounts"]
+    )
+
+async def handle_sell_amount(update: Update, context: ContextTypes.DEFAULT_TYPE, amount_text):
+    user_id = update.message.from_user.id
+    user_state = USER_STATES[user_id]
+    sell_price = user_state.sell_price
+    
+    try:
+        clean_amount = re.sub(r'[^\d]', '', amount_text)
+        tether_amount = float(clean_amount)
+        
+        if tether_amount < 1:
+            await update.message.reply_text(
+                "❌ تعداد بسيار کم!\n\nحداقل تعداد فروش 1 تتر است.\n\nلطفاً تعداد معتبر وارد کنيد:",
+                reply_markup=KEYBOARDS["sell_amounts"]
+            )
+            return
+        
+        amount = int(tether_amount * sell_price)
+        
+        user_state.step = Step.SELL_CONFIRM
+        user_state.tether_amount = tether_amount
+        user_state.amount = amount
+        USER_STATES[user_id] = user_state
+        
+        await update.message.reply_text(
+            f"✅ *خلاصه سفارش فروش* \n\n🔢 *تعداد تتر فروشي شما:*  {tether_amount}\n"
+            f"💰 مبلغ دريافتي شما: *{amount:,}* تومان\n\n"
+            "آيا از سفارش خود اطمينان داريد?",
+            reply_markup=KEYBOARDS["confirm"]
+        )
+        
+    except ValueError:
+        await update.message.reply_text(
+            "❌ تعداد نامعتبر!\n\nلطفاً تعداد تتر را به صورت عددي وارد کنيد:\n\nمثال: 10",
+            reply_markup=KEYBOARDS["sell_amounts"]
+        )
+
+async def handle_sell_network_selection(update: Update, context: ContextTypes.DEFAULT_TYPE, network):
+    user_id = update.message.from_user.id
+    user_state = USER_STATES[user_id]
+    
+    user_state.step = Step.CARD_NUMBER
+    user_state.selected_network = network
+    USER_STATES[user_id] = user_state
+    
+    await update.message.reply_text(
+        "💳 *لطفا شماره کارت خود را جهت واريز وجه وارد کنيد* \n\n"
+        "⚠️⚠️  در صورت اينکه شماره کارت به نام غير باشد وجه واريز نخواهد شد",
+        reply_markup=KEYBOARDS["optional"]
+    )
+
+async def handle_card_number(update: Update, context: ContextTypes.DEFAULT_TYPE, card_number):
+    user_id = update.message.from_user.id
+    user_state = USER_STATES[user_id]
+    
+    if card_number == "لازم نيست":
+        card_number = ""
+    
+    user_state.step = Step.ACCOUNT_NUMBER
+    user_state.card_number = card_number
+    USER_STATES[user_id] = user_state
+    
+    await update.message.reply_text(
+        "🏦 *لطفاً شماره حساب خود را وارد کنيد* ",
+        reply_markup=KEYBOARDS["optional"]
+    )
+
+async def handle_account_number(update: Update, context: ContextTypes.DEFAULT_TYPE, account_number):
+    user_id = update.message.from_user.id
+    user_state = USER_STATES[user_id]
+    
+    if account_number == "لازم نيست":
+        account_number = ""
+    
+    user_state.step = Step.SHEBA_NUMBER
+    user_state.account_number = account_number
+    USER_STATES[user_id] = user_state
+    
+    await update.message.reply_text(
+        "🌐 **لطفاً شماره شبا خود را وارد کنيد**\n\n"
+        "💡💡 نيازي به وارد کردن IR نيست، فقط اعداد را وارد کنيد",
+        reply_markup=KEYBOARDS["optional"]
+    )
+
+async def handle_sheba_number(update: Update, context: ContextTypes.DEFAULT_TYPE, sheba_number):
+    user_id = update.message.from_user.id
+    user_state = USER_STATES[user_id]
+    
+    if sheba_number == "لازم نيست":
+        sheba_number = ""
+        sheba_display = ""
+    else:
+        # اضافه کردن IR به شماره شبا اگر وجود ندارد
+        sheba_display = sheba_number.upper()
+        if not sheba_display.startswith('IR'):
+            sheba_display = f'IR{sheba_display}'
+    
+    user_state.step = Step.ACCOUNT_HOLDER
+    user_state.sheba_number = sheba_number
+    user_state.sheba_display = sheba_display
+    USER_STATES[user_id] = user_state
+    
+    await update.message.reply_text(
+        "👤 *لطفاً نام دارنده حساب را وارد کنيد* \n\n"
+        "⚠️هشدار مهم⚠️\n  حساب بايد به نام خودتان باشد، در غير اين صورت وجه واريز نخواهد شد",
+        reply_markup=KEYBOARDS["cancel"]
+    )
+
+async def handle_account_holder(update: Update, context: ContextTypes.DEFAULT_TYPE, account_holder):
+    user_id = update.message.from_user.id
+    user_state = USER_STATES[user_id]
+    
+    wallet_address = WALLET_ADDRESSES.get(user_state.selected_network, "")
+    
+    if not wallet_address:
+        await update.message.reply_text(
+            "❌ آدرس کيف پول براي اين شبکه تنظيم نشده است.\n\nلطفاً با پشتيباني تماس بگيريد.",
+            reply_markup=main_menu_keyboard()
+        )
+        del USER_STATES[user_id]
+        return
+    
+    persian_date, persian_time, persian_date_display, persian_time_full = get_iran_time()
+    persian_date, order_number = await allocate_order_number("sell")
+    ORDERS_TOTAL.inc("sell", user_state.selected_network)
+    tracking_code = make_tracking_code(persian_date, persian_time_full, user_id, order_number)
+    await save_order(tracking_code, "sell", order_number, user_id, persian_date, {**user_state.to_dict(), "account_holder": account_holder})
+    
+    # ساخت بخش اطلاعات بانکي به صورت شرطي
+    bank_info = "💳 **اطلاعات بانکي شما:**\n"
+    if user_state.card_number:
+        bank_info += f"• شماره کارت:\n`{user_state.card_number}`\n\n"
+    if user_state.account_number:
+        bank_info += f"• شماره حساب:\n`{user_state.account_number}`\n\n"
+    if user_state.sheba_display:
+        bank_info += f"• شماره شبا:\n`{user_state.sheba_display}`\n\n"
+    bank_info += f"• نام دارنده حساب:\n`{account_holder}`\n\n"
+    
+    final_message = (
+        f"🎉 *سفارش فروش شما ثبت شد* \n\n"
+        f"🔢 تعداد تتري که بايد واريز کنيد: `{user_state.tether_amount}`\n"
+        f"🌐 شبکه: {NETWORK_DISPLAY_NAMES[user_state.selected_network]}\n\n"
+        f"💼 آدرس کيف پول براي واريز:\n`{wallet_address}`\n\n"
+        "📞 **بعد از واريزي، فيش واريزي تتر را براي پشتيبان ارسال نماييد:**\n@TTeercom\n"
+        f"ــــــــــــــــــــــــــــــــــــــــــــــــــــــــــــــ\n\n"
+        f"💰 *مبلغ دريافتي شما* : `{user_state.amount:,}` تومان\n"
+        f"💵 قيمت فروش: `{user_state.sell_price:,}` تومان\n\n"
+        f"{bank_info}"
+        f"🆔 کد پيگيري:\n`{tracking_code}`\n"
+        f"📅 {persian_date_display} - {persian_time}\n\n"
+        "⏰ **توجه مهم:** اين فرآيند بايد حداکثر تا 10 دقيقه از زمان ثبت انجام شود."
+    )
+    
+    await update.message.reply_text(final_message, parse_mode='Markdown', reply_markup=main_menu_keyboard())
+    
+    if ADMIN_SETTINGS["order_notifications"]:
+        try:
+            # ساخت بخش اطلاعات بانکي براي ادمين
+            admin_bank_info = "💳 **اطلاعات بانکي:**\n"
+            if user_state.card_number:
+                admin_bank_info += f"• شماره کارت: `{user_state.card_number}`\n"
+            if user_state.account_number:
+                admin_bank_info += f"• شماره حساب: `{user_state.account_number}`\n"
+            if user_state.sheba_display:
+                admin_bank_info += f"• شماره شبا: `{user_state.sheba_display}`\n"
+            admin_bank_info += f"• نام دارنده حساب: `{account_holder}`\n\n"
+            
+            admin_message = (
+                f"💵 **سفارش فروش #{order_number}**\n\n"
+                f"👤 کاربر: {update.message.from_user.first_name}\n"
+                f"🆔 کاربري: `{user_id}`\n"
+                f"📞 تماس با کاربر: [کليک کنيد](tg://user?id={user_id})\n\n"
+                f"🔢 تتر دريافتي: {user_state.tether_amount}\n"
+                f"💰 *مبلغي پرداختي ما:* `{user_state.amount:,}` *تومان*\n"
+                f"💵 قيمت فروش: {user_state.sell_price:,} تومان\n"
+                f"🌐 شبکه: {user_state.selected_network}\n\n"
+                f"{admin_bank_info}"
+                f"🆔 کد پيگيري: `{tracking_code}`"
+            )
+            
+            await context.bot.send_message(chat_id=ADMIN_USER_ID, text=admin_message, parse_mode='Markdown')
+        except Exception as e:
+            TELEGRAM_SEND_FAILURES.inc(type(e).__name__)
+            logging.error(f"خطا در ارسال به ادمين: {e}")
+    
+    del USER_STATES[user_id]
+
+# ================== سيستم دريافت قيمت‌ها ==================
+PRICE_REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'application/json'
+}
+
+# حداکثر زمان انتظار براي هر منبع (ثانيه)
+PRICE_SOURCE_TIMEOUTS = {
+    "tether": 6,
+    "gold": 6,
+    "ounce": 6
+}
+
+HTTP_SESSION = None
+
+def get_http_session():
+    # يک session مشترک با connection pool براي همه درخواست‌ها
+    global HTTP_SESSION
+    if HTTP_SESSION is None or HTTP_SESSION.closed:
+        HTTP_SESSION = aiohttp.ClientSession(
+            headers=PRICE_REQUEST_HEADERS,
+            connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300)
+        )
+    return HTTP_SESSION
+
+async def close_http_session():
+    global HTTP_SESSION
+    if HTTP_SESSION is not None and not HTTP_SESSION.closed:
+        await HTTP_SESSION.close()
+    HTTP_SESSION = None
+
+async def fetch_json(url, timeout):
+    session = get_http_session()
+    async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        response.raise_for_status()
+        return await response.json(content_type=None)
+
+# آدرس منابع قيمت (براي تست و محيط‌هاي جايگزين قابل تغيير است)
+PRICE_PROVIDER_URLS = {
+    "kifpool": "https://api.kifpool.app/api/spot/price/paginated?offset=0&limit=25",
+    "nobitex": "https://api.nobitex.ir/market/stats?srcCurrency=usdt&dstCurrency=rls",
+    "wallex": "https://api.wallex.ir/v1/markets",
+    "milli": "https://milli.gold/api/v1/public/milli-price/external",
+    "tgju": "https://call1.tgju.org/ajax.json",
+    "goldprice": "https://data-asg.goldprice.org/dbXRates/USD",
+    "goldapi": "https://api.gold-api.com/price/XAU"
+}
+
+def parse_price_number(value):
+    return float(str(value).replace(',', ''))
+
+async def fetch_kifpool_tether(timeout):
+    data = await fetch_json(PRICE_PROVIDER_URLS["kifpool"], timeout)
+    for item in data.get('data', []):
+        if item.get('symbol') == 'USDT':
+            return int(item.get('priceSellIRT', 0))
+    return 0
+
+async def fetch_nobitex_tether(timeout):
+    data = await fetch_json(PRICE_PROVIDER_URLS["nobitex"], timeout)
+    # قيمت نوبيتکس به ريال است
+    return int(parse_price_number(data['stats']['usdt-rls']['latest']) / 10)
+
+async def fetch_wallex_tether(timeout):
+    data = await fetch_json(PRICE_PROVIDER_URLS["wallex"], timeout)
+    return int(parse_price_number(data['result']['symbols']['USDTTMN']['stats']['lastPrice']))
+
+async def fetch_milli_gold(timeout):
+    data = await fetch_json(PRICE_PROVIDER_URLS["milli"], timeout)
+    if 'price18' in data:
+        return int(data['price18']) * 100
+    return 0
+
+async def fetch_tgju_gold(timeout):
+    data = await fetch_json(PRICE_PROVIDER_URLS["tgju"], timeout)
+    # قيمت tgju به ريال است
+    return int(parse_price_number(data['current']['geram18']['p']) / 10)
+
+async def fetch_goldprice_ounce(timeout):
+    data = await fetch_json(PRICE_PROVIDER_URLS["goldprice"], timeout)
+    if 'items' in data and len(data['items']) > 0:
+        return int(float(data['items'][0]['xauPrice']))
+    return 0
+
+async def fetch_goldapi_ounce(timeout):
+    data = await fetch_json(PRICE_PROVIDER_URLS["goldapi"], timeout)
+    return int(float(data['price']))
+
+async def fetch_tgju_ounce(timeout):
+    data = await fetch_json(PRICE_PROVIDER_URLS["tgju"], timeout)
+    return int(parse_price_number(data['current']['ons']['p']))
+
+# ================== ثبت منابع قيمت ==================
+PRICE_PROVIDERS = {
+    "tether": {
+        "kifpool": fetch_kifpool_tether,
+        "nobitex": fetch_nobitex_tether,
+        "wallex": fetch_wallex_tether
+    },
+    "gold": {
+        "milli": fetch_milli_gold,
+        "tgju": fetch_tgju_gold
+    },
+    "ounce": {
+        "goldprice": fetch_goldprice_ounce,
+        "goldapi": fetch_goldapi_ounce,
+        "tgju": fetch_tgju_ounce
+    }
+}
+
+PRICE_AGGREGATION_MODES = ("first", "median")
+
+def calculate_gold_dollar_price(gold_price, gold_ounce):
+    if gold_price > 0 and gold_ounce > 0:
+        return int((gold_price * 31.1035) / (gold_ounce * 0.75))
+    return 0
+
+# ================== تاريخچه قيمت‌ها ==================
+# هر تغيير قيمت به صورت ستوني (array از نوع double) در فايل‌هاي قطعه‌اي memory-mapped ذخيره مي‌شود
+HISTORY_DIR = os.environ.get('HISTORY_DIR', 'price_history')
+HISTORY_COLUMNS = ("timestamp", "tether", "gold", "ounce", "gold_dollar")
+HISTORY_SEGMENT_ROWS = 8192
+HISTORY_HEADER = struct.Struct("=Q")
+HISTORY_SEGMENT_SIZE = HISTORY_HEADER.size + len(HISTORY_COLUMNS) * HISTORY_SEGMENT_ROWS * 8
+
+HISTORY_RESOLUTIONS = {"1m": 60, "1h": 3600, "1d": 86400}
+HISTORY_INSTRUMENTS = {
+    "tether": "نرخ تتر",
+    "gold": "طلا 18 عيار",
+    "ounce": "انس جهاني",
+    "gold_dollar": "قيمت دلار طلا"
+}
+
+def history_bucket_start(timestamp, resolution):
+    # روزها بر اساس ساعت ايران بسته مي‌شوند
+    bucket_size = HISTORY_RESOLUTIONS[resolution]
+    utc_offset = datetime.now(IRAN_TZ).utcoffset().total_seconds()
+    return (timestamp + utc_offset) // bucket_size * bucket_size - utc_offset
+
+class HistorySegment:
+    __slots__ = ("path", "file", "mm", "count")
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.truncate(HISTORY_SEGMENT_SIZE)
+        self.file = open(path, "r+b")
+        self.mm = mmap.mmap(self.file.fileno(), HISTORY_SEGMENT_SIZE)
+        self.count = HISTORY_HEADER.unpack_from(self.mm, 0)[0]
+
+    def column(self, name, start=0, end=None):
+        # نماي بدون کپي روي ستون؛ بايد قبل از بستن قطعه آزاد شود
+        offset = HISTORY_HEADER.size + HISTORY_COLUMNS.index(name) * HISTORY_SEGMENT_ROWS * 8
+        end = self.count if end is None else end
+        return memoryview(self.mm)[offset + start * 8:offset + end * 8].cast("d")
+
+    def is_full(self):
+        return self.count >= HISTORY_SEGMENT_ROWS
+
+    def append(self, row):
+        for index, value in enumerate(row):
+            offset = HISTORY_HEADER.size + (index * HISTORY_SEGMENT_ROWS + self.count) * 8
+            struct.pack_into("=d", self.mm, offset, value)
+        self.count += 1
+        HISTORY_HEADER.pack_into(self.mm, 0, self.count)
+
+    def bounds(self):
+        with self.column("timestamp") as timestamps:
+            return (timestamps[0], timestamps[-1]) if self.count else (0, 0)
+
+    def close(self):
+        self.mm.flush()
+        self.mm.close()
+        self.file.close()
+
+class PriceHistory:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # فقط قطعه فعال باز مي‌ماند؛ براي بقيه بازه زماني در حافظه نگه داشته مي‌شود
+        self.sealed = []
+        names = sorted(name for name in os.listdir(directory) if name.endswith(".seg"))
+        for name in names[:-1]:
+            segment = HistorySegment(os.path.join(directory, name))
+            first, last = segment.bounds()
+            self.sealed.append((first, last, segment.count, segment.path))
+            segment.close()
+        self.active = HistorySegment(os.path.join(directory, names[-1] if names else "000000.seg"))
+        self.last_row = self.read_last_row()
+
+    def __len__(self):
+        return sum(count for _, _, count, _ in self.sealed) + self.active.count
+
+    def read_last_row(self):
+        if not self.active.count:
+            return None
+        return tuple(self.value_at(self.active, name, self.active.count - 1) for name in HISTORY_COLUMNS)
+
+    @staticmethod
+    def value_at(segment, name, index):
+        with segment.column(name, index, index + 1) as view:
+            return view[0]
+
+    def append(self, timestamp, prices):
+        # قيمت صفر يعني دريافت نشده و به صورت NaN ذخيره مي‌شود
+        row = (timestamp,) + tuple(float(price) if price > 0 else math.nan for price in prices)
+        if self.active.is_full():
+            first, last = self.active.bounds()
+            self.sealed.append((first, last, self.active.count, self.active.path))
+            self.active.close()
+            self.active = HistorySegment(os.path.join(self.directory, f"{len(self.sealed):06d}.seg"))
+        self.active.append(row)
+        self.last_row = row
+
+    def segments_between(self, start, end):
+        for first, last, _, path in self.sealed:
+            if last >= start and first <= end:
+                segment = HistorySegment(path)
+                try:
+                    yield segment
+                finally:
+                    segment.close()
+        if self.active.count:
+            yield self.active
+
+    def query(self, name, start, end):
+        # بازه [start, end] با جستجوي دودويي روي ستون زمان هر قطعه پيدا مي‌شود
+        timestamps = array("d")
+        values = array("d")
+        for segment in self.segments_between(start, end):
+            with segment.column("timestamp") as segment_timestamps:
+                low = bisect.bisect_left(segment_timestamps, start)
+                high = bisect.bisect_right(segment_timestamps, end)
+                timestamps.frombytes(segment_timestamps[low:high].tobytes())
+            with segment.column(name, low, high) as segment_values:
+                values.frombytes(segment_values.tobytes())
+        return timestamps, values
+
+    def ohlc(self, name, start, end, resolution):
+        candles = []
+        timestamps, values = self.query(name, start, end)
+        for timestamp, value in zip(timestamps, values):
+            if math.isnan(value):
+                continue
+            bucket = history_bucket_start(timestamp, resolution)
+            if candles and candles[-1][0] == bucket:
+                _, open_price, high, low, _ = candles[-1]
+                candles[-1] = (bucket, open_price, max(high, value), min(low, value), value)
+            else:
+                candles.append((bucket, value, value, value, value))
+        return candles
+
+    def change_percent(self, name, since):
+        # درصد تغيير آخرين قيمت نسبت به اولين قيمت ثبت شده از زمان since
+        if self.last_row is None:
+            return None
+        _, values = self.query(name, since, self.last_row[0])
+        values = [value for value in values if not math.isnan(value)]
+        if len(values) < 2 or not values[0]:
+            return None
+        return (values[-1] - values[0]) / values[0] * 100
+
+    def close(self):
+        self.active.close()
+
+PRICE_HISTORY = PriceHistory(HISTORY_DIR)
+
+# ================== کش و پايش قيمت‌ها ==================
+PRICE_SOURCE_LABELS = {
+    "tether": "قيمت تتر",
+    "gold": "قيمت طلا",
+    "ounce": "انس جهاني"
+}
+
+# تأخير بين تلاش‌هاي مجدد يک منبع خراب (ثانيه)
+PRICE_BACKOFF_BASE = 15
+PRICE_BACKOFF_MAX = 600
+
+# آخرين قيمت‌هاي معتبر؛ version با هر تغيير قيمت افزايش مي‌يابد
+PRICE_SNAPSHOT = {
+    "version": 0,
+    "prices": (0, 0, 0, 0),
+    "values": {"tether": 0, "gold": 0, "ounce": 0},
+    "updated_at": {"tether": 0, "gold": 0, "ounce": 0},
+    "stale": set(),
+    "timestamp": 0
+}
+# وضعيت هر منبع به تفکيک (نوع قيمت، نام منبع)
+PRICE_PROVIDER_STATE = {
+    (instrument, name): {"failures": 0, "retry_at": 0, "last_price": 0}
+    for instrument, providers in PRICE_PROVIDERS.items()
+    for name in providers
+}
+PRICE_POLLER = {"active": False}
+PRICE_REFRESH_TASK = None
+
+def price_snapshot_age():
+    if not PRICE_SNAPSHOT["timestamp"]:
+        return None
+    return time.time() - PRICE_SNAPSHOT["timestamp"]
+
+def has_retryable_missing_price():
+    # قيمتي که هنوز دريافت نشده (صفر) تا وقتي منبعي براي تلاش مجدد آماده است کش نمي‌شود
+    now = time.time()
+    return any(
+        not value and any(
+            PRICE_PROVIDER_STATE[(name, provider)]["retry_at"] <= now
+            for provider in enabled_price_providers(name)
+        )
+        for name, value in PRICE_SNAPSHOT["values"].items()
+    )
+
+def is_price_snapshot_fresh():
+    # وقتي پايشگر فعال است، خواندن هميشه از snapshot انجام مي‌شود
+    age = price_snapshot_age()
+    if age is None or has_retryable_missing_price():
+        return False
+    return PRICE_POLLER["active"] or age < ADMIN_SETTINGS["price_cache_ttl"]
+
+def is_price_available(snapshot, name):
+    # قيمت صفر (دريافت نشده) يا قديمي براي سفارش و انتشار قابل استفاده نيست
+    return snapshot["values"][name] > 0 and name not in snapshot["stale"]
+
+def enabled_price_providers(instrument):
+    configured = ADMIN_SETTINGS["price_providers"].get(instrument, [])
+    return [name for name in configured if name in PRICE_PROVIDERS[instrument]]
+
+async def fetch_from_provider(instrument, name):
+    state = PRICE_PROVIDER_STATE[(instrument, name)]
+    started = time.perf_counter()
+    try:
+        price = await PRICE_PROVIDERS[instrument][name](PRICE_SOURCE_TIMEOUTS[instrument])
+        if price <= 0:
+            raise ValueError("قيمت نامعتبر")
+    except Exception as e:
+        # خطاها و timeout ها هم در هيستوگرام ثبت مي‌شوند؛ درخواست‌هاي لغو شده حالت first ثبت نمي‌شوند
+        PRICE_FETCH_LATENCY.observe(time.perf_counter() - started, instrument, name)
+        PRICE_FETCH_ERRORS.inc(instrument, name)
+        state["failures"] += 1
+        delay = min(PRICE_BACKOFF_BASE * 2 ** (state["failures"] - 1), PRICE_BACKOFF_MAX)
+        state["retry_at"] = time.time() + delay
+        logging.error(f"❌ خطا در دريافت {PRICE_SOURCE_LABELS[instrument]} از {name} (تلاش مجدد تا {int(delay)} ثانيه ديگر): {e!r}")
+        raise
+    PRICE_FETCH_LATENCY.observe(time.perf_counter() - started, instrument, name)
+    state["failures"] = 0
+    state["retry_at"] = 0
+    state["last_price"] = price
+    return price
+
+async def fetch_first_valid_price(instrument, names):
+    # اولين پاسخ معتبر برنده است و بقيه درخواست‌ها لغو مي‌شوند
+    pending = {asyncio.ensure_future(fetch_from_provider(instrument, name)) for name in names}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.exception():
+                    return task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+    return 0
+
+PRICE_OUTLIER_MIN_PROVIDERS = 3
+# آخرين اختلاف منابع هر نوع قيمت وقتي براي حذف قيمت پرت منبع کافي نبوده است
+PRICE_DISAGREEMENTS = {}
+
+async def fetch_median_price(instrument, names):
+    results = await asyncio.gather(*(fetch_from_provider(instrument, name) for name in names), return_exceptions=True)
+    prices = sorted(result for result in results if not isinstance(result, Exception))
+    if not prices:
+        return 0
+
+    median = statistics.median(prices)
+    tolerance = median * ADMIN_SETTINGS["price_outlier_percent"] / 100
+    PRICE_DISAGREEMENTS.pop(instrument, None)
+    if len(prices) < PRICE_OUTLIER_MIN_PROVIDERS:
+        # با کمتر از سه قيمت اکثريتي براي تشخيص قيمت پرت وجود ندارد؛ فقط اختلاف گزارش مي‌شود
+        if len(names) > len(prices):
+            logging.warning(f"⚠️ فقط {len(prices)} منبع از {len(names)} منبع {PRICE_SOURCE_LABELS[instrument]} پاسخ داد: {prices}")
+        if prices[-1] - prices[0] > tolerance:
+            PRICE_DISAGREEMENTS[instrument] = prices
+            logging.warning(f"⚠️ اختلاف منابع {PRICE_SOURCE_LABELS[instrument]} بيش از حد مجاز است: {prices}")
+        return int(median)
+
+    # حذف قيمت‌هايي که بيش از حد مجاز با ميانه فاصله دارند
+    accepted = [price for price in prices if abs(price - median) <= tolerance]
+    rejected = len(prices) - len(accepted)
+    if rejected:
+        logging.warning(f"⚠️ {rejected} قيمت پرت براي {PRICE_SOURCE_LABELS[instrument]} حذف شد: {prices}")
+    return int(statistics.median(accepted))
+
+async def fetch_instrument_price(instrument):
+    now = time.time()
+    names = [
+        name for name in enabled_price_providers(instrument)
+        if PRICE_PROVIDER_STATE[(instrument, name)]["retry_at"] <= now
+    ]
+    if not names:
+        return 0
+    if ADMIN_SETTINGS["price_mode"] == "first":
+        return await fetch_first_valid_price(instrument, names)
+    return await fetch_median_price(instrument, names)
+
+async def poll_prices():
+    instruments = list(PRICE_PROVIDERS)
+    results = await asyncio.gather(*(fetch_instrument_price(name) for name in instruments), return_exceptions=True)
+
+    now = time.time()
+    values = dict(PRICE_SNAPSHOT["values"])
+    for name, result in zip(instruments, results):
+        if isinstance(result, Exception):
+            logging.error(f"❌ خطا در دريافت {PRICE_SOURCE_LABELS[name]}: {result!r}")
+            continue
+        if result:
+            values[name] = result
+            PRICE_SNAPSHOT["updated_at"][name] = now
+
+    stale_after = ADMIN_SETTINGS["price_stale_after"]
+    PRICE_SNAPSHOT["stale"] = {
+        name for name, updated_at in PRICE_SNAPSHOT["updated_at"].items()
+        if now - updated_at > stale_after
+    }
+
+    if values != PRICE_SNAPSHOT["values"]:
+        PRICE_SNAPSHOT["values"] = values
+        PRICE_SNAPSHOT["prices"] = (
+            values["tether"],
+            values["gold"],
+            values["ounce"],
+            calculate_gold_dollar_price(values["gold"], values["ounce"])
+        )
+        PRICE_SNAPSHOT["version"] += 1
+        PRICE_HISTORY.append(now, PRICE_SNAPSHOT["prices"])
+    PRICE_SNAPSHOT["timestamp"] = now
+    return PRICE_SNAPSHOT
+
+async def refresh_price_snapshot():
+    # درخواست‌هاي همزمان منتظر همان يک دريافت مي‌مانند (single-flight)
+    global PRICE_REFRESH_TASK
+    if PRICE_REFRESH_TASK is None or PRICE_REFRESH_TASK.done():
+        PRICE_REFRESH_TASK = asyncio.ensure_future(poll_prices())
+    return await asyncio.shield(PRICE_REFRESH_TASK)
+
+async def price_poll_job(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        await refresh_price_snapshot()
+    except Exception as e:
+        logging.error(f"❌ خطا در پايش قيمت‌ها: {e}")
+        return
+    try:
+        await publish_price_update(context.bot)
+    except Exception as e:
+        logging.error(f"❌ خطا در انتشار قيمت: {e}")
+    fire_price_alerts(context.application)
+
+def start_price_poller(job_queue):
+    job_queue.run_repeating(
+        price_poll_job,
+        interval=ADMIN_SETTINGS["price_poll_interval"],
+        first=0,
+        name="price_poll_job"
+    )
+    PRICE_POLLER["active"] = True
+
+async def get_price_snapshot():
+    if is_price_snapshot_fresh():
+        PRICE_CACHE_REQUESTS.inc("hit")
+        return PRICE_SNAPSHOT
+    PRICE_CACHE_REQUESTS.inc("miss")
+    with trace_span("fetch"):
+        return await refresh_price_snapshot()
+
+# ================== قالب پيام قيمت ==================
+PRICE_MESSAGE_TEMPLATES = {
+    "price": """🟢 *قيمت الان...*
+
+ ▫️ *نرخ تتر*                   `{tether}` تومان
+▫️ *طلا 18 عيار*     `{gold}` تومان 
+ ▫️ *انس جهاني*                `{ounce}` دلار
+ ▫️ *قيمت دلار طلا*       `{gold_dollar}` تومان
+
+ــــــــــــــــــــــــــــــــــــــــــــــــــــــــــــــ
+📅{date}
+⏰{time}
+
+🤖 [قيمت الان چند؟](https://t.me/TTeer_com_bot)""",
+    "channel": """🟢 *قيمت لحظه‌اي تتر و طلا*
+
+ ▫️ *نرخ تتر*                   `{tether}` تومان
+▫️ *طلا 18 عيار*     `{gold}` تومان 
+ ▫️ *انس جهاني*                `{ounce}` دلار
+ ▫️ *قيمت دلار طلا*       `{gold_dollar}` تومان
+
+ــــــــــــــــــــــــــــــــــــــــــــــــــــــــــــــ
+📅 {date}
+⏰ {time}
+
+🤖 [قيمت الان چند؟](https://t.me/TTeer_com_bot)"""
+}
+
+# پيام حالت alert که تغيير نسبت به آخرين پيام منتشر شده را نشان مي‌دهد
+PRICE_ALERT_TEMPLATE = """🔔 *تغيير قيمت تتر و طلا*
+
+ ▫️ *نرخ تتر*                   `{tether}` تومان {tether_change}
+▫️ *طلا 18 عيار*     `{gold}` تومان {gold_change}
+ ▫️ *انس جهاني*                `{ounce}` دلار
+ ▫️ *قيمت دلار طلا*       `{gold_dollar}` تومان
+
+ــــــــــــــــــــــــــــــــــــــــــــــــــــــــــــــ
+📅 {date}
+⏰ {time}
+
+🤖 [قيمت الان چند؟](https://t.me/TTeer_com_bot)"""
+
+# پيام‌هاي ساخته شده بر اساس (قالب، نسخه قيمت‌ها، تاريخ، دقيقه) نگه داشته مي‌شوند
+RENDERED_PRICE_MESSAGES = {}
+RENDERED_PRICE_MESSAGES_LIMIT = 64
+
+def format_price(price):
+    return f"{price:,}" if price > 0 else "0"
+
+def render_price_message(template, snapshot):
+    _, persian_time, persian_date_display, _ = get_iran_time()
+    key = (template, snapshot["version"], persian_date_display, persian_time)
+    message = RENDERED_PRICE_MESSAGES.get(key)
+    if message is not None:
+        RENDER_CACHE_REQUESTS.inc("hit")
+    else:
+        RENDER_CACHE_REQUESTS.inc("miss")
+        if len(RENDERED_PRICE_MESSAGES) >= RENDERED_PRICE_MESSAGES_LIMIT:
+            RENDERED_PRICE_MESSAGES.clear()
+        tether_price, gold_price, gold_ounce, gold_dollar_price = snapshot["prices"]
+        with trace_span("render"):
+            message = PRICE_MESSAGE_TEMPLATES[template].format(
+                tether=format_price(tether_price),
+                gold=format_price(gold_price),
+                ounce=format_price(gold_ounce),
+                gold_dollar=format_price(gold_dollar_price),
+                date=persian_date_display,
+                time=persian_time
+            )
+        RENDERED_PRICE_MESSAGES[key] = message
+    return message
+
+# ================== دستورات کاربري ==================
+async def price_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id in USER_STATES:
+        del USER_STATES[user_id]
+    
+    # پيام انتظار فقط وقتي لازم است که قيمت‌ها بايد از منابع دريافت شوند
+    wait_msg = None
+    if not is_price_snapshot_fresh():
+        wait_msg = await update.message.reply_text("🔄 در حال دريافت آخرين قيمت‌ها...")
+    snapshot = await get_price_snapshot()
+    message = render_price_message("price", snapshot)
+    
+    if wait_msg:
+        await wait_msg.delete()
+    await update.message.reply_text(message, parse_mode='Markdown', reply_markup=main_menu_keyboard())
+
+def format_history_time(timestamp, resolution):
+    moment = jdatetime.datetime.fromgregorian(datetime=datetime.fromtimestamp(timestamp, IRAN_TZ).replace(tzinfo=None))
+    return moment.strftime("%Y/%m/%d") if resolution == "1d" else moment.strftime("%m/%d %H:%M")
+
+async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    args = context.args or []
+    name = args[0] if len(args) > 0 else "tether"
+    resolution = args[1] if len(args) > 1 else "1h"
+    count = args[2] if len(args) > 2 else "24"
+    if name not in HISTORY_INSTRUMENTS or resolution not in HISTORY_RESOLUTIONS or not count.isdigit():
+        await update.message.reply_text(
+            "📝 **دستور تاريخچه قيمت:**\n\n"
+            f"Usage: /history [{'|'.join(HISTORY_INSTRUMENTS)}] [{'|'.join(HISTORY_RESOLUTIONS)}] [تعداد]\n\n"
+            "مثال:\n"
+            "/history tether 1h 24"
+        )
+        return
+    
+    count = max(1, min(int(count), 48))
+    # بازه از ابتداي يک بازه کامل شروع مي‌شود تا اولين کندل ناقص نباشد؛ کندل آخر بازه جاري است
+    end = time.time()
+    start = history_bucket_start(end, resolution) - (count - 1) * HISTORY_RESOLUTIONS[resolution]
+    candles = PRICE_HISTORY.ohlc(name, start, end, resolution)
+    if not candles:
+        await update.message.reply_text("📭 هنوز تاريخچه‌اي براي اين بازه ثبت نشده است.")
+        return
+    
+    message = f"📈 **تاريخچه {HISTORY_INSTRUMENTS[name]}** ({resolution})\n\n"
+    for bucket, open_price, high, low, close_price in candles:
+        message += (
+            f"{format_history_time(bucket, resolution)}  "
+            f"O:{format_price(round(open_price))} H:{format_price(round(high))} "
+            f"L:{format_price(round(low))} C:{format_price(round(close_price))}\n"
+        )
+    change = PRICE_HISTORY.change_percent(name, start)
+    if change is not None:
+        arrow = "🔺" if change > 0 else "🔻" if change < 0 else "⏺"
+        message += f"\n{arrow} تغيير در اين بازه: {change:+.2f}%"
+    await update.message.reply_text(message)
+
+async def alert_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    match = ALERT_PATTERN.match(" ".join(context.args or []).strip())
+    instrument = ALERT_INSTRUMENT_ALIASES.get(match.group(1).lower()) if match else None
+    target = float(match.group(3).replace(",", "")) if match else 0
+    if instrument is None or target <= 0:
+        await update.message.reply_text(
+            "📝 **دستور هشدار قيمت:**\n\n"
+            "Usage: /alert <usdt|gold> <>=|<=> <قيمت به تومان>\n\n"
+            "مثال:\n"
+            "/alert usdt >= 105000\n"
+            "/alert gold <= 7,000,000"
+        )
+        return
+    
+    price = PRICE_SNAPSHOT["values"][instrument]
+    if price and not price / ALERT_TARGET_BAND <= target <= price * ALERT_TARGET_BAND:
+        await update.message.reply_text(
+            f"❌ قيمت هدف با قيمت فعلي ({format_price(price)} تومان) فاصله زيادي دارد!\n\n"
+            f"قيمت هدف بايد بين {format_price(round(price / ALERT_TARGET_BAND))} و "
+            f"{format_price(round(price * ALERT_TARGET_BAND))} تومان باشد."
+        )
+        return
+    
+    if len(USER_PRICE_ALERTS.get(user_id, ())) >= MAX_ALERTS_PER_USER:
+        await update.message.reply_text(f"❌ حداکثر {MAX_ALERTS_PER_USER} هشدار فعال مي‌توانيد داشته باشيد. با /delalert يکي را حذف کنيد.")
+        return
+    
+    alert = await add_price_alert(user_id, instrument, ALERT_OPERATORS[match.group(2)], target)
+    await update.message.reply_text(
+        f"✅ هشدار ثبت شد:\n{format_price_alert(alert)}\n\n"
+        "وقتي قيمت به اين مقدار برسد به شما اطلاع داده مي‌شود."
+    )
+
+async def alerts_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    alert_ids = sorted(USER_PRICE_ALERTS.get(user_id, ()))
+    if not alert_ids:
+        await update.message.reply_text("📭 هشدار فعالي نداريد. براي ثبت هشدار از /alert استفاده کنيد.")
+        return
+    
+    message = "🔔 **هشدارهاي فعال شما:**\n\n"
+    message += "\n".join(format_price_alert(PRICE_ALERTS[alert_id]) for alert_id in alert_ids)
+    message += "\n\nبراي حذف: /delalert <شماره>"
+    await update.message.reply_text(message)
+
+async def delete_alert_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if not context.args or not context.args[0].lstrip("#").isdigit():
+        await update.message.reply_text("📝 **دستور حذف هشدار:**\n\nUsage: /delalert <شماره>\n\nمثال:\n/delalert 12")
+        return
+    
+    alert_id = int(context.args[0].lstrip("#"))
+    if alert_id not in USER_PRICE_ALERTS.get(user_id, ()):
+        await update.message.reply_text("❌ هشداري با اين شماره پيدا نشد!")
+        return
+    
+    delete_price_alert(alert_id)
+    await update.message.reply_text(f"✅ هشدار #{alert_id} حذف شد!")
+
+def main_menu_keyboard():
+    return KEYBOARDS["main_menu"]
+
+async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    user_name = update.message.from_user.first_name
+    save_user(user_id, user_name)
+    
+    welcome_message = f"""👋 سلام {user_name}!
+به ربات تتردات کام خوش آمديد!
+
+💡 **امکانات ربات:**
+• دريافت قيمت لحظه‌اي تتر و طلا
+• خريد و فروش امن تتر
+• پشتيباني 24 ساعته
+
+📢 **کانال اطلاع‌رساني ما:**
+@TTeer_com
+
+لطفاً يکي از گزينه‌هاي زير را انتخاب کنيد:"""
+    
+    await update.message.reply_text(welcome_message, reply_markup=main_menu_keyboard())
+
+# ================== دستورات مديريت کانال ==================
+async def set_interval_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    if not context.args:
+        await update.message.reply_text(
+            "📝 **دستور تنظيم فاصله ارسال به کانال:**\n\nUsage: /setinterval <دقيقه>\n\nمثال:\n/setinterval 30\n/setinterval 15"
+        )
+        return
+    
+    try:
+        interval = int(context.args[0])
+        if interval < 5:
+            await update.message.reply_text("❌ فاصله ارسال نمي‌تواند کمتر از 5 دقيقه باشد!")
+            return
+        
+        ADMIN_SETTINGS["channel_interval"] = interval
+        save_admin_settings(ADMIN_SETTINGS)
+        
+        # زمان‌بندي کانال اصلي به‌روز مي‌شود و در نوبت بعدي publisher اعمال مي‌شود
+        schedule = default_publish_schedule()
+        if schedule:
+            schedule["interval_minutes"] = interval
+            save_publish_schedule(schedule)
+        elif CHANNEL_ID:
+            await add_publish_schedule(CHANNEL_ID, "channel", interval_minutes=interval)
+        
+        await update.message.reply_text(f"✅ فاصله ارسال به کانال به {interval} دقيقه تنظيم شد!")
+        
+    except ValueError:
+        await update.message.reply_text("❌ مقدار نامعتبر! لطفاً يک عدد وارد کنيد.")
+
+async def send_now_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    schedules = [schedule for schedule in PUBLISH_SCHEDULES.values() if schedule["active"]]
+    if context.args:
+        schedule_id = int(context.args[0]) if context.args[0].isdigit() else None
+        if schedule_id not in PUBLISH_SCHEDULES:
+            await update.message.reply_text("❌ زمان‌بندي با اين شماره وجود ندارد!")
+            return
+        schedules = [PUBLISH_SCHEDULES[schedule_id]]
+    if not schedules:
+        await update.message.reply_text("📭 هيچ زمان‌بندي فعالي وجود ندارد.")
+        return
+    
+    try:
+        sent = await publish_schedules(context.bot, schedules, time.time(), force=True)
+        await update.message.reply_text(f"✅ قيمت به {sent} از {len(schedules)} کانال ارسال شد!")
+    except Exception as e:
+        await update.message.reply_text(f"❌ خطا در ارسال به کانال: {e}")
+
+async def add_schedule_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    usage = (
+        "📝 **دستور افزودن زمان‌بندي انتشار:**\n\n"
+        "Usage: /addschedule <کانال> <دقيقه|ساعت‌ها|live> [قالب]\n"
+        "Usage: /addschedule <کانال> alert <آستانه> [حداکثر فاصله به دقيقه]\n\n"
+        f"قالب‌ها: {', '.join(PRICE_MESSAGE_TEMPLATES)}\n"
+        "live: يک پيام سنجاق شده که با تغيير قيمت‌ها ويرايش مي‌شود\n"
+        "alert: ارسال فوري وقتي تتر يا طلا بيش از آستانه (درصد يا تومان) تغيير کند\n\n"
+        "مثال:\n"
+        "/addschedule @TTeer_com 15\n"
+        "/addschedule @TTeer_com 09:00,13:30,18:00 channel\n"
+        "/addschedule @TTeer_com live\n"
+        "/addschedule @TTeer_com alert 0.5% 60\n"
+        "/addschedule @TTeer_com alert 500"
+    )
+    if len(context.args) < 2:
+        await update.message.reply_text(usage)
+        return
+    
+    channel, timing = context.args[0], context.args[1]
+    if timing == "alert":
+        if not (channel.startswith("@") or channel.lstrip("-").isdigit()) or len(context.args) < 3:
+            await update.message.reply_text(usage)
+            return
+        try:
+            threshold, unit = parse_alert_threshold(context.args[2])
+            max_interval = int(context.args[3]) if len(context.args) > 3 else ALERT_DEFAULT_MAX_INTERVAL
+        except ValueError:
+            await update.message.reply_text(usage)
+            return
+        if max_interval < PUBLISH_MIN_INTERVAL:
+            await update.message.reply_text(f"❌ حداکثر فاصله نمي‌تواند کمتر از {PUBLISH_MIN_INTERVAL} دقيقه باشد!")
+            return
+        options = {"threshold": threshold, "unit": unit, "max_interval": max_interval}
+        schedule = await add_publish_schedule(channel, "alert", mode="alert", options=options)
+        await update.message.reply_text(f"✅ زمان‌بندي ثبت شد:\n\n{format_schedule(schedule)}")
+        return
+    
+    template = context.args[2] if len(context.args) > 2 else "channel"
+    if not (channel.startswith("@") or channel.lstrip("-").isdigit()) or template not in PRICE_MESSAGE_TEMPLATES:
+        await update.message.reply_text(usage)
+        return
+    
+    interval_minutes, times, mode = None, [], "post"
+    if timing == "live":
+        mode = "ticker"
+    elif timing.isdigit():
+        interval_minutes = int(timing)
+        if interval_minutes < PUBLISH_MIN_INTERVAL:
+            await update.message.reply_text(f"❌ فاصله ارسال نمي‌تواند کمتر از {PUBLISH_MIN_INTERVAL} دقيقه باشد!")
+            return
+    else:
+        times = sorted(set(timing.split(",")))
+        if not all(PUBLISH_TIME_PATTERN.match(t) for t in times):
+            await update.message.reply_text("❌ ساعت‌ها بايد به شکل HH:MM و با کاما جدا شوند!")
+            return
+    
+    schedule = await add_publish_schedule(channel, template, interval_minutes=interval_minutes, times=times, mode=mode)
+    await update.message.reply_text(f"✅ زمان‌بندي ثبت شد:\n\n{format_schedule(schedule)}")
+
+async def schedules_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    if not PUBLISH_SCHEDULES:
+        await update.message.reply_text("📭 هيچ زمان‌بندي ثبت نشده است.")
+        return
+    
+    message = "📅 **زمان‌بندي‌هاي انتشار قيمت:**\n\n"
+    message += "\n\n".join(format_schedule(schedule) for schedule in PUBLISH_SCHEDULES.values())
+    await update.message.reply_text(message)
+
+async def remove_schedule_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    if not context.args or not context.args[0].isdigit():
+        await update.message.reply_text(
+            "📝 **دستور حذف زمان‌بندي:**\n\nUsage: /removeschedule <شماره>\n\nمثال:\n/removeschedule 2"
+        )
+        return
+    
+    schedule_id = int(context.args[0])
+    if schedule_id not in PUBLISH_SCHEDULES:
+        await update.message.reply_text("❌ زمان‌بندي با اين شماره وجود ندارد!")
+        return
+    
+    delete_publish_schedule(schedule_id)
+    await update.message.reply_text(f"✅ زمان‌بندي #{schedule_id} حذف شد!")
+
+async def channel_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    try:
+        # بررسي وضعيت کانال
+        channel_info = await context.bot.get_chat(CHANNEL_ID)
+        channel_members = await context.bot.get_chat_members_count(CHANNEL_ID)
+        age = price_snapshot_age()
+        cache_age = f"{int(age)} ثانيه" if age is not None else "خالي"
+        stale_sources = "، ".join(PRICE_SOURCE_LABELS[name] for name in sorted(PRICE_SNAPSHOT["stale"])) or "ندارد"
+        
+        status_message = f"""
+📊 **وضعيت کانال:**
+
+📢 نام کانال: {channel_info.title}
+👥 تعداد اعضا: {channel_members}
+⏰ فاصله ارسال: {ADMIN_SETTINGS['channel_interval']} دقيقه
+📅 زمان‌بندي‌هاي فعال: {sum(schedule['active'] for schedule in PUBLISH_SCHEDULES.values())}
+🕒 عمر کش قيمت‌ها: {cache_age}
+⚠️ قيمت‌هاي قديمي: {stale_sources}
+
+🛠️ **دستورات مديريت کانال:**
+• /setinterval <دقيقه> - تنظيم فاصله ارسال
+• /sendnow [شماره] - ارسال فوري قيمت
+• /schedules - نمايش زمان‌بندي‌ها
+• /channelstatus - نمايش اين وضعيت
+"""
+        await update.message.reply_text(status_message)
+    except Exception as e:
+        await update.message.reply_text(f"❌ خطا در دريافت وضعيت کانال: {e}")
+
+# ================== جستجوي سفارشات ==================
+ORDER_TYPE_NAMES = {"buy": "🛒 خريد", "sell": "💵 فروش"}
+
+def markdown_code(value):
+    # متن وارد شده توسط کاربر داخل `...` نمايش داده مي‌شود؛ فقط backtick مي‌تواند قالب Markdown را بشکند
+    return "`" + str(value).replace("`", "'") + "`"
+
+def format_order_line(order):
+    return (
+        f"{ORDER_TYPE_NAMES.get(order['order_type'], order['order_type'])} #{order['order_number']} - "
+        f"{order.get('amount', 0):,} تومان - {order.get('tether_amount', 0)} تتر - "
+        f"{order.get('selected_network', '')}\n`{order['tracking_code']}`"
+    )
+
+def format_order_details(order):
+    message = (
+        f"{ORDER_TYPE_NAMES.get(order['order_type'], order['order_type'])} **سفارش #{order['order_number']}**\n\n"
+        f"🆔 کد پيگيري: `{order['tracking_code']}`\n"
+        f"👤 کاربر: `{order['user_id']}`\n"
+        f"📅 تاريخ: {order['jalali_date']}\n"
+        f"💰 مبلغ: {order.get('amount', 0):,} تومان\n"
+        f"🔢 تعداد تتر: {order.get('tether_amount', 0)}\n"
+        f"🌐 شبکه: {order.get('selected_network', '')}\n"
+    )
+    if order['order_type'] == "buy":
+        message += (
+            f"💵 قيمت: {order.get('current_price', 0):,} تومان\n"
+            f"🔢 تتر پرداختي: {order.get('final_tether_amount', 0)}\n"
+            f"💼 آدرس کيف پول: {markdown_code(order.get('wallet_address', ''))}\n"
+        )
+    else:
+        message += (
+            f"💵 قيمت فروش: {order.get('sell_price', 0):,} تومان\n"
+            f"💳 شماره کارت: {markdown_code(order.get('card_number', ''))}\n"
+            f"🏦 شماره حساب: {markdown_code(order.get('account_number', ''))}\n"
+            f"🌐 شماره شبا: {markdown_code(order.get('sheba_display', ''))}\n"
+            f"👤 نام دارنده حساب: {markdown_code(order.get('account_holder', ''))}\n"
+        )
+    return message
+
+async def order_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    if not context.args:
+        await update.message.reply_text("📝 **دستور جستجوي سفارش:**\n\nUsage: /order <کد پيگيري>\n\nمثال:\n/order 14040520143015-123456789-2001")
+        return
+    
+    orders = find_orders_by_tracking_code(context.args[0])
+    if not orders:
+        await update.message.reply_text(f"❌ سفارشي با کد پيگيري '{context.args[0]}' پيدا نشد!")
+        return
+    
+    message = "\n\n".join(format_order_details(order) for order in orders)
+    await update.message.reply_text(message, parse_mode='Markdown')
+
+# هر خط سفارش حدود 150 کاراکتر است؛ 20 سفارش زير سقف 4096 کاراکتر پيام تلگرام مي‌ماند
+ORDERS_PAGE_SIZE = 20
+
+async def orders_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    persian_date, _, persian_date_display, _ = get_iran_time()
+    order_type = None
+    page = 1
+    for arg in context.args or []:
+        if arg.lower() in ORDER_TYPE_NAMES:
+            order_type = arg.lower()
+        elif arg.isdigit() and len(arg) < 8:
+            page = int(arg)
+        else:
+            persian_date = arg.replace("/", "")
+            persian_date_display = arg
+    
+    if not (persian_date.isdigit() and len(persian_date) == 8) or page < 1:
+        await update.message.reply_text(
+            "📝 **دستور ليست سفارشات روز:**\n\nUsage: /orders [تاريخ] [buy|sell] [صفحه]\n\n"
+            "مثال:\n/orders\n/orders 1404/05/20\n/orders 1404/05/20 sell 2"
+        )
+        return
+    
+    total, orders = find_orders_by_date(persian_date, order_type, ORDERS_PAGE_SIZE, (page - 1) * ORDERS_PAGE_SIZE)
+    if not total:
+        await update.message.reply_text(f"❌ سفارشي در تاريخ {persian_date_display} ثبت نشده است!")
+        return
+    
+    pages = (total + ORDERS_PAGE_SIZE - 1) // ORDERS_PAGE_SIZE
+    if not orders:
+        await update.message.reply_text(f"❌ شماره صفحه بايد بين 1 و {pages} باشد!")
+        return
+    
+    message = f"📋 **سفارشات {persian_date_display}** ({total} سفارش)\n\n"
+    message += "\n\n".join(format_order_line(order) for order in orders)
+    message += f"\n\n📄 صفحه {page} از {pages}"
+    if page < pages:
+        next_args = " ".join(arg for arg in (persian_date, order_type, str(page + 1)) if arg)
+        message += f"\n➡️ صفحه بعد: /orders {next_args}"
+    await update.message.reply_text(message, parse_mode='Markdown')
+
+async def user_orders_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    if not context.args or not context.args[0].isdigit():
+        await update.message.reply_text("📝 **دستور سفارشات کاربر:**\n\nUsage: /userorders <آيدي کاربر>\n\nمثال:\n/userorders 123456789")
+        return
+    
+    orders = find_orders_by_user(int(context.args[0]))
+    if not orders:
+        await update.message.reply_text(f"❌ سفارشي براي کاربر {context.args[0]} ثبت نشده است!")
+        return
+    
+    message = f"📋 **آخرين سفارشات کاربر** `{context.args[0]}`\n\n"
+    message += "\n\n".join(f"📅 {order['jalali_date']} - {format_order_line(order)}" for order in orders)
+    await update.message.reply_text(message, parse_mode='Markdown')
+
+# ================== مديريت منابع قيمت ==================
+async def providers_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    now = time.time()
+    message = f"📡 **منابع قيمت** (حالت: {ADMIN_SETTINGS['price_mode']})\n\n"
+    for instrument, providers in PRICE_PROVIDERS.items():
+        enabled = enabled_price_providers(instrument)
+        message += f"▫️ {PRICE_SOURCE_LABELS[instrument]} ({instrument}):\n"
+        for name in providers:
+            state = PRICE_PROVIDER_STATE[(instrument, name)]
+            status = "✅" if name in enabled else "⚪️"
+            if state["retry_at"] > now:
+                status += f" ⏳ {int(state['retry_at'] - now)} ثانيه"
+            message += f"   {status} {name} - آخرين قيمت: {state['last_price']:,}\n"
+        if instrument in PRICE_DISAGREEMENTS:
+            prices = "، ".join(f"{price:,}" for price in PRICE_DISAGREEMENTS[instrument])
+            message += f"   ⚠️ اختلاف منابع بيش از حد مجاز: {prices}\n"
+        message += "\n"
+    
+    message += (
+        "🛠️ **دستورات:**\n"
+        "• /setproviders <نوع> <منبع1> <منبع2> ... - تنظيم منابع فعال\n"
+        "• /setpricemode <first|median> - تنظيم حالت تجميع قيمت"
+    )
+    await update.message.reply_text(message)
+
+async def slowest_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    if not TRACING:
+        await update.message.reply_text("⚠️ رديابي غيرفعال است. براي فعال‌سازي ربات را با TRACING=1 اجرا کنيد.")
+        return
+    
+    try:
+        limit = int(context.args[0]) if context.args else 10
+    except ValueError:
+        await update.message.reply_text(
+            "📝 **دستور کندترين درخواست‌ها:**\n\n"
+            "Usage: /slowest [تعداد]\n\n"
+            "مثال:\n"
+            "/slowest 5"
+        )
+        return
+    
+    entries = heapq.nlargest(max(1, min(limit, SLOWEST_HANDLERS_LIMIT)), SLOWEST_HANDLERS)
+    if not entries:
+        await update.message.reply_text("📭 هنوز درخواستي ثبت نشده است.")
+        return
+    
+    message = f"🐢 **کندترين درخواست‌ها** (آستانه گزارش: {SLOW_REQUEST_MS:.0f}ms)\n\n"
+    for index, (elapsed_ms, _, handler, spans, recorded_at) in enumerate(entries, 1):
+        message += f"{index}. {handler} - {elapsed_ms:.1f}ms ({recorded_at})\n"
+        message += f"   {format_trace_breakdown(spans)}\n"
+    await update.message.reply_text(message)
+
+async def set_providers_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    if not context.args or len(context.args) < 2:
+        await update.message.reply_text(
+            "📝 **دستور تنظيم منابع قيمت:**\n\nUsage: /setproviders <نوع> <منبع1> <منبع2> ...\n\n"
+            f"انواع: {', '.join(PRICE_PROVIDERS)}\n\n"
+            "مثال:\n/setproviders tether kifpool nobitex wallex"
+        )
+        return
+    
+    instrument = context.args[0].lower()
+    if instrument not in PRICE_PROVIDERS:
+        await update.message.reply_text(f"❌ نوع نامعتبر!\n\nانواع معتبر: {', '.join(PRICE_PROVIDERS)}")
+        return
+    
+    names = [name.lower() for name in context.args[1:]]
+    unknown = [name for name in names if name not in PRICE_PROVIDERS[instrument]]
+    if unknown:
+        await update.message.reply_text(
+            f"❌ منبع نامعتبر: {', '.join(unknown)}\n\nمنابع معتبر: {', '.join(PRICE_PROVIDERS[instrument])}"
+        )
+        return
+    
+    ADMIN_SETTINGS["price_providers"][instrument] = names
+    save_admin_settings(ADMIN_SETTINGS)
+    await update.message.reply_text(f"✅ منابع {PRICE_SOURCE_LABELS[instrument]} تنظيم شد: {', '.join(names)}")
+
+async def set_price_mode_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    if not context.args or context.args[0].lower() not in PRICE_AGGREGATION_MODES:
+        await update.message.reply_text(
+            "📝 **دستور تنظيم حالت تجميع قيمت:**\n\nUsage: /setpricemode <first|median>\n\n"
+            "• first - اولين پاسخ معتبر (سريع‌تر)\n"
+            "• median - ميانه همه منابع با حذف قيمت‌هاي پرت (مطمئن‌تر)"
+        )
+        return
+    
+    ADMIN_SETTINGS["price_mode"] = context.args[0].lower()
+    save_admin_settings(ADMIN_SETTINGS)
+    await update.message.reply_text(f"✅ حالت تجميع قيمت به {ADMIN_SETTINGS['price_mode']} تغيير کرد.")
+
+# ================== سيستم ارسال همگاني ==================
+BROADCAST_WORKERS = 8
+BROADCAST_PROGRESS_INTERVAL = 5  # ثانيه
+
+BROADCASTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    message TEXT NOT NULL,
+    admin_chat_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    last_user_id INTEGER NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+"""
+
+DB.executescript(BROADCASTS_SCHEMA)
+DB.commit()
+
+BROADCAST_TASKS = {}
+
+def _insert_broadcast(message, admin_chat_id):
+    with DB_WRITER:
+        cursor = DB_WRITER.execute(
+            "INSERT INTO broadcasts (message, admin_chat_id, status, created_at) VALUES (?, ?, 'running', ?)",
+            (message, admin_chat_id, time.time())
+        )
+    return cursor.lastrowid
+
+def save_broadcast_progress(broadcast):
+    db_write(
+        "UPDATE broadcasts SET status = ?, last_user_id = ?, sent = ?, failed = ? WHERE id = ?",
+        (broadcast["status"], broadcast["last_user_id"], broadcast["sent"], broadcast["failed"], broadcast["id"])
+    )
+
+def format_broadcast_progress(broadcast, total):
+    titles = {"running": "⏳ در حال ارسال", "done": "✅ ارسال پيام همگاني انجام شد", "cancelled": "⛔️ ارسال متوقف شد"}
+    return (
+        f"{titles[broadcast['status']]} (#{broadcast['id']})\n\n"
+        f"📤 پيشرفت: {broadcast['sent'] + broadcast['failed']} از {total}\n"
+        f"✅ موفق: {broadcast['sent']} کاربر\n"
+        f"❌ ناموفق: {broadcast['failed']} کاربر"
+    )
+
+async def run_broadcast(bot, broadcast, status_message=None):
+    # کاربران به ترتيب آيدي ارسال مي‌شوند؛ last_user_id آخرين آيدي است که همه کاربران قبل از آن پردازش شده‌اند
+    recipients = sorted(user_id for user_id in USER_STATS["users"] if user_id > broadcast["last_user_id"])
+    done = [False] * len(recipients)
+    position = {"next": 0, "watermark": 0}
+    total = broadcast["sent"] + broadcast["failed"] + len(recipients)
+    text = f"📢 **پيام همگاني:**\n\n{broadcast['message']}"
+
+    async def worker():
+        while position["next"] < len(recipients):
+            index = position["next"]
+            position["next"] += 1
+            if await send_message_limited(bot, recipients[index], text):
+                broadcast["sent"] += 1
+            else:
+                broadcast["failed"] += 1
+            done[index] = True
+            while position["watermark"] < len(done) and done[position["watermark"]]:
+                broadcast["last_user_id"] = recipients[position["watermark"]]
+                position["watermark"] += 1
+
+    async def report_progress():
+        while True:
+            await asyncio.sleep(BROADCAST_PROGRESS_INTERVAL)
+            save_broadcast_progress(broadcast)
+            if status_message:
+                try:
+                    await status_message.edit_text(format_broadcast_progress(broadcast, total))
+                except TelegramError:
+                    pass
+
+    reporter = asyncio.ensure_future(report_progress())
+    try:
+        await asyncio.gather(*(worker() for _ in range(BROADCAST_WORKERS)))
+        broadcast["status"] = "done"
+    except asyncio.CancelledError:
+        if not broadcast.get("stop_requested"):
+            # توقف ربات: وضعيت running مي‌ماند تا بعد از راه‌اندازي مجدد از last_user_id ادامه پيدا کند
+            logging.info(f"⏸ ارسال همگاني #{broadcast['id']} تا راه‌اندازي مجدد متوقف شد (کاربر {broadcast['last_user_id']})")
+            raise
+        broadcast["status"] = "cancelled"
+    finally:
+        reporter.cancel()
+        BROADCAST_TASKS.pop(broadcast["id"], None)
+        save_broadcast_progress(broadcast)
+
+    summary = format_broadcast_progress(broadcast, total)
+    try:
+        if status_message:
+            await status_message.edit_text(summary)
+        else:
+            await bot.send_message(chat_id=broadcast["admin_chat_id"], text=summary)
+    except TelegramError as e:
+        logging.error(f"خطا در گزارش ارسال همگاني: {e}")
+
+def start_broadcast(application, broadcast, status_message=None):
+    task = start_background_task(run_broadcast(application.bot, broadcast, status_message))
+    BROADCAST_TASKS[broadcast["id"]] = (task, broadcast)
+
+async def resume_broadcasts_job(context: ContextTypes.DEFAULT_TYPE):
+    # ادامه ارسال‌هاي همگاني که با ري‌استارت ربات نيمه‌کاره مانده‌اند
+    rows = db_query("SELECT id, message, admin_chat_id, last_user_id, sent, failed FROM broadcasts WHERE status = 'running'")
+    for broadcast_id, message, admin_chat_id, last_user_id, sent, failed in rows:
+        broadcast = {
+            "id": broadcast_id, "message": message, "admin_chat_id": admin_chat_id, "status": "running",
+            "last_user_id": last_user_id, "sent": sent, "failed": failed
+        }
+        logging.info(f"🔁 ادامه ارسال همگاني #{broadcast_id} از کاربر {last_user_id}")
+        start_broadcast(context.application, broadcast)
+
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    if not context.args:
+        await update.message.reply_text("📢 **دستور ارسال پيام همگاني:**\n\nUsage: /broadcast <پيام>\n\nمثال:\n/broadcast اطلاعيه مهم")
+        return
+    
+    message = ' '.join(context.args)
+    broadcast_id = await db_run(_insert_broadcast, message, update.message.chat_id)
+    broadcast = {
+        "id": broadcast_id, "message": message, "admin_chat_id": update.message.chat_id, "status": "running",
+        "last_user_id": 0, "sent": 0, "failed": 0
+    }
+    
+    status_message = await update.message.reply_text(
+        f"⏳ ارسال پيام همگاني #{broadcast_id} به {USER_STATS['total_users']} کاربر شروع شد...\n\n"
+        f"براي توقف: /stopbroadcast {broadcast_id}"
+    )
+    start_broadcast(context.application, broadcast, status_message)
+
+async def stop_broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    if not context.args or not context.args[0].isdigit():
+        await update.message.reply_text("📝 **دستور توقف ارسال همگاني:**\n\nUsage: /stopbroadcast <شماره>\n\nمثال:\n/stopbroadcast 3")
+        return
+    
+    running = BROADCAST_TASKS.get(int(context.args[0]))
+    if not running:
+        await update.message.reply_text(f"❌ ارسال همگاني فعالي با شماره {context.args[0]} وجود ندارد!")
+        return
+    
+    task, broadcast = running
+    broadcast["stop_requested"] = True
+    task.cancel()
+    await update.message.reply_text(f"⛔️ ارسال همگاني #{context.args[0]} متوقف شد.")
+
+# ================== دستورات مديريتي ==================
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    
+    if user_id == ADMIN_USER_ID:
+        await admin_help_command(update, context)
+        return
+    
+    help_text = """
+📖 **راهنماي ربات تتردات کام:**
+
+🛒 **خريد تتر:**
+1. انتخاب گزينه "خريد تتر از ما"
+2. وارد کردن کد اشتراک و کد ملي
+3. انتخاب مبلغ مورد نظر
+4. انتخاب شبکه و وارد کردن آدرس کيف پول
+
+💵 **فروش تتر:**
+1. انتخاب گزينه "فروش تتر به ما" 
+2. وارد کردن کد اشتراک و کد ملي
+3. وارد کردن تعداد تتر
+4. انتخاب شبکه براي واريز
+
+💰 **ساير امکانات:**
+• دريافت قيمت لحظه‌اي تتر و طلا
+• /history [tether|gold|ounce|gold_dollar] [1m|1h|1d] - تاريخچه قيمت‌ها
+• /alert usdt >= 105000 - هشدار رسيدن قيمت به مقدار دلخواه
+• /alerts - نمايش هشدارها | /delalert <شماره> - حذف هشدار
+• پشتيباني 24 ساعته
+
+📞 پشتيباني:\n @TTeercom
+📢 کانال:\n @TTeer_com
+"""
+    await update.message.reply_text(help_text, reply_markup=main_menu_keyboard())
+
+async def admin_help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    notifications_status = "✅ روشن" if ADMIN_SETTINGS["order_notifications"] else "❌ خاموش"
+    interval_status = f"{ADMIN_SETTINGS['channel_interval']} دقيقه"
+    
+    help_text = f"""
+🛠️ **دستورات مديريتي ربات**
+
+📊 **آمار و مديريت:**
+• /stats - نمايش آمار کاربران
+• /broadcast <پيام> - ارسال پيام به همه کاربران
+• /stopbroadcast <شماره> - توقف ارسال همگاني
+• /togglenotifications - تغيير وضعيت اطلاع‌رساني ({notifications_status})
+
+📢 **مديريت کانال:**
+• /setinterval <دقيقه> - تنظيم فاصله ارسال به کانال ({interval_status})
+• /sendnow [شماره] - ارسال فوري قيمت به کانال‌ها
+• /channelstatus - نمايش وضعيت کانال
+• /addschedule <کانال> <دقيقه|ساعت‌ها|live|alert> [قالب|آستانه] - افزودن زمان‌بندي انتشار
+• /schedules - نمايش زمان‌بندي‌ها
+• /removeschedule <شماره> - حذف زمان‌بندي
+
+📡 **مديريت منابع قيمت:**
+• /providers - نمايش منابع و وضعيت آن‌ها
+• /setproviders <نوع> <منابع> - تنظيم منابع فعال
+• /setpricemode <first|median> - تنظيم حالت تجميع قيمت ({ADMIN_SETTINGS['price_mode']})
+• /slowest [تعداد] - کندترين درخواست‌ها از زمان اجرا (با TRACING=1)
+
+💰 **مديريت کيف پول:**
+• /setwallet <شبکه> <آدرس> - تنظيم آدرس کيف پول
+• /wallets - نمايش آدرس‌هاي فعلي
+
+🔐 **مديريت کدهاي اشتراک:**
+• /addcode <کد> <کد_ملي> - اضافه کردن کد اشتراک
+• /removecode <کد> - حذف کد اشتراک
+• /listcodes [صفحه] - نمايش کدها (50 کد در هر صفحه)
+• /togglecode <کد> - فعال/غيرفعال کردن کد
+• /exportcodes - دريافت فايل CSV کدها (هش شده)
+• /importcodes - وارد کردن کدها از فايل CSV (کپشن يا ريپلاي روي فايل)
+
+🧾 **سفارشات:**
+• /order <کد پيگيري> - جستجوي سفارش
+• /orders [تاريخ] [buy|sell] [صفحه] - سفارشات يک روز
+• /userorders <آيدي> - سفارشات يک کاربر
+
+🔧 **ساير دستورات:**
+• /admin - نمايش اين راهنما
+• /history [نوع] [1m|1h|1d] [تعداد] - تاريخچه قيمت‌ها
+• /help - نمايش راهنماي کاربري
+
+📝 **مثال‌ها:**
+• /setwallet TRC20 TUvQ6SdWNkj8q7auUegsj7hXADeMhtgExX
+• /broadcast اطلاعيه جديد
+• /addcode 123456 1234567890
+• /setinterval 15
+• /sendnow
+"""
+    await update.message.reply_text(help_text)
+
+async def toggle_notifications_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    ADMIN_SETTINGS["order_notifications"] = not ADMIN_SETTINGS["order_notifications"]
+    save_admin_settings(ADMIN_SETTINGS)
+    
+    status = "✅ روشن" if ADMIN_SETTINGS["order_notifications"] else "❌ خاموش"
+    await update.message.reply_text(f"✅ وضعيت اطلاع‌رساني سفارشات به {status} تغيير کرد.")
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    total_users = USER_STATS["total_users"]
+    active_users = len([user for user in USERS_DB if USERS_DB[user]["verified"]])
+    
+    stats_text = f"""
+📊 **آمار ربات**
+
+👥 تعداد کل کاربران: {total_users}
+✅ کاربران فعال: {active_users}
+🔄 کاربران در حال تراکنش: {len(USER_STATES)}
+🧹 وضعيت‌هاي منقضي شده: {USER_STATES.evictions} گفتگو، {USERS_DB.evictions} نشست
+⏰ فاصله ارسال به کانال: {ADMIN_SETTINGS['channel_interval']} دقيقه
+
+📈 **آخرين کاربران:**
+"""
+    
+    user_count = 0
+    for user_id, user_data in list(USER_STATS["users"].items())[-5:]:
+        user_count += 1
+        stats_text += f"\n{user_count}. {user_data['name']} - {user_data['join_date']}"
+    
+    await update.message.reply_text(stats_text)
+
+async def set_wallet_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    if not context.args or len(context.args) < 2:
+        await update.message.reply_text(
+            "📝 **دستور تنظيم آدرس کيف پول:**\n\nUsage: /setwallet <network> <address>\n\n"
+            "🌐 شبکه‌هاي موجود:\n- ERC20\n- TRC20\n- BEP20\n- Solana\n\n"
+            "مثال:\n/setwallet TRC20 TUvQ6SdWNkj8q7auUegsj7hXADeMhtgExX"
+        )
+        return
+    
+    network = context.args[0].upper()
+    address = ' '.join(context.args[1:])
+    
+    if network not in NETWORK_FEES:
+        await update.message.reply_text("❌ شبکه نامعتبر!\n\nشبکه‌هاي معتبر:\n- ERC20\n- TRC20\n- BEP20\n- Solana")
+        return
+    
+    WALLET_ADDRESSES[network] = address
+    save_wallet_address(network, address)
+    
+    await update.message.reply_text(
+        f"✅ آدرس کيف پول براي شبکه {NETWORK_DISPLAY_NAMES[network]} با موفقيت تنظيم شد!\n\nآدرس جديد:\n`{address}`",
+        parse_mode='Markdown'
+    )
+
+async def show_wallets_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    message = "💰 **آدرس‌هاي کيف پول فعلي:**\n\n"
+    for network, address in WALLET_ADDRESSES.items():
+        display_name = NETWORK_DISPLAY_NAMES.get(network, network)
+        message += f"🌐 {display_name}:\n`{address}`\n\n"
+    
+    await update.message.reply_text(message, parse_mode='Markdown')
+
+async def add_code_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    if not context.args or len(context.args) < 2:
+        await update.message.reply_text(
+            "📝 **دستور اضافه کردن کد اشتراک:**\n\nUsage: /addcode <کد> <کد_ملي>\n\nمثال:\n/addcode 123456 1234567890"
+        )
+        return
+    
+    code = context.args[0]
+    national_code = context.args[1]
+    
+    if not CODE_PATTERN.match(code) or not NATIONAL_CODE_PATTERN.match(national_code):
+        await update.message.reply_text("❌ کد اشتراک بايد 4 تا 12 رقم و کد ملي 10 رقم باشد!")
+        return
+    
+    if get_subscribe_code(code):
+        await update.message.reply_text(f"❌ کد اشتراک '{code}' از قبل وجود دارد!")
+        return
+    
+    await import_subscribe_codes([(code, national_code, True)])
+    
+    await update.message.reply_text(f"✅ کد اشتراک '{code}' با موفقيت اضافه شد!\n\n🔒 کد ملي به صورت هش شده ذخيره شد.")
+
+async def remove_code_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    if not context.args:
+        await update.message.reply_text("📝 **دستور حذف کد اشتراک:**\n\nUsage: /removecode <کد>\n\nمثال:\n/removecode 123456")
+        return
+    
+    code = context.args[0]
+    if not get_subscribe_code(code):
+        await update.message.reply_text(f"❌ کد اشتراک '{code}' وجود ندارد!")
+        return
+    
+    await delete_subscribe_code(code)
+    await update.message.reply_text(f"✅ کد اشتراک '{code}' با موفقيت حذف شد!")
+
+CODES_PAGE_SIZE = 50
+
+async def list_codes_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    total, active = count_subscribe_codes()
+    if not total:
+        await update.message.reply_text("❌ هيچ کد اشتراکي وجود ندارد!")
+        return
+    
+    pages = (total + CODES_PAGE_SIZE - 1) // CODES_PAGE_SIZE
+    page = 1
+    if context.args:
+        if not context.args[0].isdigit() or not 1 <= int(context.args[0]) <= pages:
+            await update.message.reply_text(f"❌ شماره صفحه بايد بين 1 و {pages} باشد!\n\nUsage: /listcodes [صفحه]")
+            return
+        page = int(context.args[0])
+    
+    message = f"📋 **ليست کدهاي اشتراک:**\n\n📊 مجموع: {total} | فعال: {active}\n\n"
+    for code, is_active in list_subscribe_codes((page - 1) * CODES_PAGE_SIZE, CODES_PAGE_SIZE):
+        status = "✅" if is_active else "❌"
+        message += f"{status} `{code}` 🔒\n"
+    message += f"\n📄 صفحه {page} از {pages}"
+    if page < pages:
+        message += f"\n➡️ صفحه بعد: /listcodes {page + 1}"
+    
+    await update.message.reply_text(message, parse_mode='Markdown')
+
+async def toggle_code_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    if not context.args:
+        await update.message.reply_text("📝 **دستور فعال/غيرفعال کردن کد اشتراک:**\n\nUsage: /togglecode <کد>\n\nمثال:\n/togglecode 123456")
+        return
+    
+    code = context.args[0]
+    record = get_subscribe_code(code)
+    if not record:
+        await update.message.reply_text(f"❌ کد اشتراک '{code}' وجود ندارد!")
+        return
+    
+    await set_subscribe_code_active(code, not record["active"])
+    status = "غيرفعال" if record["active"] else "فعال"
+    await update.message.reply_text(f"✅ کد اشتراک '{code}' با موفقيت {status} شد!")
+
+async def export_codes_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    total, active = count_subscribe_codes()
+    await update.message.reply_document(
+        io.BytesIO(export_subscribe_codes()),
+        filename="subscribe_codes.csv",
+        caption=f"📦 {total} کد اشتراک ({active} فعال)\n🔒 کدهاي ملي به صورت هش شده هستند."
+    )
+
+async def import_codes_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ دسترسي denied!")
+        return
+    
+    document = update.message.document
+    if not document and update.message.reply_to_message:
+        document = update.message.reply_to_message.document
+    if not document:
+        await update.message.reply_text(
+            "📝 **دستور وارد کردن کدهاي اشتراک:**\n\nUsage: فايل CSV را با کپشن /importcodes بفرستيد "
+            "يا روي فايل ريپلاي کنيد و /importcodes بزنيد.\n\nقالب هر خط:\ncode,national_code[,active]\n"
+            "يا خروجي /exportcodes"
+        )
+        return
+    
+    data = await (await document.get_file()).download_as_bytearray()
+    try:
+        plain, hashed, invalid = parse_subscribe_codes_csv(bytes(data))
+    except UnicodeDecodeError:
+        await update.message.reply_text("❌ فايل بايد CSV با کدگذاري UTF-8 باشد!")
+        return
+    
+    imported = 0
+    if plain:
+        imported += await import_subscribe_codes(plain)
+    if hashed:
+        imported += await import_subscribe_codes(hashed, hashed=True)
+    
+    message = f"✅ {imported} کد اشتراک وارد شد."
+    if hashed:
+        message += (
+            f"\n\n🔒 {len(hashed)} کد به صورت هش شده وارد شد؛ اين کدها فقط اگر با همين CODE_HASH_SECRET "
+            "خروجي گرفته شده باشند قابل تأييد هستند."
+        )
+    if invalid:
+        lines = ", ".join(str(line) for line in invalid[:20])
+        message += f"\n\n⚠️ {len(invalid)} خط نامعتبر: {lines}{' ...' if len(invalid) > 20 else ''}"
+    await update.message.reply_text(message)
+
+# ================== هندلر اصلي پيام‌ها ==================
+PRICE_BUTTON = "🟢 قيمت الان چند؟"
+CANCEL_BUTTON = "❌ انصراف"
+CONFIRM_BUTTON = "✅ تأييد و ادامه"
+
+NETWORK_BUTTONS = {display_name: network for network, display_name in NETWORK_DISPLAY_NAMES.items()}
+
+async def cancel_to_price(update: Update, context: ContextTypes.DEFAULT_TYPE, text):
+    # price_command وضعيت کاربر را پاک مي‌کند
+    await price_command(update, context)
+
+async def show_buy_networks(update: Update, context: ContextTypes.DEFAULT_TYPE, text):
+    await update.message.reply_text(
+        "🌐 **لطفاً شبکه مورد نظر را انتخاب کنيد:**\n\n💰 **کارمزد شبکه‌ها:**\n"
+        "• ERC20 (اتريوم) - 7 تتر\n• TRC20 (ترون) - 5 تتر\n"
+        "• BEP20 (بايننس) - 2 تتر\n• Solana (سولانا) - 2 تتر",
+        reply_markup=KEYBOARDS["networks"]
+    )
+
+async def show_sell_networks(update: Update, context: ContextTypes.DEFAULT_TYPE, text):
+    await update.message.reply_text(
+        "🌐 لطفاً شبکه مورد نظر براي واريز تتر را انتخاب کنيد:",
+        reply_markup=KEYBOARDS["networks"]
+    )
+
+async def select_buy_network(update: Update, context: ContextTypes.DEFAULT_TYPE, text):
+    await handle_network_selection(update, context, NETWORK_BUTTONS[text])
+
+async def select_sell_network(update: Update, context: ContextTypes.DEFAULT_TYPE, text):
+    await handle_sell_network_selection(update, context, NETWORK_BUTTONS[text])
+
+# دکمه‌هاي مشخص در هر مرحله: (مرحله، متن) -> هندلر
+TRANSITIONS = {
+    (Step.SUBSCRIBE_CODE, PRICE_BUTTON): cancel_to_price,
+    (Step.NATIONAL_CODE, PRICE_BUTTON): cancel_to_price,
+    (Step.BUY_AMOUNT, PRICE_BUTTON): cancel_to_price,
+    (Step.BUY_CONFIRM, CONFIRM_BUTTON): show_buy_networks,
+    (Step.BUY_CONFIRM, CANCEL_BUTTON): cancel_to_price,
+    (Step.BUY_CONFIRM, PRICE_BUTTON): cancel_to_price,
+    (Step.WALLET, CANCEL_BUTTON): cancel_to_price,
+    (Step.SELL_AMOUNT, PRICE_BUTTON): cancel_to_price,
+    (Step.SELL_CONFIRM, CONFIRM_BUTTON): show_sell_networks,
+    (Step.SELL_CONFIRM, CANCEL_BUTTON): cancel_to_price,
+    (Step.SELL_CONFIRM, PRICE_BUTTON): cancel_to_price,
+    (Step.CARD_NUMBER, PRICE_BUTTON): cancel_to_price,
+    (Step.ACCOUNT_NUMBER, PRICE_BUTTON): cancel_to_price,
+    (Step.SHEBA_NUMBER, PRICE_BUTTON): cancel_to_price,
+    (Step.ACCOUNT_HOLDER, CANCEL_BUTTON): cancel_to_price,
+}
+for network_button in NETWORK_BUTTONS:
+    TRANSITIONS[(Step.BUY_CONFIRM, network_button)] = select_buy_network
+    TRANSITIONS[(Step.SELL_CONFIRM, network_button)] = select_sell_network
+
+# ورودي آزاد کاربر در هر مرحله؛ مراحل تأييد ورودي آزاد ندارند و به منوي اصلي مي‌روند
+STEP_HANDLERS = {
+    Step.SUBSCRIBE_CODE: verify_subscription_code,
+    Step.NATIONAL_CODE: verify_national_code,
+    Step.BUY_AMOUNT: handle_buy_amount,
+    Step.WALLET: handle_wallet_address,
+    Step.SELL_AMOUNT: handle_sell_amount,
+    Step.CARD_NUMBER: handle_card_number,
+    Step.ACCOUNT_NUMBER: handle_account_number,
+    Step.SHEBA_NUMBER: handle_sheba_number,
+    Step.ACCOUNT_HOLDER: handle_account_holder,
+}
+
+async def show_price_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, text):
+    await price_command(update, context)
+
+async def start_buy(update: Update, context: ContextTypes.DEFAULT_TYPE, text):
+    await request_subscription_code(update, context, "buy")
+
+async def start_sell(update: Update, context: ContextTypes.DEFAULT_TYPE, text):
+    await request_subscription_code(update, context, "sell")
+
+async def show_channel_info(update: Update, context: ContextTypes.DEFAULT_TYPE, text):
+    await update.message.reply_text(
+        "📢 **کانال اطلاع‌رساني ما:**\n\n👉 @TTeer_com\n\n✅ قيمت‌هاي لحظه‌اي\n✅ اخبار و اطلاعيه‌ها",
+        reply_markup=main_menu_keyboard()
+    )
+
+async def show_help(update: Update, context: ContextTypes.DEFAULT_TYPE, text):
+    await help_command(update, context)
+
+MAIN_MENU_ACTIONS = {
+    "🟢 قيمت لحظه اي تتر و طلا": show_price_menu,
+    "🛒 خريد تتر از ما": start_buy,
+    "💵 فروش تتر به ما": start_sell,
+    "📢 کانال ما": show_channel_info,
+    "📖 راهنما": show_help,
+    PRICE_BUTTON: show_price_menu,
+}
+
+async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    text = update.message.text
+    
+    user_state = USER_STATES.get(user_id)
+    if user_state is not None:
+        handler = TRANSITIONS.get((user_state.step, text)) or STEP_HANDLERS.get(user_state.step)
+        if handler:
+            await handler(update, context, text)
+            return
+    
+    handler = MAIN_MENU_ACTIONS.get(text)
+    if handler:
+        await handler(update, context, text)
+    else:
+        await update.message.reply_text("❌ دستور نامعتبر\nلطفاً از دکمه‌هاي زير استفاده کنيد:", reply_markup=main_menu_keyboard())
+
+
+# ================== پردازش همزمان آپديت‌ها ==================
+# آپديت‌هاي کاربران مختلف همزمان و آپديت‌هاي هر کاربر به ترتيب پردازش مي‌شوند
+MAX_CONCURRENT_UPDATES = int(os.environ.get('MAX_CONCURRENT_UPDATES', 64))
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates):
+        # سقف کلاس پايه فقط تعداد آپديت‌هاي در انتظار را محدود مي‌کند؛ سقف اجراي همزمان بعد از
+        # گرفتن قفل کاربر اعمال مي‌شود تا پيام‌هاي پشت سر هم يک کاربر جاي بقيه را نگيرند
+        super().__init__(max_concurrent_updates * 8)
+        self.running = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self.user_locks = {}
+
+    async def do_process_update(self, update, coroutine):
+        user = update.effective_user if isinstance(update, Update) else None
+        if user is None:
+            async with self.running:
+                await coroutine
+            return
+        
+        entry = self.user_locks.get(user.id)
+        if entry is None:
+            entry = self.user_locks[user.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0], self.running:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.user_locks[user.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+ # ================== سرور وب (سلامت و webhook) ==================
+# اگر WEBHOOK_URL تنظيم شده باشد آپديت‌ها از طريق webhook دريافت مي‌شوند، در غير اين صورت polling
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL', '').rstrip('/')
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET', '')
+BOT_MODE = os.environ.get('BOT_MODE', 'webhook' if WEBHOOK_URL else 'polling')
+PORT = int(os.environ.get('PORT', 8000))
+
+async def health_check(request):
+    return web.Response(text="Bot is running!")
+
+async def metrics_endpoint(request):
+    return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8")
+
+async def telegram_webhook(request):
+    if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+        return web.Response(status=403)
+    
+    application = request.app["application"]
+    try:
+        data = await request.json()
+    except ValueError:
+        return web.Response(status=400)
+    await application.update_queue.put(Update.de_json(data, application.bot))
+    return web.Response()
+
+def build_web_app(application):
+    app = web.Application()
+    app["application"] = application
+    app.router.add_get('/', health_check)
+    app.router.add_get('/health', health_check)
+    app.router.add_get('/metrics', metrics_endpoint)
+    if BOT_MODE == 'webhook':
+        app.router.add_post(WEBHOOK_PATH, telegram_webhook)
+    return app
+ # ==================
+    
+   # ================== اجراي ربات ==================
+BOT_COMMANDS = [
+    ("start", start_command),
+    ("price", price_command),
+    ("help", help_command),
+    ("history", history_command),
+    ("alert", alert_command),
+    ("alerts", alerts_command),
+    ("delalert", delete_alert_command),
+    ("admin", admin_help_command),
+    ("togglenotifications", toggle_notifications_command),
+    ("setwallet", set_wallet_command),
+    ("wallets", show_wallets_command),
+    ("stats", stats_command),
+    ("broadcast", broadcast_command),
+    ("stopbroadcast", stop_broadcast_command),
+    ("addcode", add_code_command),
+    ("removecode", remove_code_command),
+    ("listcodes", list_codes_command),
+    ("togglecode", toggle_code_command),
+    ("exportcodes", export_codes_command),
+    ("importcodes", import_codes_command),
+    ("setinterval", set_interval_command),
+    ("sendnow", send_now_command),
+    ("addschedule", add_schedule_command),
+    ("schedules", schedules_command),
+    ("removeschedule", remove_schedule_command),
+    ("channelstatus", channel_status_command),
+    ("order", order_command),
+    ("orders", orders_command),
+    ("userorders", user_orders_command),
+    ("providers", providers_command),
+    ("setproviders", set_providers_command),
+    ("setpricemode", set_price_mode_command),
+    ("slowest", slowest_command)
+]
+
+def message_handler_label(update):
+    user_state = USER_STATES.get(update.effective_user.id)
+    return f"step:{user_state.step.value}" if user_state is not None else "menu"
+
+def register_handlers(application):
+    for command, callback in BOT_COMMANDS:
+        application.add_handler(CommandHandler(command, instrument_handler(f"/{command}", callback)))
+    # فايلي که با کپشن /importcodes فرستاده شود پيام متني نيست و CommandHandler آن را نمي‌بيند
+    application.add_handler(MessageHandler(
+        filters.Document.ALL & filters.CaptionRegex(r"^/importcodes"), instrument_handler("/importcodes", import_codes_command)
+    ))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, instrument_handler(message_handler_label, handle_message)))
+
+async def on_shutdown(application):
+    await close_http_session()
+    flush_state_stores()
+    PRICE_HISTORY.close()
+    close_db()
+
+async def run_bot(application):
+    # سرور وب و ربات روي يک event loop اجرا مي‌شوند
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # ويندوز: توقف با KeyboardInterrupt انجام مي‌شود
+    
+    runner = web.AppRunner(build_web_app(application))
+    await runner.setup()
+    try:
+        async with application:
+            await application.start()
+            await web.TCPSite(runner, '0.0.0.0', PORT).start()
+            print(f"✅ Web server started on port {PORT}")
+            
+            if BOT_MODE == 'webhook':
+                await application.bot.set_webhook(
+                    url=f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+                    secret_token=WEBHOOK_SECRET or None,
+                    allowed_updates=Update.ALL_TYPES,
+                    drop_pending_updates=True
+                )
+                print(f"✅ Webhook فعال شد: {WEBHOOK_URL}{WEBHOOK_PATH}")
+            else:
+                # start_polling وبهوک قبلي را حذف مي‌کند
+                await application.updater.start_polling(drop_pending_updates=True)
+                print("✅ Polling فعال شد")
+            
+            try:
+                await stop_event.wait()
+            finally:
+                await cancel_background_tasks()
+                if application.updater.running:
+                    await application.updater.stop()
+                await application.stop()
+    finally:
+        await runner.cleanup()
+        await on_shutdown(application)
+
+def main():
+    if not CODE_HASH_SECRET:
+        raise SystemExit("❌ متغير CODE_HASH_SECRET تنظيم نشده است؛ بدون آن کدهاي اشتراک قابل بررسي نيستند")
+    
+    print("🚀 ربات تتردات کام با سيستم خريد و فروش پيشرفته فعال شد...")
+    
+    builder = (
+        Application.builder()
+        .token(TOKEN)
+        .concurrent_updates(PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES))
+    )
+    if TRACING:
+        builder = builder.request(TracedRequest(connection_pool_size=256))
+    application = builder.build()
+
+    # JobQueue برای ارسال به کانال
+    job_queue = application.job_queue
+    if job_queue:
+        start_price_poller(job_queue)
+        job_queue.run_repeating(state_flush_job, interval=STATE_FLUSH_INTERVAL, name="state_flush_job")
+        job_queue.run_repeating(state_sweep_job, interval=ADMIN_SETTINGS["state_sweep_interval"], name="state_sweep_job")
+        job_queue.run_once(resume_broadcasts_job, when=5, name="resume_broadcasts_job")
+        print(f"✅ پايش خودکار قيمت‌ها فعال شد - هر {ADMIN_SETTINGS['price_poll_interval']} ثانيه")
+
+        start_publisher(job_queue)
+        print(f"✅ سيستم انتشار قيمت در کانال‌ها فعال شد - {len(PUBLISH_SCHEDULES)} زمان‌بندي")
+    else:
+        print("⚠️ JobQueue غيرفعال است")
+    
+    # اضافه کردن هندلرها
+    register_handlers(application)
+    
+    print("✅ ربات آماده اجرا است...")
+    asyncio.run(run_bot(application))
+
+if __name__ == "__main__":
+    main()
+